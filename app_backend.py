@@ -1,26 +1,46 @@
 """
 Flask backend for Govee H612C control
-Serves HTTP API at localhost:5000
+Serves HTTP API at localhost:5000 (waitress when installed; see --help)
 Also serves static HTML/CSS/JS UI
 Embeds GoveeLAN library
 """
 
+import argparse
+import asyncio
+import atexit
+import concurrent.futures
+import itertools
 import json
 import os
+import select
+import shutil
+import signal
 import socket
 import sys
 import threading
 import time
+from bisect import bisect_right
+from collections import deque
 from datetime import datetime
 from typing import Optional
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
 
+from govee_metrics import registry as metrics
+from govee_scheduler import FireJournal, RuleScheduler, RulesWatcher, rule_id, validate_rules_config
+from govee_transport import close_transport, get_transport
+
 DEFAULT_IP = "192.168.1.66"
 CONTROL_PORT = 4003
 MCAST_GRP = "239.255.255.250"
 SCAN_PORT = 4001
 RECV_PORT = 4002
+DISCOVERY_PROBE_INTERVAL = 60.0  # seconds between background scan probes
+DISCOVERY_REOPEN_INTERVAL = 5.0  # seconds between attempts to reopen a failed listener socket
+# extra unicast scan targets, e.g. "127.0.0.1" for govee_simulator.py or hosts on another subnet
+SCAN_ADDRS = [a.strip() for a in os.environ.get("GOVEE_SCAN_ADDRS", "").split(",") if a.strip()]
+DEVICE_TTL = 300.0  # forget devices that have not answered for this long
+MAX_DEVICE_CLIENTS = 64  # GoveeLAN clients kept beyond the discovered devices before the oldest are evicted
 
 
 BASE_DIR = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(sys.argv[0])))
@@ -31,42 +51,760 @@ DEFAULT_RULES_FILE = os.path.join(BASE_DIR, "rules.json")
 DATA_DIR = os.path.join(os.path.expanduser("~"), ".govee-lan-controller")
 os.makedirs(DATA_DIR, exist_ok=True)
 RULES_PATH = os.path.join(DATA_DIR, "rules.json")
+GROUPS_PATH = os.path.join(DATA_DIR, "groups.json")
+JOURNAL_PATH = os.path.join(DATA_DIR, "automation.journal")
+
+# -------------------------
+# Metrics
+# -------------------------
+SEND_LATENCY = metrics.histogram("govee_send_latency_seconds", "Time from accepting a command to its datagram on the wire", ("ip",))
+PACKETS_SENT = metrics.counter("govee_packets_sent_total", "Datagrams sent per device", ("ip",))
+SEND_RETRIES = metrics.counter("govee_send_retries_total", "Request retries after a timeout or socket error", ("ip",))
+SEND_FAILURES = metrics.counter("govee_send_failures_total", "Requests that failed after every retry", ("ip",))
+HTTP_LATENCY = metrics.histogram("govee_http_request_seconds", "Flask request handling time per route", ("route", "method"))
+DISCOVERY_DURATION = metrics.histogram("govee_discovery_duration_seconds", "Duration of on-demand discovery scans",
+                                       buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0))
+DISCOVERED_DEVICES = metrics.counter("govee_discovery_replies_total", "Scan replies received")
+FIRE_LAG = metrics.histogram("govee_automation_fire_lag_seconds", "Time from a rule's due time to its command on the wire")
+RULES_FIRED = metrics.counter("govee_automation_fires_total", "Automation rules fired")
+WS_FRAMES = metrics.counter("govee_ws_frames_total", "Frames received on the WebSocket command channel", ("action",))
+
+
+class _DeviceMetrics:
+    """Labelled metric children for one device IP, resolved once rather than per packet"""
+    __slots__ = ("sent", "latency", "retries", "failures")
+
+    def __init__(self, ip):
+        self.sent = PACKETS_SENT.labels(ip)
+        self.latency = SEND_LATENCY.labels(ip)
+        self.retries = SEND_RETRIES.labels(ip)
+        self.failures = SEND_FAILURES.labels(ip)
 
 # -------------------------
 # Packet Monitor
 # -------------------------
+PACKET_LOG_SIZE = int(os.environ.get("GOVEE_PACKET_LOG_SIZE", "100"))
+
+
 class PacketMonitor:
-    def __init__(self, max_packets=100):
-        self.packets = []
-        self.max_packets = max_packets
-    
+    """
+    Fixed-capacity ring buffer of sent UDP packets.
+
+    The hot path only stores (seq, monotonic time, ip, port, raw bytes) into a
+    preallocated slot; the sequence number comes from itertools.count, which
+    is atomic under the GIL, so concurrent writers need no lock. Timestamps,
+    hex, text and JSON views are built only when the log is read. Readers
+    block in wait_for_packets; writers take the condition lock only while
+    someone is waiting.
+    """
+
+    def __init__(self, max_packets=PACKET_LOG_SIZE):
+        self.max_packets = max(1, int(max_packets))
+        self._slots = [None] * self.max_packets
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+        self._wall_offset = time.time() - time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = 0
+
     def log_packet(self, ip, port, payload_dict, payload_bytes):
-        """Log a UDP packet with all details"""
-        packet = {
-            "timestamp": datetime.now().isoformat(),
+        """Log a UDP packet (payload_dict is accepted for compatibility; the JSON view is parsed from the bytes on read)"""
+        seq = next(self._seq)
+        self._slots[seq % self.max_packets] = (seq, time.monotonic(), ip, port, payload_bytes)
+        self.last_seq = seq
+        if self._waiters:
+            with self._cond:
+                self._cond.notify_all()
+
+    def wait_for_packets(self, since, timeout):
+        """Block until a packet newer than `since` is logged or timeout elapses; True if one was"""
+        with self._cond:
+            self._waiters += 1
+            try:
+                return self._cond.wait_for(lambda: self.last_seq > since, timeout)
+            finally:
+                self._waiters -= 1
+
+    def _render(self, record):
+        seq, mono, ip, port, payload_bytes = record
+        text = payload_bytes.decode("utf-8", errors="replace")
+        try:
+            payload_json = json.loads(text)
+        except ValueError:
+            payload_json = None
+        return {
+            "seq": seq,
+            "timestamp": datetime.fromtimestamp(mono + self._wall_offset).isoformat(),
             "protocol": "UDP",
             "destination_ip": ip,
             "destination_port": port,
-            "payload_json": payload_dict,
+            "payload_json": payload_json,
             "payload_size": len(payload_bytes),
             "payload_hex": payload_bytes.hex(),
-            "payload_text": payload_bytes.decode("utf-8", errors="replace")
+            "payload_text": text,
         }
-        self.packets.append(packet)
-        if len(self.packets) > self.max_packets:
-            self.packets.pop(0)
-        return packet
-    
-    def get_packets(self):
-        """Return all logged packets"""
-        return list(reversed(self.packets))  # newest first
-    
+
+    def records_since(self, since=0):
+        """Raw records with seq > since, oldest first"""
+        return sorted((r for r in list(self._slots) if r is not None and r[0] > since), key=lambda r: r[0])
+
+    def get_packets(self, since=0, limit=None):
+        """Return logged packets newer than `since`, newest first (at most `limit`)"""
+        records = self.records_since(since)
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        return [self._render(r) for r in reversed(records)]
+
+    def render_records(self, records):
+        return [self._render(r) for r in records]
+
     def clear(self):
         """Clear all packets"""
-        self.packets.clear()
+        self._slots = [None] * self.max_packets
 
 packet_monitor = PacketMonitor()
 
+# -------------------------
+# Stream Coalescing
+# -------------------------
+COALESCE_WINDOW_MS = 50  # at most one color/brightness packet per device per window
+COLOR_DELTA = 2  # max per-channel difference treated as "same color"
+BRIGHTNESS_DELTA = 0  # max brightness difference treated as "same brightness"
+REPEAT_TTL = 5.0  # seconds a sent value keeps suppressing repeats; after that the light may have drifted
+
+
+def _stream_value(msg):
+    """(attribute, value) for streamable commands, else None"""
+    cmd = msg.get("cmd")
+    data = msg.get("data") or {}
+    if cmd == "brightness" and "value" in data:
+        return "brightness", int(data["value"])
+    if cmd == "colorwc":
+        if isinstance(data.get("color"), dict):
+            c = data["color"]
+            return "colorwc", ("rgb", (int(c.get("r", 0)), int(c.get("g", 0)), int(c.get("b", 0))))
+        if "colorTemInKelvin" in data:
+            return "colorwc", ("ct", int(data["colorTemInKelvin"]))
+    return None
+
+
+def _supersedes_frames(cmd):
+    """Mode changes (scene, raw, ...) override pending color/brightness frames; turn and devStatus do not"""
+    return cmd not in (None, "turn", "devStatus")
+
+
+class _Stream:
+    __slots__ = ("last", "last_time", "pending", "handle")
+
+    def __init__(self):
+        self.last = None
+        self.last_time = float("-inf")
+        self.pending = None  # (value, send, on_skip)
+        self.handle = None
+
+
+class StreamCoalescer:
+    """
+    Drops redundant color/brightness frames and coalesces bursts.
+
+    A frame identical to (or within the configured delta of) the last value
+    sent to the device in the past repeat_ttl seconds is suppressed. Frames arriving inside the window after
+    a send replace each other, so only the newest value per (device,
+    attribute) goes out when the window closes. Mode changes (scene, raw,
+    ...) reset the tracked values and drop pending frames so a stale color
+    cannot override them; turn sends pending frames first so the last
+    slider position is not lost. A devStatus reply that corrects the
+    tracked state makes the next frame go out.
+
+    Runs on the transport loop only, so it needs no locks.
+    """
+
+    def __init__(self, window_ms=COALESCE_WINDOW_MS, color_delta=COLOR_DELTA, brightness_delta=BRIGHTNESS_DELTA,
+                 repeat_ttl=REPEAT_TTL):
+        self.window_ms = window_ms
+        self.color_delta = color_delta
+        self.brightness_delta = brightness_delta
+        self.repeat_ttl = repeat_ttl
+        self._streams = {}  # (ip, attr) -> _Stream
+        self._stats = {}  # ip -> {"sent", "suppressed", "coalesced"}
+
+    def _count(self, ip, field):
+        stats = self._stats.get(ip)
+        if stats is None:
+            stats = self._stats[ip] = {"sent": 0, "suppressed": 0, "coalesced": 0}
+        stats[field] += 1
+
+    def _same(self, attr, a, b):
+        if a is None or b is None:
+            return False
+        if attr == "brightness":
+            return abs(a - b) <= self.brightness_delta
+        if a[0] != b[0]:
+            return False
+        if a[0] == "rgb":
+            return max(abs(x - y) for x, y in zip(a[1], b[1])) <= self.color_delta
+        return a[1] == b[1]
+
+    @staticmethod
+    def _skip(on_skip, outcome):
+        if on_skip is not None:
+            try:
+                on_skip(outcome)
+            except Exception as e:
+                print(f"[QUEUE] Skip callback failed: {e}")
+
+    def reset(self, ip):
+        for key in [k for k in self._streams if k[0] == ip]:
+            st = self._streams.pop(key)
+            if st.handle:
+                st.handle.cancel()
+            if st.pending is not None:
+                self._skip(st.pending[2], "superseded")
+
+    def flush(self, ip):
+        """Send the pending frames for ip now"""
+        for (sip, attr), st in list(self._streams.items()):
+            if sip == ip and st.pending is not None:
+                if st.handle:
+                    st.handle.cancel()
+                self._flush(ip, attr)
+
+    def command(self, ip, cmd):
+        """Account for a non-stream command about to go to ip"""
+        if _supersedes_frames(cmd):
+            self.reset(ip)
+        elif cmd == "turn":
+            self.flush(ip)
+
+    def forget(self, ip):
+        """Stop suppressing repeats of the last values sent to ip (pending frames still go out)"""
+        for (sip, _attr), st in self._streams.items():
+            if sip == ip:
+                st.last = None
+
+    def submit(self, ip, msg, send, coalesce=True, on_skip=None):
+        """
+        Send now, later, or never; `send` performs the actual datagram send.
+
+        on_skip(outcome) is called instead of send for a frame that will never
+        go out: "suppressed" (a repeat) or "superseded" (a newer frame or a
+        mode change replaced it).
+        """
+        sv = _stream_value(msg) if coalesce else None
+        if sv is None:
+            self.command(ip, msg.get("cmd"))
+            send()
+            self._count(ip, "sent")
+            return
+
+        attr, value = sv
+        st = self._streams.get((ip, attr))
+        if st is None:
+            st = self._streams[(ip, attr)] = _Stream()
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if now - st.last_time < self.repeat_ttl and self._same(attr, st.last, value):
+            if st.pending is not None:
+                # Back to what the light already shows: the queued frame is moot
+                self._skip(st.pending[2], "superseded")
+                st.pending = None
+                self._count(ip, "coalesced")
+            self._count(ip, "suppressed")
+            self._skip(on_skip, "suppressed")
+            return
+
+        window = self.window_ms / 1000.0
+        if st.pending is None and now - st.last_time >= window:
+            send()
+            st.last, st.last_time = value, now
+            self._count(ip, "sent")
+            return
+
+        if st.pending is not None:
+            self._count(ip, "coalesced")
+            self._skip(st.pending[2], "superseded")
+        st.pending = (value, send, on_skip)
+        if st.handle is None:
+            st.handle = loop.call_at(st.last_time + window, self._flush, ip, attr)
+
+    def _flush(self, ip, attr):
+        st = self._streams.get((ip, attr))
+        if st is None:
+            return
+        st.handle = None
+        if st.pending is None:
+            return
+        value, send, _on_skip = st.pending
+        st.pending = None
+        send()
+        st.last, st.last_time = value, asyncio.get_running_loop().time()
+        self._count(ip, "sent")
+
+    def configure(self, window_ms=None, color_delta=None, brightness_delta=None, repeat_ttl=None):
+        if window_ms is not None:
+            self.window_ms = max(0.0, float(window_ms))
+        if repeat_ttl is not None:
+            self.repeat_ttl = max(0.0, float(repeat_ttl))
+        if color_delta is not None:
+            self.color_delta = max(0, int(color_delta))
+        if brightness_delta is not None:
+            self.brightness_delta = max(0, int(brightness_delta))
+
+    async def snapshot(self):
+        pending = {}
+        for (ip, _attr), st in self._streams.items():
+            if st.pending is not None:
+                pending[ip] = pending.get(ip, 0) + 1
+        return {
+            "window_ms": self.window_ms,
+            "color_delta": self.color_delta,
+            "brightness_delta": self.brightness_delta,
+            "repeat_ttl": self.repeat_ttl,
+            "devices": {ip: dict(stats, pending=pending.get(ip, 0)) for ip, stats in self._stats.items()},
+        }
+
+
+stream_coalescer = StreamCoalescer()
+
+# -------------------------
+# Per-device Send Queue
+# -------------------------
+MAX_PACKET_RATE = 20.0  # packets/s per device
+PACKET_BURST = 10  # packets a device may receive back-to-back
+MAX_CONTROL_BACKLOG = 200  # queued control commands per device before the oldest is dropped
+QUEUE_WAIT_TIMEOUT = 5.0  # seconds a request/reply send waits for its send-queue slot
+SKU_RATE_LIMITS = {}  # sku -> (rate, burst); tuned per model via /api/queue/config
+
+
+class _DeviceQueue:
+    __slots__ = ("sku", "rate", "burst", "tokens", "updated", "control", "frames", "handle", "sent", "dropped", "sent_times")
+
+    def __init__(self, rate, burst, sku=None):
+        self.sku = sku
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = None
+        self.control = deque()
+        self.frames = {}  # attribute -> (send, on_drop), newest only
+        self.handle = None
+        self.sent = 0
+        self.dropped = 0
+        self.sent_times = deque(maxlen=1000)
+
+
+class SendQueue:
+    """
+    Per-device outbound queue with a token bucket.
+
+    Control commands (turn, scene, status requests, raw) are sent before
+    streaming frames; for frames only the newest pending value per
+    attribute is kept. A full control backlog drops its oldest
+    fire-and-forget command, and a frame is dropped when a newer one or a
+    mode change replaces it; either is reported through the entry's
+    on_drop. Request/reply waiters are never dropped. Runs on the transport
+    loop only.
+    """
+
+    def __init__(self, rate=MAX_PACKET_RATE, burst=PACKET_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._queues = {}
+
+    def _limits(self, sku):
+        return SKU_RATE_LIMITS.get(sku, (self.rate, self.burst))
+
+    def _queue(self, ip, sku=None):
+        q = self._queues.get(ip)
+        if q is None:
+            q = self._queues[ip] = _DeviceQueue(*self._limits(sku), sku=sku)
+        elif sku and q.sku != sku:
+            q.sku = sku
+            q.rate, q.burst = self._limits(sku)
+        return q
+
+    def submit(self, ip, send, attr=None, sku=None, cmd=None, on_drop=None, waiter=False):
+        """
+        Queue a send; attr marks a streaming frame that newer frames may replace.
+
+        on_drop is called instead of send if the entry is dropped (a control
+        command from a full backlog, a frame replaced by a newer one or by a
+        mode change); waiter=True marks an entry that is never dropped.
+        """
+        q = self._queue(ip, sku)
+        if attr is not None:
+            replaced = q.frames.pop(attr, None)
+            if replaced is not None:
+                self._drop(q, replaced[1])
+            q.frames[attr] = (send, on_drop)
+        else:
+            if _supersedes_frames(cmd) and q.frames:
+                # A scene (or other mode change) supersedes frames still waiting
+                frames = list(q.frames.values())
+                q.frames.clear()
+                for _send, dropped in frames:
+                    self._drop(q, dropped)
+            if len(q.control) >= MAX_CONTROL_BACKLOG:
+                oldest = next((i for i, entry in enumerate(q.control) if not entry[2]), None)
+                if oldest is not None:
+                    _send, dropped, _waiter = q.control[oldest]
+                    del q.control[oldest]
+                    self._drop(q, dropped)
+                elif not waiter:
+                    self._drop(q, on_drop)  # only waiters are queued: refuse the new command
+                    return
+            q.control.append((send, on_drop, waiter))
+        self._pump(ip)
+
+    @staticmethod
+    def _drop(q, on_drop):
+        q.dropped += 1
+        if on_drop is not None:
+            try:
+                on_drop()
+            except Exception as e:
+                print(f"[QUEUE] Drop callback failed: {e}")
+
+    def wait_turn(self, ip, sku=None, cmd=None):
+        """Future resolved when a control-priority token is granted (for request/reply sends)"""
+        fut = asyncio.get_running_loop().create_future()
+        self.submit(ip, lambda: fut.done() or fut.set_result(None), sku=sku, cmd=cmd, waiter=True)
+        return fut
+
+    def _pump(self, ip, timer=False):
+        """Send what the bucket allows; timer=True when called from the device's own refill timer"""
+        q = self._queues.get(ip)
+        if q is None:
+            return
+        if timer:
+            q.handle = None
+        elif q.handle is not None:
+            return  # the bucket is empty and the pending timer will drain the queue
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if q.updated is not None:
+            q.tokens = min(float(q.burst), q.tokens + (now - q.updated) * q.rate)
+        q.updated = now
+
+        while q.tokens >= 1.0 and (q.control or q.frames):
+            if q.control:
+                send, _on_drop, _waiter = q.control.popleft()
+            else:
+                attr = next(iter(q.frames))
+                send, _on_drop = q.frames.pop(attr)
+            q.tokens -= 1.0
+            q.sent += 1
+            q.sent_times.append(now)
+            try:
+                send()
+            except Exception as e:
+                print(f"[QUEUE] Send to {ip} failed: {e}")
+
+        if (q.control or q.frames) and q.handle is None:
+            q.handle = loop.call_later((1.0 - q.tokens) / q.rate, self._pump, ip, True)
+
+    def configure(self, rate=None, burst=None, sku=None):
+        """Set the default limits, or the limits for one SKU"""
+        if sku:
+            cur_rate, cur_burst = SKU_RATE_LIMITS.get(sku, (self.rate, self.burst))
+            SKU_RATE_LIMITS[sku] = (rate or cur_rate, burst or cur_burst)
+        else:
+            self.rate = rate or self.rate
+            self.burst = burst or self.burst
+        for ip, q in self._queues.items():
+            if not sku or q.sku == sku:
+                q.rate, q.burst = self._limits(q.sku)
+                if q.handle is not None:
+                    # the pending refill timer was computed for the old rate
+                    q.handle.cancel()
+                    self._pump(ip, timer=True)
+
+    async def snapshot(self):
+        now = asyncio.get_running_loop().time()
+        devices = {}
+        for ip, q in self._queues.items():
+            devices[ip] = {
+                "sku": q.sku,
+                "rate": q.rate,
+                "burst": q.burst,
+                "depth": len(q.control) + len(q.frames),
+                "control_depth": len(q.control),
+                "frame_depth": len(q.frames),
+                "sent": q.sent,
+                "dropped": q.dropped,
+                "send_rate": sum(1 for t in q.sent_times if now - t <= 1.0),
+            }
+        return {"rate": self.rate, "burst": self.burst, "sku_limits": SKU_RATE_LIMITS, "devices": devices}
+
+
+send_queue = SendQueue()
+
+# -------------------------
+# Status Cache
+# -------------------------
+STATUS_TTL = float(os.environ.get("GOVEE_STATUS_TTL", "5"))  # seconds a devStatus reply is served as fresh
+STATUS_STALE_TTL = float(os.environ.get("GOVEE_STATUS_STALE_TTL", "60"))  # stale replies served (and refreshed in the background) up to this age
+
+
+class StatusCache:
+    """
+    Per-device devStatus cache.
+
+    Fresh replies are returned as is; stale ones are returned immediately
+    while a background refresh runs; concurrent callers for the same device
+    share one in-flight request. A command to the device marks its reply
+    stale rather than dropping it. Passing max_age bounds the age of
+    anything returned (max_age=0 always queries the device). Runs on the
+    transport loop only.
+    """
+
+    def __init__(self, ttl=STATUS_TTL, stale_ttl=STATUS_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}  # ip -> (monotonic time the request was sent, reply)
+        self._invalidated = {}  # ip -> monotonic time of the last command to it
+        self._invalidated_all = float("-inf")
+        self._inflight = {}  # ip -> Task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def _refresh(self, dev, timeout):
+        task = self._inflight.get(dev.ip)
+        if task is not None:
+            self.shared += 1
+            return task
+        task = self._inflight[dev.ip] = asyncio.ensure_future(self._fetch(dev, timeout))
+        return task
+
+    async def _fetch(self, dev, timeout):
+        ip = dev.ip
+        try:
+            sent_at = time.monotonic()
+            reply = await dev.send_async(dev._wrap_msg("devStatus", {}), expect_reply=True, timeout=timeout)
+            if reply is not None:
+                self._entries[ip] = (sent_at, reply)
+            return reply
+        except Exception as e:
+            print(f"[STATUS] Refresh of {ip} failed: {e!r}")
+            return None
+        finally:
+            self._inflight.pop(ip, None)
+
+    async def get(self, dev, max_age=None, refresh=False, timeout=1.0):
+        """Return (reply, age in seconds, source) where source is fresh, stale or live"""
+        entry = self._entries.get(dev.ip)
+        if entry is not None and not refresh and max_age != 0:
+            age = time.monotonic() - entry[0]
+            if not self._is_stale(dev.ip, entry) and age <= (self.ttl if max_age is None else max_age):
+                self.hits += 1
+                return entry[1], age, "fresh"
+            if age <= (self.stale_ttl if max_age is None else min(max_age, self.stale_ttl)):
+                self.stale_hits += 1
+                self._refresh(dev, timeout)
+                return entry[1], age, "stale"
+        self.misses += 1
+        # shield: a caller giving up must not cancel the request others share
+        reply = await asyncio.shield(self._refresh(dev, timeout))
+        return reply, 0.0, "live"
+
+    def _is_stale(self, ip, entry):
+        """True if a command went to the device after this reply was requested"""
+        return entry[0] <= max(self._invalidated.get(ip, float("-inf")), self._invalidated_all)
+
+    def invalidate(self, ip=None):
+        """Mark cached replies stale (after a command changed the device state)"""
+        now = time.monotonic()
+        if ip is None:
+            self._invalidated_all = now
+        else:
+            self._invalidated[ip] = now
+
+    def configure(self, ttl=None, stale_ttl=None):
+        if ttl is not None:
+            self.ttl = ttl
+        if stale_ttl is not None:
+            self.stale_ttl = stale_ttl
+
+    async def snapshot(self):
+        now = time.monotonic()
+        return {
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "devices": {ip: {"age": round(now - entry[0], 3), "stale": self._is_stale(ip, entry),
+                             "in_flight": ip in self._inflight}
+                        for ip, entry in self._entries.items()},
+        }
+
+
+status_cache = StatusCache()
+
+# -------------------------
+# Device State Model
+# -------------------------
+STATE_RECONCILE_INTERVAL = 30.0  # seconds between devStatus checks of the optimistic state
+STATE_FIELDS = ("power", "brightness", "color", "color_temp", "scene", "mode")
+
+
+class DeviceStateStore:
+    """
+    Optimistic per-device state (power, brightness, color, color_temp, scene).
+
+    Updated from every command as it is actually transmitted, and reconciled
+    against devStatus replies: a reported field only overwrites the local
+    value if no newer command touched it after the request went out.
+    Fields set by a request whose reply never came are listed as
+    unconfirmed until a devStatus reply or a newer command settles them.
+    Runs on the transport loop only.
+    """
+
+    def __init__(self, interval=STATE_RECONCILE_INTERVAL):
+        self.interval = interval
+        self._states = {}  # ip -> {field: value}
+        self._changed = {}  # ip -> {field: monotonic time of the last optimistic update}
+        self._meta = {}  # ip -> {"updated", "verified", "corrections", "unconfirmed"}
+        self._task = None
+        self._listeners = []  # callables(ip) run on every change, e.g. WebSocket state pushes
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, ip):
+        for callback in self._listeners:
+            callback(ip)
+
+    def _meta_for(self, ip):
+        return self._meta.setdefault(ip, {"updated": None, "verified": None, "corrections": 0, "unconfirmed": set()})
+
+    def _set(self, ip, now, **fields):
+        state = self._states.setdefault(ip, dict.fromkeys(STATE_FIELDS))
+        changed = self._changed.setdefault(ip, {})
+        meta = self._meta_for(ip)
+        for key, value in fields.items():
+            state[key] = value
+            changed[key] = now
+            meta["unconfirmed"].discard(key)
+        meta["updated"] = now
+        self._notify(ip)
+        return now
+
+    def apply(self, ip, msg):
+        """Record the effect of an outgoing command; returns its update time (None if it changed nothing)"""
+        cmd = msg.get("cmd")
+        data = msg.get("data") or {}
+        now = time.monotonic()
+        try:
+            if cmd == "turn":
+                return self._set(ip, now, power=bool(data.get("value")))
+            elif cmd == "brightness":
+                return self._set(ip, now, brightness=int(data["value"]))
+            elif cmd == "colorwc":
+                kelvin = int(data.get("colorTemInKelvin") or 0)
+                if kelvin:
+                    return self._set(ip, now, color_temp=kelvin, mode="ct", scene=None)
+                elif isinstance(data.get("color"), dict):
+                    c = data["color"]
+                    return self._set(ip, now, color={"r": int(c.get("r", 0)), "g": int(c.get("g", 0)), "b": int(c.get("b", 0))},
+                                     color_temp=0, mode="color", scene=None)
+            elif cmd == "scene":
+                return self._set(ip, now, scene=data.get("sceneId"), mode="scene")
+        except (KeyError, TypeError, ValueError):
+            pass  # malformed raw command; the device will tell us on the next reconcile
+        return None
+
+    def mark_unconfirmed(self, ip, applied_at):
+        """Flag the fields set at applied_at (and not changed since) as not acknowledged by the device"""
+        changed = self._changed.get(ip, {})
+        fields = {key for key, t in changed.items() if t == applied_at}
+        if fields:
+            self._meta_for(ip)["unconfirmed"].update(fields)
+            self._notify(ip)
+
+    def reconcile(self, ip, reply, sent_at):
+        """Merge a devStatus reply for a request sent at monotonic time sent_at; True if it corrected our state"""
+        data = ((reply or {}).get("msg") or {}).get("data")
+        if not isinstance(data, dict):
+            return False
+        reported = {}
+        if "onOff" in data:
+            reported["power"] = bool(data["onOff"])
+        if "brightness" in data:
+            reported["brightness"] = data["brightness"]
+        if isinstance(data.get("color"), dict):
+            reported["color"] = {k: data["color"].get(k, 0) for k in ("r", "g", "b")}
+        if "colorTemInKelvin" in data:
+            reported["color_temp"] = data["colorTemInKelvin"]
+
+        state = self._states.setdefault(ip, dict.fromkeys(STATE_FIELDS))
+        changed = self._changed.setdefault(ip, {})
+        meta = self._meta_for(ip)
+        corrected = False
+        for key, value in reported.items():
+            if changed.get(key, 0) > sent_at:
+                continue  # a newer command is in flight or was sent after this request
+            if state[key] is not None and state[key] != value:
+                meta["corrections"] += 1
+                corrected = True
+            state[key] = value
+            meta["unconfirmed"].discard(key)
+        if state["mode"] != "scene" and changed.get("mode", 0) <= sent_at and "color_temp" in reported:
+            state["mode"] = "ct" if reported["color_temp"] else "color"
+        meta["verified"] = time.monotonic()
+        self._notify(ip)
+        return corrected
+
+    def start_reconciler(self):
+        """Periodically refresh devStatus for every device with local state"""
+        transport = get_transport()
+        transport.loop.call_soon_threadsafe(self._start_task)
+
+    def _start_task(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._reconcile_loop())
+
+    def stop_reconciler(self):
+        """Cancel the reconcile task (callable from any thread)"""
+        task, self._task = self._task, None
+        if task is not None and not task.get_loop().is_closed():
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            ips = list(self._states)
+            if ips:
+                # max_age reuses replies that other callers fetched recently
+                await asyncio.gather(*(status_cache.get(devices.get(ip), max_age=self.interval) for ip in ips),
+                                     return_exceptions=True)
+
+    def _render(self, ip, now):
+        meta = self._meta.get(ip, {})
+        age = lambda t: round(now - t, 3) if t is not None else None
+        return {**self._states.get(ip, dict.fromkeys(STATE_FIELDS)),
+                "updated_age": age(meta.get("updated")),
+                "verified_age": age(meta.get("verified")),
+                "corrections": meta.get("corrections", 0),
+                "unconfirmed": sorted(meta.get("unconfirmed", ()))}
+
+    async def snapshot(self, ip=None):
+        now = time.monotonic()
+        if ip is not None:
+            return self._render(ip, now)
+        return {dev_ip: self._render(dev_ip, now) for dev_ip in self._states}
+
+
+device_state = DeviceStateStore()
+
 # -------------------------
 # GoveeLAN Library (embedded) - Enhanced
 # -------------------------
@@ -86,9 +824,19 @@ class GoveeLAN:
         self.color_mode = "rgb"  # or "ct" for color temperature
         self.device = device
         self.sku = sku
+        self._metrics = None
 
     def set_ip(self, ip: str):
         self.ip = ip.strip()
+        self._metrics = None
+
+    @property
+    def metrics(self) -> _DeviceMetrics:
+        """Metric children for this device's IP (created on first send)"""
+        m = self._metrics
+        if m is None:
+            m = self._metrics = _DeviceMetrics(self.ip)
+        return m
 
     def set_device_info(self, device: Optional[str] = None, sku: Optional[str] = None):
         if device is not None:
@@ -109,44 +857,164 @@ class GoveeLAN:
     def _wrap_msg(self, cmd: str, data: Optional[dict] = None):
         return {"msg": {"cmd": cmd, "data": data or {}}}
 
-    def _send(self, payload: dict, expect_reply: bool = False, timeout: float = 1.0, device: Optional[str] = None, sku: Optional[str] = None):
-        """Send UDP packet with automatic retry on failure"""
-        last_error = None
+    def _encode(self, payload: dict, device: Optional[str] = None, sku: Optional[str] = None):
         payload = self._with_device_info(payload, device=device, sku=sku)
-        
+        return payload, json.dumps(payload).encode("utf-8")
+
+    def _parse_reply(self, data: bytes):
+        txt = data.decode("utf-8", errors="ignore")
+        try:
+            result = json.loads(txt)
+            self.last_status = result
+            return result
+        except Exception:
+            return {"raw": txt}
+
+    async def send_async(self, payload: dict, expect_reply: bool = False, timeout: float = 1.0, device: Optional[str] = None, sku: Optional[str] = None, stream: bool = False):
+        """Send on the shared LAN transport; must be awaited on the transport loop"""
+        payload, payload_bytes = self._encode(payload, device=device, sku=sku)
+        return await self.send_encoded_async(payload, payload_bytes, expect_reply=expect_reply, timeout=timeout, stream=stream)
+
+    async def send_encoded_async(self, payload: dict, payload_bytes: bytes, expect_reply: bool = False, timeout: float = 1.0, stream: bool = False):
+        """
+        Send an already serialized payload (lets fan-out reuse one encoding for many devices).
+
+        With expect_reply the parsed reply (None on timeout) is returned.
+        Otherwise a control command is awaited until the send queue transmits
+        it ("sent"), drops it from a full backlog ("dropped") or timeout
+        elapses with it still queued ("queued"); stream frames return None
+        as soon as they are handed to the coalescer.
+        """
+        if not expect_reply:
+            delivery = self._dispatch(payload, payload_bytes, stream)
+            if delivery is None:
+                return None
+            try:
+                return await asyncio.wait_for(asyncio.shield(delivery), timeout)
+            except asyncio.TimeoutError:
+                return "queued"
+
+        ip, port = self.ip, self.port
+        transport = get_transport()
+        last_error = None
+        cmd = payload.get("msg", {}).get("cmd")
+        applied_at = None
+        stream_coalescer.command(ip, cmd)
+        if cmd != "devStatus":
+            status_cache.invalidate(ip)
         for attempt in range(self.retry_count + 1):
             try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                s.settimeout(timeout)
-                
-                payload_bytes = json.dumps(payload).encode("utf-8")
+                await asyncio.wait_for(send_queue.wait_turn(ip, self.sku, cmd), QUEUE_WAIT_TIMEOUT)
                 # Log the packet
-                packet_monitor.log_packet(self.ip, self.port, payload, payload_bytes)
-                # Send it
-                s.sendto(payload_bytes, (self.ip, self.port))
-                
-                if expect_reply:
-                    data, _ = s.recvfrom(65535)
-                    txt = data.decode("utf-8", errors="ignore")
-                    try:
-                        result = json.loads(txt)
-                        self.last_status = result
-                        s.close()
-                        return result
-                    except Exception:
-                        s.close()
-                        return {"raw": txt}
-                
-                s.close()
-                return None
-                
-            except (socket.timeout, ConnectionResetError, OSError) as e:
+                packet_monitor.log_packet(ip, port, payload, payload_bytes)
+                self.metrics.sent.inc()
+                sent_at = time.monotonic()
+                if cmd != "devStatus" and applied_at is None:
+                    applied_at = device_state.apply(ip, payload.get("msg", {}))  # on the wire from here on
+                data = await transport.request(ip, port, payload_bytes, timeout=timeout, expect_cmd=cmd)
+                reply = self._parse_reply(data)
+                if cmd == "devStatus" and device_state.reconcile(ip, reply, sent_at):
+                    stream_coalescer.forget(ip)  # the light is not showing what we last sent
+                return reply
+            except (asyncio.TimeoutError, OSError) as e:
                 last_error = e
                 if attempt < self.retry_count:
-                    time.sleep(self.retry_delay)
-                continue
-        
-        print(f"[GOVEE] Send failed after {self.retry_count + 1} attempts: {last_error}")
+                    self.metrics.retries.inc()
+                    await asyncio.sleep(self.retry_delay)
+            except asyncio.CancelledError:
+                if applied_at is not None:
+                    device_state.mark_unconfirmed(ip, applied_at)
+                raise
+
+        self.metrics.failures.inc()
+        if applied_at is not None:
+            device_state.mark_unconfirmed(ip, applied_at)
+        print(f"[GOVEE] Send failed after {self.retry_count + 1} attempts: {last_error!r}")
+        return None
+
+    def _dispatch(self, payload: dict, payload_bytes: bytes, stream: bool = False, report: bool = False):
+        """
+        Fire-and-forget send through the stream coalescer and send queue; runs on the transport loop.
+
+        Returns a future resolved with "sent", "dropped" or "failed" for
+        control commands. Stream frames return None unless report=True, in
+        which case the future may also resolve "suppressed" or "superseded".
+        """
+        ip, port, sku = self.ip, self.port, self.sku
+        msg = payload.get("msg", {})
+        sv = _stream_value(msg) if stream else None
+        attr = sv[0] if sv else None
+        if msg.get("cmd") != "devStatus":
+            status_cache.invalidate(ip)
+
+        loop = get_transport().loop
+        queued = loop.time()
+        latency = self.metrics.latency
+        delivery = loop.create_future() if attr is None or report else None
+
+        def resolve(outcome):
+            if delivery is not None and not delivery.done():
+                delivery.set_result(outcome)
+
+        def transmit():
+            try:
+                self._transmit(ip, port, payload, payload_bytes)
+            except Exception:
+                resolve("failed")
+                raise
+            latency.observe(loop.time() - queued)
+            resolve("sent")
+
+        def send():
+            send_queue.submit(ip, transmit, attr=attr, sku=sku, cmd=msg.get("cmd"),
+                              on_drop=None if delivery is None else
+                              lambda: resolve("dropped" if attr is None else "superseded"))
+
+        try:
+            stream_coalescer.submit(ip, msg, send, coalesce=stream, on_skip=None if delivery is None else resolve)
+        except Exception as e:
+            print(f"[GOVEE] Send to {ip} failed: {e}")
+            resolve("failed")
+        return delivery
+
+    def _transmit(self, ip: str, port: int, payload: dict, payload_bytes: bytes):
+        packet_monitor.log_packet(ip, port, payload, payload_bytes)
+        get_transport().sendto(payload_bytes, ip, port)
+        device_state.apply(ip, payload.get("msg", {}))
+        self.metrics.sent.inc()
+
+    async def send_ordered_async(self, payload: dict, payload_bytes: bytes):
+        """Send a control command once the send queue grants it a slot; returns once it is on the wire"""
+        ip, port = self.ip, self.port
+        cmd = payload.get("msg", {}).get("cmd")
+        stream_coalescer.command(ip, cmd)
+        if cmd != "devStatus":
+            status_cache.invalidate(ip)
+        await asyncio.wait_for(send_queue.wait_turn(ip, self.sku, cmd), QUEUE_WAIT_TIMEOUT)
+        self._transmit(ip, port, payload, payload_bytes)
+
+    def reply_deadline(self, timeout: float) -> float:
+        """Longest a request/reply send can take: every attempt waits for its queue slot and the reply"""
+        return (self.retry_count + 1) * (QUEUE_WAIT_TIMEOUT + timeout + self.retry_delay)
+
+    def _send(self, payload: dict, expect_reply: bool = False, timeout: float = 1.0, device: Optional[str] = None, sku: Optional[str] = None, stream: bool = False):
+        """
+        Send UDP packet with automatic retry on failure (sync facade over the LAN transport).
+
+        stream=True marks color/brightness frames that may be suppressed or
+        coalesced by the stream coalescer.
+        """
+        try:
+            transport = get_transport()
+            if expect_reply:
+                return transport.run(self.send_async(payload, expect_reply=True, timeout=timeout, device=device, sku=sku),
+                                     timeout=self.reply_deadline(timeout))
+
+            # Fire-and-forget: hand the datagram to the loop and return immediately
+            payload, payload_bytes = self._encode(payload, device=device, sku=sku)
+            transport.loop.call_soon_threadsafe(self._dispatch, payload, payload_bytes, stream)
+        except Exception as e:
+            print(f"[GOVEE] Send failed: {e}")
         return None
 
     def on(self):
@@ -160,19 +1028,19 @@ class GoveeLAN:
     def brightness(self, v: int):
         """Set brightness (1-100)"""
         v = max(1, min(100, int(v)))
-        return self._send(self._wrap_msg("brightness", {"value": v}))
+        return self._send(self._wrap_msg("brightness", {"value": v}), stream=True)
 
     def rgb(self, r: int, g: int, b: int):
         """Set RGB color (0-255 per channel)"""
         r = max(0, min(255, int(r)))
         g = max(0, min(255, int(g)))
         b = max(0, min(255, int(b)))
-        return self._send(self._wrap_msg("colorwc", {"color": {"r": r, "g": g, "b": b}}))
+        return self._send(self._wrap_msg("colorwc", {"color": {"r": r, "g": g, "b": b}}), stream=True)
 
     def color_temp(self, kelvin: int):
         """Set color temperature (2000-6500K typical range)"""
         kelvin = max(1000, min(10000, int(kelvin)))
-        return self._send(self._wrap_msg("colorwc", {"colorTemInKelvin": kelvin}))
+        return self._send(self._wrap_msg("colorwc", {"colorTemInKelvin": kelvin}), stream=True)
 
     def scene(self, scene_id: int):
         """Activate a scene (device-specific scene ID)"""
@@ -224,13 +1092,94 @@ class GoveeLAN:
 app = Flask(__name__, static_folder=STATIC_DIR, static_url_path="")
 CORS(app)
 
-govee = GoveeLAN(DEFAULT_IP)
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_latency(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_LATENCY.labels(route, request.method).observe(time.perf_counter() - started)
+    return response
+
+
+def parse_flag(value):
+    """Boolean request flag: true, 1, "1", "true", "yes" and "on" are set; "false", "0", "" and missing are not"""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return value is True or (isinstance(value, (int, float)) and value == 1)
+
+
+class DeviceManager:
+    """
+    Thread-safe registry of GoveeLAN instances, one per device IP.
+
+    Endpoints look their target up here instead of retargeting a shared
+    client, so parallel requests for different lights never race on
+    ip/device/sku and each light keeps its own last_status.
+    """
+
+    def __init__(self, default_ip: str = DEFAULT_IP):
+        self.default_ip = default_ip
+        self._lock = threading.Lock()
+        self._by_ip = {}
+
+    def set_default_ip(self, ip: str):
+        if ip and ip.strip():
+            self.default_ip = ip.strip()
+
+    def get(self, ip: Optional[str] = None, device: Optional[str] = None, sku: Optional[str] = None) -> GoveeLAN:
+        """
+        Return the client for an IP, a discovered device ID, or the default device.
+
+        Raises LookupError for a device ID discovery has not seen rather than
+        falling back to the default light.
+        """
+        if not ip and device:
+            ip = device_registry.find_ip(device)
+            if ip is None:
+                raise LookupError(f"Device {device} not discovered")
+        ip = (ip or self.default_ip).strip()
+        known = device_registry.info_for_ip(ip)
+        with self._lock:
+            dev = self._by_ip.pop(ip, None)
+            if dev is None:
+                dev = GoveeLAN(ip)
+                dev.set_device_info(*(known or (device, sku)))
+                self._evict()
+            elif known and known != (dev.device, dev.sku):
+                dev.set_device_info(*known)  # the registry saw a different device answer on this IP
+            elif not known and (device or sku) and not (dev.device or dev.sku):
+                dev.set_device_info(device=device, sku=sku)  # first identity for an undiscovered IP
+            self._by_ip[ip] = dev  # most recently used last
+        return dev
+
+    def _evict(self):
+        """Drop the least recently used clients for IPs the registry no longer knows (lock held)"""
+        excess = len(self._by_ip) + 1 - MAX_DEVICE_CLIENTS
+        if excess <= 0:
+            return
+        for ip in [ip for ip in self._by_ip if ip != self.default_ip and device_registry.info_for_ip(ip) is None][:excess]:
+            del self._by_ip[ip]
+
+    def from_request(self, data: dict) -> GoveeLAN:
+        """Resolve the target of an API request body ({ip, device, sku}); LookupError for an undiscovered device"""
+        return self.get(data.get("ip"), device=data.get("device"), sku=data.get("sku"))
+
+    def all(self):
+        with self._lock:
+            return list(self._by_ip.values())
+
+
+devices = DeviceManager()
 
 # Automation state
-automation_running = False
-automation_thread = None
-automation_last_fired = set()
 rules = []
+rules_location = None  # {"lat", "lon"} for sunrise/sunset rules
 
 
 # -------------------------
@@ -258,85 +1207,350 @@ def get_local_ipv4s():
     return sorted(ips)
 
 
-def scan_interface(local_ip, timeout=2.0):
-    """Scan for Govee devices on a specific interface"""
-    found = []
+SCAN_MSG = json.dumps({"msg": {"cmd": "scan", "data": {"account_topic": "reserve"}}}).encode("utf-8")
+
+
+def open_discovery_socket(local_ips):
+    """Open the single port-4002 receive socket, joined to the multicast group on every interface"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
         sock.bind(("0.0.0.0", RECV_PORT))
-        sock.settimeout(0.4)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        for local_ip in local_ips:
+            try:
+                mreq = socket.inet_aton(MCAST_GRP) + socket.inet_aton(local_ip)
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+            except OSError as e:
+                print(f"[DISCOVERY] Cannot join multicast on {local_ip}: {e}")
+    except Exception:
+        sock.close()
+        raise
+    return sock
 
-        # Join multicast on this interface
-        mreq = socket.inet_aton(MCAST_GRP) + socket.inet_aton(local_ip)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
 
-        # Force multicast out of this interface
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(local_ip))
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+def send_scan_probes(sock, local_ips):
+    """Send the scan request out of every interface, plus one broadcast fallback"""
+    for local_ip in local_ips:
+        try:
+            # Force multicast out of this interface
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(local_ip))
+            sock.sendto(SCAN_MSG, (MCAST_GRP, SCAN_PORT))
+        except OSError as e:
+            print(f"[DISCOVERY] Scan probe from {local_ip} failed: {e}")
+    try:
+        sock.sendto(SCAN_MSG, ("255.255.255.255", SCAN_PORT))
+    except OSError as e:
+        print(f"[DISCOVERY] Broadcast probe failed: {e}")
+    for addr in SCAN_ADDRS:
+        try:
+            sock.sendto(SCAN_MSG, (addr, SCAN_PORT))
+        except OSError as e:
+            print(f"[DISCOVERY] Scan probe to {addr} failed: {e}")
+
+
+def parse_scan_reply(pkt, addr):
+    """Turn a scan reply into the device dict returned by /api/discover"""
+    ip = addr[0]
+    txt = pkt.decode("utf-8", errors="ignore")
+    try:
+        obj = json.loads(txt)
+    except Exception:
+        obj = {"raw": txt}
 
-        # Send scan message
-        scan_msg = {"msg": {"cmd": "scan", "data": {"account_topic": "reserve"}}}
-        data = json.dumps(scan_msg).encode("utf-8")
-        sock.sendto(data, (MCAST_GRP, SCAN_PORT))
-        sock.sendto(data, ("255.255.255.255", SCAN_PORT))
+    dev = {"ip": ip, "data": obj}
+    # Try to extract model/type info
+    msg = obj.get("msg", {}) if isinstance(obj, dict) else {}
+    info = msg.get("data") if isinstance(msg.get("data"), dict) else {}
+    dev["device_type"] = msg.get("devType") or info.get("devType", "Unknown")
+    dev["device_name"] = msg.get("devName") or info.get("devName") or f"Govee Light ({ip})"
+    dev["sku"] = msg.get("sku") or info.get("sku", "N/A")
+    return dev
+
+
+def iter_discovery(local_ips=None, timeout=2.0, expected=None):
+    """
+    Scan every interface at once and yield devices as their replies arrive.
+
+    All probes go out up front and share one receive socket and one deadline,
+    so a multi-NIC host waits `timeout` seconds in total, not per interface.
+    Stops early once `expected` unique devices have been seen.
+    """
+    start = time.monotonic()
+    if local_ips is None:
+        local_ips = get_local_ipv4s()
+    sock = open_discovery_socket(local_ips)
+    try:
+        send_scan_probes(sock, local_ips)
 
-        # Collect replies
-        end = time.time() + timeout
         seen_ips = set()
-        while time.time() < end:
+        end = time.monotonic() + timeout
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([sock], [], [], remaining)
+            if not ready:
+                continue
             try:
                 pkt, addr = sock.recvfrom(65535)
-                ip = addr[0]
-                if ip in seen_ips:
-                    continue
-                seen_ips.add(ip)
-                
-                txt = pkt.decode("utf-8", errors="ignore")
-                try:
-                    obj = json.loads(txt)
-                    found.append({"ip": ip, "data": obj})
-                except Exception:
-                    found.append({"ip": ip, "data": {"raw": txt}})
-            except socket.timeout:
+            except (ConnectionResetError, OSError):
+                continue
+            if addr[0] in seen_ips:
                 continue
+            seen_ips.add(addr[0])
+            yield parse_scan_reply(pkt, addr)
+            if expected and len(seen_ips) >= expected:
+                break
+    finally:
         sock.close()
+        DISCOVERY_DURATION.observe(time.monotonic() - start)
+
+
+def scan_interface(local_ip, timeout=2.0):
+    """Scan for Govee devices on a specific interface"""
+    try:
+        return list(iter_discovery([local_ip], timeout=timeout))
     except Exception as e:
         print(f"Error scanning {local_ip}: {e}")
-    return found
+        return []
+
+
+def _device_key(dev):
+    msg = dev.get("data", {}).get("msg", {}) if isinstance(dev.get("data"), dict) else {}
+    info = msg.get("data") if isinstance(msg.get("data"), dict) else {}
+    return msg.get("device") or info.get("device") or dev["ip"]
+
+
+def _device_sku(dev):
+    msg = dev.get("data", {}).get("msg", {}) if isinstance(dev.get("data"), dict) else {}
+    info = msg.get("data") if isinstance(msg.get("data"), dict) else {}
+    return info.get("sku") or msg.get("sku")
+
+
+class DeviceRegistry:
+    """Discovered devices keyed by device ID, with TTL-based expiry"""
+
+    def __init__(self, ttl=DEVICE_TTL):
+        self.ttl = ttl
+        self._cond = threading.Condition()
+        self._devices = {}  # device id -> entry
+        self._by_ip = {}  # ip -> device id
+
+    def update(self, dev):
+        """Record a scan reply; returns the stored entry"""
+        key = _device_key(dev)
+        DISCOVERED_DEVICES.inc()
+        with self._cond:
+            old = self._devices.get(key)
+            if old and old["ip"] != dev["ip"]:
+                print(f"[DISCOVERY] {key} moved {old['ip']} -> {dev['ip']}")
+                if self._by_ip.get(old["ip"]) == key:
+                    del self._by_ip[old["ip"]]
+            entry = dict(dev)
+            entry["device"] = key
+            entry["last_seen"] = time.time()
+            entry["_seen_mono"] = time.monotonic()
+            entry["_sku"] = _device_sku(dev)
+            self._devices[key] = entry
+            if key != dev["ip"]:
+                self._by_ip[dev["ip"]] = key
+            self._cond.notify_all()
+            return entry
+
+    def expire(self):
+        cutoff = time.monotonic() - self.ttl
+        with self._cond:
+            for key in [k for k, e in self._devices.items() if e["_seen_mono"] < cutoff]:
+                entry = self._devices.pop(key)
+                if self._by_ip.get(entry["ip"]) == key:
+                    del self._by_ip[entry["ip"]]
+
+    def snapshot(self, since=None):
+        """Public view of every live device, optionally only those seen after `since` (monotonic)"""
+        self.expire()
+        with self._cond:
+            entries = [e for e in self._devices.values() if since is None or e["_seen_mono"] >= since]
+        return [{k: v for k, v in e.items() if not k.startswith("_")} for e in entries]
+
+    def find_ip(self, device_id):
+        with self._cond:
+            entry = self._devices.get(device_id)
+            return entry["ip"] if entry else None
+
+    def info_for_ip(self, ip):
+        """(device id, sku) of the device last seen at an IP, or None"""
+        with self._cond:
+            key = self._by_ip.get(ip)
+            return (key, self._devices[key]["_sku"]) if key else None
+
+    def wait(self, timeout):
+        """Block until the registry changes or timeout elapses"""
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._devices)
+
+
+class DiscoveryService:
+    """
+    Long-running discovery: keeps port 4002 open, probes every
+    DISCOVERY_PROBE_INTERVAL seconds and feeds replies into the registry,
+    so /api/discover can answer from memory and DHCP moves are picked up
+    on the next probe.
+    """
+
+    def __init__(self, registry, interval=DISCOVERY_PROBE_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self.running = False
+        self._sock = None
+        self._local_ips = []
+        self._thread = None
+        self._lock = threading.Lock()
+        self._next_probe = 0.0
+
+    def start(self):
+        """Start the listener thread (idempotent); returns False if port 4002 is unavailable"""
+        with self._lock:
+            if self.running:
+                return True
+            try:
+                self._open()
+            except OSError as e:
+                print(f"[DISCOVERY] Background service unavailable: {e}")
+                return False
+            self.running = True
+            self._thread = threading.Thread(target=self._run, name="govee-discovery", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            self.running = False
+            sock, self._sock = self._sock, None
+        if sock:
+            sock.close()
+
+    def _open(self):
+        self._local_ips = get_local_ipv4s()
+        self._sock = open_discovery_socket(self._local_ips)
+
+    def probe(self):
+        """Send scan probes now (safe from any thread); False if the listener socket is unavailable"""
+        with self._lock:
+            if not self.running:
+                return False
+            ips = get_local_ipv4s()
+            if self._sock is None or ips != self._local_ips:
+                if self._sock is not None:
+                    # Interfaces changed (VPN up, Wi-Fi switch): rejoin the group everywhere
+                    print(f"[DISCOVERY] Interfaces changed: {self._local_ips} -> {ips}")
+                    sock, self._sock = self._sock, None
+                    sock.close()
+                try:
+                    self._open()
+                except OSError as e:
+                    print(f"[DISCOVERY] Could not reopen the listener: {e}")
+                    self._next_probe = time.monotonic() + DISCOVERY_REOPEN_INTERVAL
+                    return False
+            send_scan_probes(self._sock, self._local_ips)
+            self._next_probe = time.monotonic() + self.interval
+            return True
+
+    def refresh(self, timeout=2.0, expected=None):
+        """Probe now and yield devices as they answer, until timeout or `expected` devices replied"""
+        start = time.monotonic()
+        if not self.probe():
+            # Listener socket is down (port taken, interface gone): scan on a one-off socket instead
+            yield from iter_discovery(timeout=timeout, expected=expected)  # observes DISCOVERY_DURATION itself
+            return
+        end = start + timeout
+        sent = set()
+        try:
+            while True:
+                for dev in self.registry.snapshot(since=start):
+                    if dev["device"] not in sent:
+                        sent.add(dev["device"])
+                        yield dev
+                remaining = end - time.monotonic()
+                if remaining <= 0 or (expected and len(sent) >= expected):
+                    return
+                self.registry.wait(remaining)
+        finally:
+            DISCOVERY_DURATION.observe(time.monotonic() - start)
+
+    def _run(self):
+        while self.running:
+            try:
+                if time.monotonic() >= self._next_probe:
+                    self.probe()
+                    self.registry.expire()
+                sock = self._sock
+                wait = max(0.0, min(1.0, self._next_probe - time.monotonic()))
+                if sock is None:
+                    time.sleep(wait)  # probe() reopens the socket when the retry is due
+                    continue
+                ready, _, _ = select.select([sock], [], [], wait)
+                if not ready:
+                    continue
+                pkt, addr = sock.recvfrom(65535)
+                if pkt == SCAN_MSG:
+                    continue  # our own multicast looped back
+                self.registry.update(parse_scan_reply(pkt, addr))
+            except (ConnectionResetError, OSError, ValueError) as e:
+                if self.running:
+                    print(f"[DISCOVERY] Listener error: {e}")
+                    time.sleep(0.5)
+
+
+device_registry = DeviceRegistry()
+discovery_service = DiscoveryService(device_registry)
 
 
 @app.route("/api/discover", methods=["GET"])
 def discover_devices():
-    """Scan network for Govee devices"""
+    """
+    Return Govee devices known to the background discovery service.
+
+    Query params: refresh=1 (probe now and wait for replies), timeout
+    (seconds, default 2), expected (return as soon as this many devices
+    answered) and stream=1 (newline-delimited JSON, one device per line
+    as replies arrive). An empty registry is refreshed automatically.
+    """
     try:
+        timeout = max(0.1, min(float(request.args.get("timeout", 2.0)), 30.0))
+        expected = request.args.get("expected", type=int)
+        stream = parse_flag(request.args.get("stream"))
+        refresh = parse_flag(request.args.get("refresh"))
+
+        if discovery_service.start():
+            if not refresh and len(device_registry):
+                cached = device_registry.snapshot()
+                if stream:
+                    return Response("".join(json.dumps(d) + "\n" for d in cached), mimetype="application/x-ndjson")
+                return jsonify({"status": "ok", "devices": cached, "cached": True})
+            scan = discovery_service.refresh(timeout=timeout, expected=expected)
+        else:
+            # Port 4002 is held by someone else: fall back to a one-off scan
+            scan = iter_discovery(timeout=timeout, expected=expected)
+
         print("[DISCOVERY] Starting device scan...")
-        devices = []
-        ips = get_local_ipv4s()
-        print(f"[DISCOVERY] Local IPs: {ips}")
-        
-        for local_ip in ips:
-            print(f"[DISCOVERY] Scanning from {local_ip}...")
-            results = scan_interface(local_ip, timeout=2.0)
-            devices.extend(results)
-        
-        # Deduplicate by IP and enrich with model info
-        seen = {}
-        for dev in devices:
-            ip = dev["ip"]
-            if ip not in seen:
-                seen[ip] = dev
-                # Try to extract model/type info
-                data = dev.get("data", {})
-                msg = data.get("msg", {})
-                dev["device_type"] = msg.get("devType", "Unknown")
-                dev["device_name"] = msg.get("devName", f"Govee Light ({ip})")
-                dev["sku"] = msg.get("sku", "N/A")
-        
-        unique_devices = list(seen.values())
+        if stream:
+            def generate():
+                try:
+                    for dev in scan:
+                        yield json.dumps(dev) + "\n"
+                except Exception as e:
+                    yield json.dumps({"status": "error", "message": str(e)}) + "\n"
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        unique_devices = list(scan)
         print(f"[DISCOVERY] Found {len(unique_devices)} unique device(s)")
-        return jsonify({"status": "ok", "devices": unique_devices})
+        return jsonify({"status": "ok", "devices": unique_devices, "cached": False})
     except Exception as e:
         print(f"Error in discover_devices: {e}")
         return jsonify({"status": "error", "message": str(e)}), 400
@@ -356,10 +1570,7 @@ def device_on():
         print("[DEBUG] /api/device/on raw body:", raw)
         data = request.get_json(silent=True) or {}
         print("[DEBUG] /api/device/on parsed json:", data)
-        ip = data.get("ip") or govee.ip
-        if ip:
-            govee.set_ip(ip)
-        result = govee.on()
+        devices.from_request(data).on()
         return jsonify({"status": "ok", "action": "on"})
     except Exception as e:
         print(f"Error in device_on: {e}")
@@ -379,10 +1590,7 @@ def device_off():
         print("[DEBUG] /api/device/off raw body:", raw)
         data = request.get_json(silent=True) or {}
         print("[DEBUG] /api/device/off parsed json:", data)
-        ip = data.get("ip") or govee.ip
-        if ip:
-            govee.set_ip(ip)
-        result = govee.off()
+        devices.from_request(data).off()
         return jsonify({"status": "ok", "action": "off"})
     except Exception as e:
         print(f"Error in device_off: {e}")
@@ -402,11 +1610,8 @@ def device_brightness():
         print("[DEBUG] /api/device/brightness raw body:", raw)
         data = request.get_json(silent=True) or {}
         print("[DEBUG] /api/device/brightness parsed json:", data)
-        ip = data.get("ip") or govee.ip
         v = data.get("value", 50)
-        if ip:
-            govee.set_ip(ip)
-        govee.brightness(int(v))
+        devices.from_request(data).brightness(int(v))
         return jsonify({"status": "ok", "action": "brightness", "value": v})
     except Exception as e:
         print(f"Error in device_brightness: {e}")
@@ -419,15 +1624,8 @@ def device_color_temperature():
         return "", 200
     try:
         data = request.get_json(silent=True) or {}
-        ip = data.get("ip") or govee.ip
         kelvin = data.get("value", 4000)
-        device = data.get("device")
-        sku = data.get("sku")
-        if ip:
-            govee.set_ip(ip)
-        if device or sku:
-            govee.set_device_info(device=device, sku=sku)
-        govee.color_temp(int(kelvin))
+        devices.from_request(data).color_temp(int(kelvin))
         return jsonify({"status": "ok", "action": "color-temperature", "value": kelvin})
     except Exception as e:
         print(f"Error in device_color_temperature: {e}")
@@ -447,13 +1645,10 @@ def device_color():
         print("[DEBUG] /api/device/color raw body:", raw)
         data = request.get_json(silent=True) or {}
         print("[DEBUG] /api/device/color parsed json:", data)
-        ip = data.get("ip") or govee.ip
         r = data.get("r", 255)
         g = data.get("g", 0)
         b = data.get("b", 0)
-        if ip:
-            govee.set_ip(ip)
-        govee.rgb(int(r), int(g), int(b))
+        devices.from_request(data).rgb(int(r), int(g), int(b))
         return jsonify({"status": "ok", "action": "color", "r": r, "g": g, "b": b})
     except Exception as e:
         print(f"Error in device_color: {e}")
@@ -467,10 +1662,7 @@ def device_scene():
         return "", 200
     try:
         data = request.get_json(silent=True) or {}
-        ip = data.get("ip") or govee.ip
         scene_id = data.get("sceneId", data.get("scene_id"))
-        device = data.get("device")
-        sku = data.get("sku")
 
         if scene_id is None:
             return jsonify({"status": "error", "message": "sceneId is required"}), 400
@@ -478,12 +1670,8 @@ def device_scene():
         scene_int = int(scene_id)
         if scene_int < 0:
             return jsonify({"status": "error", "message": "sceneId must be non-negative"}), 400
-        if ip:
-            govee.set_ip(ip)
-        if device or sku:
-            govee.set_device_info(device=device, sku=sku)
 
-        govee.scene(scene_int)
+        devices.from_request(data).scene(scene_int)
         return jsonify({"status": "ok", "action": "scene", "sceneId": scene_int})
     except ValueError:
         return jsonify({"status": "error", "message": "sceneId must be a number"}), 400
@@ -499,61 +1687,139 @@ def device_raw():
         return "", 200
     try:
         data = request.get_json(silent=True) or {}
-        ip = data.get("ip") or govee.ip
         cmd = data.get("cmd")
         payload = data.get("payload")
-        expect_reply = bool(data.get("expect_reply", False))
+        expect_reply = parse_flag(data.get("expect_reply", False))
         timeout = float(data.get("timeout", 1.0))
         device = data.get("device")
         sku = data.get("sku")
 
-        if ip:
-            govee.set_ip(ip)
-        if device or sku:
-            govee.set_device_info(device=device, sku=sku)
+        dev = devices.from_request(data)
 
         if payload:
             if not isinstance(payload, dict):
                 return jsonify({"status": "error", "message": "payload must be an object"}), 400
-            resp = govee.send_payload(payload, expect_reply=expect_reply, timeout=timeout, device=device, sku=sku)
+            resp = dev.send_payload(payload, expect_reply=expect_reply, timeout=timeout, device=device, sku=sku)
         else:
             if not cmd:
                 return jsonify({"status": "error", "message": "cmd or payload is required"}), 400
             msg_data = data.get("data") or {}
             if not isinstance(msg_data, dict):
                 return jsonify({"status": "error", "message": "data must be an object"}), 400
-            resp = govee.send_command(cmd, msg_data, expect_reply=expect_reply, timeout=timeout, device=device, sku=sku)
+            resp = dev.send_command(cmd, msg_data, expect_reply=expect_reply, timeout=timeout, device=device, sku=sku)
 
-        return jsonify({"status": "ok", "response": resp, "ip": govee.ip})
+        return jsonify({"status": "ok", "response": resp, "ip": dev.ip})
     except Exception as e:
         print(f"Error in device_raw: {e}")
         return jsonify({"status": "error", "message": str(e)}), 400
 
 
-@app.route("/api/device/scene", methods=["POST", "OPTIONS"])
-def device_scene():
-    """Activate an official Govee sceneId (matches the scene list from the mobile app)."""
-    if request.method == "OPTIONS":
-        return "", 200
+MAX_BATCH_OPS = 1000
+
+
+def _is_command(cmd):
+    return isinstance(cmd, str) and bool(cmd.strip())
+
+
+def collect_results(jobs, deadline):
+    """
+    Await (result, send coroutine, expect_reply) jobs on the transport loop
+    and record each outcome in its result dict.
+
+    Results start out as "timeout"; anything still unfinished after
+    `deadline` seconds keeps that status.
+    """
+    async def one(result, coro, expect_reply):
+        try:
+            reply = await coro
+        except Exception as e:
+            result.update(status="error", message=str(e))
+            return
+        if expect_reply:
+            result.update(status="ok" if reply is not None else "timeout", response=reply)
+        else:
+            result["status"] = reply or "sent"  # sent, queued, dropped or failed
+            if reply == "dropped":
+                result["message"] = "Send queue backlog full"
+
+    async def run():
+        await asyncio.gather(*(one(*job) for job in jobs))
+
+    if not jobs:
+        return
     try:
-        data = request.get_json(silent=True) or {}
-        ip = data.get("ip") or govee.ip
-        scene_id = data.get("sceneId") or data.get("scene_id")
-        device = data.get("device")
-        sku = data.get("sku")
+        get_transport().run(run(), timeout=deadline)
+    except concurrent.futures.TimeoutError:
+        print(f"[QUEUE] {sum(1 for result, _coro, _expect in jobs if result['status'] == 'timeout')} send(s) still unfinished after {deadline:.1f}s")
 
-        if not scene_id:
-            return jsonify({"status": "error", "message": "sceneId is required"}), 400
 
-        if ip:
-            govee.set_ip(ip)
-        if device or sku:
-            govee.set_device_info(device=device, sku=sku)
+def run_batch(ops, default_timeout=1.0):
+    """
+    Execute many LAN operations in one pass on the transport loop.
 
-        govee.scene(scene_id)
-        return jsonify({"status": "ok", "action": "scene", "sceneId": scene_id})
+    Every datagram is sent before any reply is awaited, replies are collected
+    concurrently, and results come back in the order of `ops`.
+    """
+    results = []
+    jobs = []
+    deadline = 0.0
+    for op in ops:
+        try:
+            if not isinstance(op, dict):
+                raise ValueError("operation must be an object")
+            if not op.get("ip") and not op.get("device"):
+                raise ValueError("ip or device is required")  # never fall back to the default light
+            if not all(isinstance(op.get(k) or "", str) for k in ("ip", "device", "sku")):
+                raise ValueError("ip, device and sku must be strings")
+            if not op.get("ip") and device_registry.find_ip(op["device"]) is None:
+                raise ValueError("Device not discovered")
+            payload = op.get("payload")
+            if payload is not None:
+                if not isinstance(payload, dict):
+                    raise ValueError("payload must be an object")
+                msg = payload.get("msg")
+                if not isinstance(msg, dict) or not _is_command(msg.get("cmd")):
+                    raise ValueError("payload.msg.cmd must be a non-empty string")
+            elif not _is_command(op.get("cmd")):
+                raise ValueError("cmd must be a non-empty string")
+            dev = devices.from_request(op)
+            if payload is None:
+                msg_data = op.get("data") or {}
+                if not isinstance(msg_data, dict):
+                    raise ValueError("data must be an object")
+                payload = dev._wrap_msg(op["cmd"], msg_data)
+            payload, payload_bytes = dev._encode(payload, device=op.get("device"), sku=op.get("sku"))
+            expect_reply = parse_flag(op.get("expect_reply", False))
+            timeout = float(op.get("timeout", default_timeout))
+            stream = parse_flag(op.get("coalesce", False))
+        except (TypeError, ValueError) as e:
+            results.append({"status": "error", "message": str(e)})
+            continue
+        result = {"ip": dev.ip, "status": "timeout"}
+        results.append(result)
+        deadline = max(deadline, dev.reply_deadline(timeout))
+        jobs.append((result, dev.send_encoded_async(payload, payload_bytes, expect_reply=expect_reply, timeout=timeout, stream=stream), expect_reply))
+
+    collect_results(jobs, deadline)
+    return results
+
+
+@app.route("/api/device/batch", methods=["POST", "OPTIONS"])
+def device_batch():
+    """Send a list of {ip, cmd, data, expect_reply} (or {ip, payload}) operations in one request."""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        data = request.get_json(silent=True)
+        ops = data if isinstance(data, list) else (data or {}).get("ops")
+        if not isinstance(ops, list):
+            return jsonify({"status": "error", "message": "ops must be a list"}), 400
+        if len(ops) > MAX_BATCH_OPS:
+            return jsonify({"status": "error", "message": f"At most {MAX_BATCH_OPS} operations per batch"}), 400
+        timeout = float(data.get("timeout", 1.0)) if isinstance(data, dict) else 1.0
+        return jsonify({"status": "ok", "results": run_batch(ops, default_timeout=timeout)})
     except Exception as e:
-        print(f"Error in device_scene: {e}")
+        print(f"Error in device_batch: {e}")
         return jsonify({"status": "error", "message": str(e)}), 400
 
 
@@ -566,35 +1832,713 @@ def device_status():
             raw = request.get_data(as_text=True)
         except Exception:
             raw = None
-        print("[DEBUG] /api/device/status headers:", dict(request.headers))
         print("[DEBUG] /api/device/status raw body:", raw)
         data = request.get_json(silent=True) or {}
-        print("[DEBUG] /api/device/status parsed json:", data)
-        ip = data.get("ip") or govee.ip
-        if ip:
-            govee.set_ip(ip)
-        resp = govee.status()
-        return jsonify({"status": "ok", "data": resp})
+        max_age = float(data["max_age"]) if data.get("max_age") is not None else None
+        dev = devices.from_request(data)
+        timeout = float(data.get("timeout", 1.0))
+        resp, age, source = get_transport().run(status_cache.get(
+            dev, max_age=max_age, refresh=parse_flag(data.get("refresh", request.args.get("refresh"))), timeout=timeout), timeout=dev.reply_deadline(timeout))
+        return jsonify({"status": "ok", "data": resp, "age": round(age, 3), "source": source})
     except Exception as e:
         print(f"Error in device_status: {e}")
         return jsonify({"status": "error", "message": str(e)}), 400
 
 
+@app.route("/api/device/state", methods=["GET", "POST", "OPTIONS"])
+def device_state_view():
+    """Last known state from sent commands and devStatus replies (no network I/O); ?all=1 for every device"""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        data = request.get_json(silent=True) if request.method == "POST" else None
+        data = data or request.args.to_dict()
+        transport = get_transport()
+        if str(data.get("all", "")).lower() in ("1", "true", "yes"):
+            return jsonify({"status": "ok", "devices": transport.run(device_state.snapshot())})
+        dev = devices.from_request(data)
+        return jsonify({"status": "ok", "ip": dev.ip, "state": transport.run(device_state.snapshot(dev.ip))})
+    except Exception as e:
+        print(f"Error in device_state_view: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@app.route("/api/status/cache", methods=["GET", "POST", "OPTIONS"])
+def status_cache_config():
+    """Status cache hit/miss counters; POST {ttl, stale_ttl} to tune, {clear: true} to empty it"""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        transport = get_transport()
+        if request.method == "POST":
+            data = request.get_json(silent=True) or {}
+            options = {k: float(data[k]) for k in ("ttl", "stale_ttl") if data.get(k) is not None}
+            if any(v < 0 for v in options.values()):
+                return jsonify({"status": "error", "message": "ttl and stale_ttl must be >= 0"}), 400
+            transport.loop.call_soon_threadsafe(lambda: status_cache.configure(**options))
+            if data.get("clear"):
+                transport.loop.call_soon_threadsafe(status_cache.invalidate)
+        return jsonify({"status": "ok", **transport.run(status_cache.snapshot())})
+    except Exception as e:
+        print(f"Error in status_cache_config: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@app.route("/api/stream/stats", methods=["GET"])
+def stream_stats():
+    """Per-device sent/suppressed/coalesced counters for color and brightness streams"""
+    try:
+        return jsonify({"status": "ok", **get_transport().run(stream_coalescer.snapshot())})
+    except Exception as e:
+        print(f"Error in stream_stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@app.route("/api/stream/config", methods=["POST", "OPTIONS"])
+def stream_config():
+    """Tune the coalescing window (window_ms), suppression deltas (color_delta, brightness_delta) and repeat_ttl"""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        data = request.get_json(silent=True) or {}
+        options = {k: float(data[k]) for k in ("window_ms", "color_delta", "brightness_delta", "repeat_ttl") if data.get(k) is not None}
+        transport = get_transport()
+        transport.loop.call_soon_threadsafe(lambda: stream_coalescer.configure(**options))
+        return jsonify({"status": "ok", **transport.run(stream_coalescer.snapshot())})
+    except Exception as e:
+        print(f"Error in stream_config: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@app.route("/api/queue/stats", methods=["GET"])
+def queue_stats():
+    """Per-device queue depth, sent/dropped counters and actual send rate (packets in the last second)"""
+    try:
+        return jsonify({"status": "ok", **get_transport().run(send_queue.snapshot())})
+    except Exception as e:
+        print(f"Error in queue_stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@app.route("/api/queue/config", methods=["POST", "OPTIONS"])
+def queue_config():
+    """Set the max packet rate/burst, globally or for one SKU ({rate, burst, sku})"""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        data = request.get_json(silent=True) or {}
+        rate = float(data["rate"]) if data.get("rate") is not None else None
+        burst = int(data["burst"]) if data.get("burst") is not None else None
+        if (rate is not None and rate <= 0) or (burst is not None and burst < 1):
+            return jsonify({"status": "error", "message": "rate must be > 0 and burst >= 1"}), 400
+        transport = get_transport()
+        transport.loop.call_soon_threadsafe(lambda: send_queue.configure(rate, burst, data.get("sku")))
+        return jsonify({"status": "ok", **transport.run(send_queue.snapshot())})
+    except Exception as e:
+        print(f"Error in queue_config: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+# -------------------------
+# Device Groups
+# -------------------------
+def _normalize_member(member):
+    if isinstance(member, str):
+        return {"ip": member.strip()}
+    if isinstance(member, dict) and (member.get("ip") or member.get("device")):
+        return {k: member[k] for k in ("ip", "device", "sku") if member.get(k)}
+    raise ValueError(f"Invalid group member: {member!r}")
+
+
+class GroupStore:
+    """Named device groups persisted to groups.json in DATA_DIR"""
+
+    def __init__(self, path=GROUPS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                groups = json.load(f).get("groups", {})
+            with self._lock:
+                self._groups = {name: [_normalize_member(m) for m in members] for name, members in groups.items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading groups: {e}")
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"groups": self._groups}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def all(self):
+        with self._lock:
+            return {name: list(members) for name, members in self._groups.items()}
+
+    def get(self, name):
+        with self._lock:
+            members = self._groups.get(name)
+            return list(members) if members is not None else None
+
+    def put(self, name, members):
+        members = [_normalize_member(m) for m in members]
+        with self._lock:
+            self._groups[name] = members
+            self._save()
+        return members
+
+    def delete(self, name):
+        with self._lock:
+            if self._groups.pop(name, None) is None:
+                return False
+            self._save()
+            return True
+
+
+groups = GroupStore()
+groups.load()
+
+
+def build_command(action, data):
+    """Map an API action + request body to a LAN (cmd, data) pair, with the same clamping as GoveeLAN"""
+    if action == "on":
+        return "turn", {"value": 1}
+    if action == "off":
+        return "turn", {"value": 0}
+    if action == "brightness":
+        return "brightness", {"value": max(1, min(100, int(data.get("value", 50))))}
+    if action == "color":
+        rgb = {c: max(0, min(255, int(data.get(c, d)))) for c, d in (("r", 255), ("g", 0), ("b", 0))}
+        return "colorwc", {"color": rgb}
+    if action == "color-temperature":
+        return "colorwc", {"colorTemInKelvin": max(1000, min(10000, int(data.get("value", 4000))))}
+    if action == "scene":
+        scene_id = data.get("sceneId", data.get("scene_id"))
+        if scene_id is None or int(scene_id) < 0:
+            raise ValueError("sceneId must be a non-negative number")
+        return "scene", {"sceneId": int(scene_id)}
+    if action == "raw":
+        if not data.get("cmd"):
+            raise ValueError("cmd is required")
+        msg_data = data.get("data") or {}
+        if not isinstance(msg_data, dict):
+            raise ValueError("data must be an object")
+        return data["cmd"], msg_data
+    raise ValueError(f"Unknown action: {action}")
+
+
+def fan_out(members, cmd, data=None, expect_reply=False, timeout=1.0, stream=False):
+    """
+    Send one command to many devices concurrently.
+
+    The payload is serialized once per distinct (device, sku) enrichment and
+    every datagram is queued in the same event-loop pass, so all members get
+    the command within the same millisecond window. Returns one result per member.
+    """
+    msg = {"msg": {"cmd": cmd, "data": data or {}}}
+    results = []
+    jobs = []
+    encoded = {}
+    deadline = 0.0
+    for member in members:
+        ip = member.get("ip")
+        if member.get("device"):
+            ip = device_registry.find_ip(member["device"]) or ip
+        if not ip:
+            results.append({"device": member.get("device"), "status": "error", "message": "Device not discovered"})
+            continue
+        dev = devices.get(ip, device=member.get("device"), sku=member.get("sku"))
+        key = (dev.device, dev.sku)
+        if key not in encoded:
+            encoded[key] = dev._encode(msg)
+        result = {"ip": ip, "status": "timeout"}
+        results.append(result)
+        payload, payload_bytes = encoded[key]
+        deadline = max(deadline, dev.reply_deadline(timeout))
+        jobs.append((result, dev.send_encoded_async(payload, payload_bytes, expect_reply=expect_reply, timeout=timeout, stream=stream), expect_reply))
+
+    collect_results(jobs, deadline)
+    return results
+
+
+@app.route("/api/groups", methods=["GET"])
+def get_groups():
+    return jsonify({"groups": groups.all()})
+
+
+@app.route("/api/groups/<name>", methods=["PUT", "DELETE", "OPTIONS"])
+def edit_group(name):
+    """Create/replace a group ({members: [ip | {ip, device, sku}]}) or delete it"""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        if request.method == "DELETE":
+            if groups.delete(name):
+                return jsonify({"status": "ok"})
+            return jsonify({"status": "error", "message": "Unknown group"}), 404
+
+        data = request.get_json(silent=True) or {}
+        members = data.get("members")
+        if not isinstance(members, list):
+            return jsonify({"status": "error", "message": "members must be a list"}), 400
+        return jsonify({"status": "ok", "name": name, "members": groups.put(name, members)})
+    except Exception as e:
+        print(f"Error in edit_group: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@app.route("/api/group/<name>/<action>", methods=["POST", "OPTIONS"])
+def group_command(name, action):
+    """Fan one command out to every member of a group (same body as the /api/device/<action> endpoints)"""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        members = groups.get(name)
+        if members is None:
+            return jsonify({"status": "error", "message": "Unknown group"}), 404
+        data = request.get_json(silent=True) or {}
+        cmd, msg_data = build_command(action, data)
+        expect_reply = action == "raw" and parse_flag(data.get("expect_reply", False))
+        stream = action in ("brightness", "color", "color-temperature")
+        results = fan_out(members, cmd, msg_data, expect_reply=expect_reply, timeout=float(data.get("timeout", 1.0)), stream=stream)
+        return jsonify({"status": "ok", "group": name, "action": action, "results": results})
+    except Exception as e:
+        print(f"Error in group_command: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+# -------------------------
+# Effect Engine
+# -------------------------
+DEFAULT_EFFECT_FPS = 20
+MAX_EFFECT_FPS = 60
+
+
+def compile_steps(steps, default_brightness=None, start=None):
+    """
+    Turn preset steps ({color, brightness, ms, transitionMs}) into timeline
+    segments (start_ms, duration_ms, from_rgb, to_rgb, from_b, to_b).
+
+    Each step is a fade from the previous state (transitionMs, default
+    min(ms, 600) like the renderer used) followed by a hold of `ms`.
+    """
+    segments = []
+    t = 0.0
+    prev_rgb, prev_b = start if start else (None, default_brightness)
+    for step in steps:
+        if not isinstance(step, dict):
+            raise ValueError("each step must be an object")
+        rgb = tuple(max(0, min(255, int(c))) for c in (step.get("color") or [255, 0, 0])[:3])
+        if len(rgb) != 3:
+            raise ValueError("step color must be [r, g, b]")
+        b = step.get("brightness")
+        b = max(1, min(100, int(b))) if b is not None else prev_b
+        hold = max(0.0, float(step.get("ms", 300)))
+        fade = step.get("transitionMs")
+        fade = max(0.0, float(fade)) if fade is not None else min(hold or 300.0, 600.0)
+        if prev_rgb is None:
+            fade = 0.0  # unknown starting point: jump to the first step
+
+        if fade > 0:
+            segments.append((t, fade, prev_rgb, rgb, prev_b, b))
+            t += fade
+        segments.append((t, hold, rgb, rgb, b, b))
+        t += hold
+        prev_rgb, prev_b = rgb, b
+    if not segments:
+        raise ValueError("steps must not be empty")
+    return segments, t
+
+
+class Effect:
+    """One scene playing on a set of devices, driven by its own monotonic frame clock"""
+
+    def __init__(self, key, members, steps, fps=DEFAULT_EFFECT_FPS, loop=False, default_brightness=None):
+        self.key = key
+        self.members = members
+        self.fps = max(1.0, min(float(fps), MAX_EFFECT_FPS))
+        self.loop = bool(loop)
+        self.segments, self.duration_ms = compile_steps(steps, default_brightness)
+        self.starts = [seg[0] for seg in self.segments]
+        if self.loop:
+            # Later passes fade from the last step into the first instead of jumping
+            _start, _duration, _from_rgb, last_rgb, _from_b, last_b = self.segments[-1]
+            self.loop_segments, self.loop_duration_ms = compile_steps(steps, default_brightness, start=(last_rgb, last_b))
+            self.loop_starts = [seg[0] for seg in self.loop_segments]
+        self.step_count = len(steps)
+        self.frames = 0
+        self.packets = 0
+        self.dropped_frames = 0
+        self.started_at = None
+        self.elapsed_ms = 0.0
+        self.segment = 0
+        self.last_rgb = None
+        self.last_brightness = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def frame_at(self, t_ms):
+        """Interpolated (rgb, brightness, segment index) at t_ms into the timeline"""
+        segments, starts = self.segments, self.starts
+        if self.loop and t_ms >= self.duration_ms and self.loop_duration_ms > 0:
+            t_ms = (t_ms - self.duration_ms) % self.loop_duration_ms
+            segments, starts = self.loop_segments, self.loop_starts
+        idx = max(0, bisect_right(starts, t_ms) - 1)
+        start, duration, from_rgb, to_rgb, from_b, to_b = segments[idx]
+        k = min(1.0, (t_ms - start) / duration) if duration > 0 else 1.0
+        rgb = tuple(round(a + (z - a) * k) for a, z in zip(from_rgb, to_rgb))
+        if from_b is None or to_b is None:
+            b = to_b
+        else:
+            b = round(from_b + (to_b - from_b) * k)
+        return rgb, b, idx
+
+    def _emit(self, rgb, b):
+        if rgb != self.last_rgb:
+            fan_out(self.members, "colorwc", {"color": {"r": rgb[0], "g": rgb[1], "b": rgb[2]}}, stream=True)
+            self.last_rgb = rgb
+            self.packets += len(self.members)
+        if b is not None and b != self.last_brightness:
+            fan_out(self.members, "brightness", {"value": b}, stream=True)
+            self.last_brightness = b
+            self.packets += len(self.members)
+        self.frames += 1
+
+    def _run(self):
+        period = 1.0 / self.fps
+        t0 = time.monotonic()
+        frame = 0
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                self.elapsed_ms = (now - t0) * 1000.0
+                if not self.loop and self.elapsed_ms >= self.duration_ms:
+                    rgb, b, self.segment = self.frame_at(self.duration_ms)
+                    self._emit(rgb, b)
+                    break
+                rgb, b, self.segment = self.frame_at(self.elapsed_ms)
+                self._emit(rgb, b)
+
+                # Schedule against the start time so frames never drift
+                frame += 1
+                deadline = t0 + frame * period
+                now = time.monotonic()
+                if now > deadline + period:
+                    # Fell behind (slow send, suspended machine): skip frames instead of bursting
+                    skipped = int((now - deadline) / period)
+                    frame += skipped
+                    self.dropped_frames += skipped
+                    deadline = t0 + frame * period
+                self._stop.wait(max(0.0, deadline - now))
+        except Exception as e:
+            print(f"[EFFECT] {self.key} stopped: {e}")
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"effect-{self.key}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def status(self):
+        return {
+            "target": self.key,
+            "running": self.running,
+            "fps": self.fps,
+            "loop": self.loop,
+            "steps": self.step_count,
+            "step": self.segment,
+            "started_at": self.started_at,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "duration_ms": self.duration_ms,
+            "frames": self.frames,
+            "packets": self.packets,
+            "dropped_frames": self.dropped_frames,
+        }
+
+
+class EffectEngine:
+    """Runs at most one effect per target (device IP or group)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._effects = {}
+
+    def start(self, key, members, steps, **options):
+        effect = Effect(key, members, steps, **options)
+        with self._lock:
+            old = self._effects.get(key)
+            self._effects[key] = effect
+        if old:
+            old.stop()
+        effect.start()
+        return effect
+
+    def stop(self, key=None):
+        """Stop one target's effect, or every effect when key is None"""
+        with self._lock:
+            keys = [key] if key is not None else list(self._effects)
+            stopped = [self._effects.pop(k) for k in keys if k in self._effects]
+        for effect in stopped:
+            effect.stop()
+        return [effect.key for effect in stopped]
+
+    def status(self):
+        with self._lock:
+            effects = list(self._effects.values())
+        return [effect.status() for effect in effects]
+
+
+effect_engine = EffectEngine()
+
+
+def _effect_target(data):
+    """Resolve {group} or {ip, device, sku} to (key, members)"""
+    group = data.get("group")
+    if group:
+        members = groups.get(group)
+        if members is None:
+            raise ValueError("Unknown group")
+        return f"group:{group}", members
+    dev = devices.from_request(data)
+    return f"ip:{dev.ip}", [{"ip": dev.ip}]
+
+
+@app.route("/api/effect/start", methods=["POST", "OPTIONS"])
+def effect_start():
+    """Play preset steps ({scene: {steps, loop}} or {steps, loop}) on a device or group."""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        data = request.get_json(silent=True) or {}
+        scene = data.get("scene") if isinstance(data.get("scene"), dict) else data
+        steps = scene.get("steps")
+        if not isinstance(steps, list):
+            return jsonify({"status": "error", "message": "steps must be a list"}), 400
+        key, members = _effect_target(data)
+        effect = effect_engine.start(
+            key, members, steps,
+            fps=float(data.get("fps", DEFAULT_EFFECT_FPS)),
+            loop=parse_flag(data.get("loop", scene.get("loop", False))),
+            default_brightness=scene.get("defaultBrightness"),
+        )
+        return jsonify({"status": "ok", "effect": effect.status()})
+    except Exception as e:
+        print(f"Error in effect_start: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@app.route("/api/effect/stop", methods=["POST", "OPTIONS"])
+def effect_stop():
+    """Stop the effect on a device/group, or all effects with {all: true}."""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        data = request.get_json(silent=True) or {}
+        key = None if parse_flag(data.get("all")) else _effect_target(data)[0]
+        return jsonify({"status": "ok", "stopped": effect_engine.stop(key)})
+    except Exception as e:
+        print(f"Error in effect_stop: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@app.route("/api/effect/status", methods=["GET"])
+def effect_status():
+    return jsonify({"effects": effect_engine.status()})
+
+
+def rule_target(rule):
+    """Resolve a compiled rule's target to (effect key, members)"""
+    if rule.target is None:
+        return f"ip:{devices.default_ip}", [{"ip": devices.default_ip}]
+    kind, value = rule.target
+    if kind == "group":
+        members = groups.get(value)
+        if members is None:
+            raise ValueError(f"Unknown group {value!r}")
+        return f"group:{value}", members
+    return f"ip:{value.get('ip') or value.get('device')}", [value]
+
+
+RULE_ACTION_TIMEOUT = 5.0  # seconds a rule may take to reach one device
+
+
+class RuleExecutor:
+    """
+    Sends the commands of fired rules on the transport loop.
+
+    Members of a rule are commanded concurrently, commands for the same
+    device run in fire order, and each device action has a deadline so one
+    unreachable or backed-up light cannot hold up other rules. Fire latency
+    (due time to datagram on the wire) is recorded per rule.
+    """
+
+    def __init__(self, timeout=RULE_ACTION_TIMEOUT):
+        self.timeout = timeout
+        self._tails = {}  # ip -> last action task for that device
+        self._latency = {}  # rule index -> {"count", "last", "max", "total"}
+        self.completed = 0
+        self.replayed = 0
+        self.timed_out = 0
+        self.failed = 0
+
+    def submit(self, rule, due_ts, members, replay=False):
+        """Queue a fired rule from any thread; replayed catch-up fires are kept out of the latency figures"""
+        get_transport().loop.call_soon_threadsafe(self._start, rule, due_ts, members, replay)
+
+    def _start(self, rule, due_ts, members, replay=False):
+        for member in members:
+            ip = member.get("ip")
+            if member.get("device"):
+                ip = device_registry.find_ip(member["device"]) or ip
+            if not ip:
+                self.failed += 1
+                print(f"[AUTOMATION ERROR] {rule.label}: device {member.get('device')} not discovered")
+                continue
+            dev = devices.get(ip, device=member.get("device"), sku=member.get("sku"))
+            task = asyncio.ensure_future(self._run(rule, due_ts, dev, self._tails.get(dev.ip), replay))
+            self._tails[dev.ip] = task
+            task.add_done_callback(lambda t, ip=dev.ip: self._tails.get(ip) is t and self._tails.pop(ip))
+
+    async def _run(self, rule, due_ts, dev, previous, replay=False):
+        if previous is not None:
+            await asyncio.wait({previous})  # keep per-device order; previous has its own deadline
+        try:
+            await asyncio.wait_for(self._send_all(rule, dev), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            print(f"[AUTOMATION ERROR] {rule.label}: {dev.ip} missed the {self.timeout:.1f}s deadline")
+            return
+        except Exception as e:
+            self.failed += 1
+            print(f"[AUTOMATION ERROR] {rule.label}: {dev.ip}: {e}")
+            return
+        self.completed += 1
+        if replay:
+            self.replayed += 1
+            return  # due minutes ago while the process was down; not scheduler lag
+        latency = time.time() - due_ts
+        FIRE_LAG.observe(latency)
+        stats = self._latency.setdefault(rule.index, {"count": 0, "last": 0.0, "max": 0.0, "total": 0.0})
+        stats["count"] += 1
+        stats["last"] = latency
+        stats["max"] = max(stats["max"], latency)
+        stats["total"] += latency
+
+    async def _send_all(self, rule, dev):
+        for cmd, data in rule.commands:
+            payload, payload_bytes = dev._encode(dev._wrap_msg(cmd, data))
+            await dev.send_ordered_async(payload, payload_bytes)
+
+    async def snapshot(self):
+        return {
+            "timeout": self.timeout,
+            "completed": self.completed,
+            "replayed": self.replayed,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+            "in_flight": len(self._tails),
+            "latency": {idx: {"count": st["count"], "last_ms": round(st["last"] * 1000, 1),
+                              "max_ms": round(st["max"] * 1000, 1),
+                              "mean_ms": round(st["total"] / st["count"] * 1000, 1)}
+                        for idx, st in self._latency.items()},
+        }
+
+
+rule_executor = RuleExecutor()
+
+
+CATCHUP_GRACE = float(os.environ.get("GOVEE_CATCHUP_GRACE", "900"))  # seconds of downtime whose missed rules are replayed
+fire_journal = FireJournal(JOURNAL_PATH)
+
+
+def fire_rule(rule, due_ts, replay=False):
+    """
+    Hand one compiled automation rule to the executor; called on the
+    scheduler thread when it is due, or with replay=True for a fire missed
+    while the process was down.
+    """
+    key, members = rule_target(rule)
+    RULES_FIRED.inc()
+    if rule.commands:
+        rule_executor.submit(rule, due_ts, members, replay=replay)
+    if rule.effect:
+        effect_engine.start(
+            key, members, rule.effect["steps"],
+            fps=float(rule.effect.get("fps", DEFAULT_EFFECT_FPS)),
+            loop=rule.effect.get("loop", False),
+            default_brightness=rule.effect.get("defaultBrightness"),
+        )
+    fire_journal.append({"rule": rule.key, "due": round(due_ts, 3)})  # queued; the journal thread fsyncs in batches
+    print(f"[AUTOMATION] {rule.label} -> {key}")
+
+
+def resume_automation(grace=CATCHUP_GRACE):
+    """
+    Restart automation if it was running when the process stopped, then
+    replay rules missed during the downtime: only fires within the grace
+    window (and after automation was started) that are not in the journal,
+    and only the latest one per target.
+    """
+    state = fire_journal.state()
+    if not state or state.get("event") != "start":
+        return []
+    now = time.time()
+    fired = {(r.get("rule"), r.get("due")) for r in fire_journal.tail() if "rule" in r}
+    latest = {}
+    for rule, due_ts in automation_scheduler.fires_between(max(now - grace, state.get("t", 0)), now):
+        if not rule.commands:
+            continue  # effects are not replayed
+        try:
+            latest[rule_target(rule)[0]] = (rule, due_ts)
+        except ValueError as e:
+            print(f"[AUTOMATION ERROR] {rule.label}: {e}")
+    # a target whose newest fire already happened is up to date
+    latest = {key: fire for key, fire in latest.items() if (fire[0].key, round(fire[1], 3)) not in fired}
+    automation_scheduler.start()
+    print(f"[AUTOMATION] Resumed; replaying {len(latest)} missed rule(s)")
+    for rule, due_ts in latest.values():
+        fire_rule(rule, due_ts, replay=True)
+    return [rule.label for rule, _due in latest.values()]
+
+
+def reschedule_rules():
+    automation_scheduler.set_rules(rules, location=rules_location)
+    fire_journal.retain(rule_id(rule) for rule in rules if isinstance(rule, dict))
+
+
+automation_scheduler = RuleScheduler(fire_rule, name="govee-automation")
+
+
 @app.route("/api/rules", methods=["GET"])
 def get_rules():
-    return jsonify({"rules": rules})
+    return jsonify({"rules": rules, "location": rules_location})
 
 
 @app.route("/api/rules", methods=["POST"])
 def add_rule():
     try:
         data = request.get_json(silent=True) or {}
-        rule = {
-            "time": data.get("time", "00:00"),
-            "action": data.get("action", "on"),
-        }
-        if rule["action"] == "brightness":
-            rule["value"] = data.get("value", 50)
+        if data.get("cron"):
+            rule = {"cron": data["cron"]}
+        elif data.get("sun"):
+            rule = {"sun": data["sun"], "offset": data.get("offset", 0)}
+        else:
+            rule = {"time": data.get("time", "00:00")}
+        rule["action"] = data.get("action", "on")
+        if rule["action"] in ("brightness", "color_temp"):
+            rule["value"] = data.get("value", 50 if rule["action"] == "brightness" else 4000)
         elif rule["action"] == "rgb":
             r = data.get("r", 255)
             g = data.get("g", 0)
@@ -602,9 +2546,15 @@ def add_rule():
             rule["r"] = r
             rule["g"] = g
             rule["b"] = b
-        
+        # optional schedule/target/scene fields (the UI always sends ip, so targets use "target")
+        for key in ("days", "lat", "lon", "target", "group", "sceneId", "effect"):
+            if data.get(key) is not None:
+                rule[key] = data[key]
+        validate_rules_config({"rules": rules + [rule], "location": rules_location})
+
         rules.append(rule)
         save_rules_to_file()
+        reschedule_rules()
         return jsonify({"status": "ok", "rule": rule})
     except Exception as e:
         print(f"Error in add_rule: {e}")
@@ -617,6 +2567,7 @@ def delete_rule(idx):
         if 0 <= idx < len(rules):
             rules.pop(idx)
             save_rules_to_file()
+            reschedule_rules()
             return jsonify({"status": "ok"})
         return jsonify({"status": "error", "message": "Invalid index"}), 400
     except Exception as e:
@@ -626,66 +2577,20 @@ def delete_rule(idx):
 
 @app.route("/api/automation/start", methods=["POST", "OPTIONS"])
 def automation_start():
-    global automation_running, automation_thread
     if request.method == "OPTIONS":
         return "", 200
     try:
         data = request.get_json(silent=True) or {}
-        ip = data.get("ip") or govee.ip
+        ip = data.get("ip")
         
-        if automation_running:
+        if automation_scheduler.running:
             return jsonify({"status": "error", "message": "Already running"})
         
-        automation_running = True
-        govee.set_ip(ip)
+        devices.set_default_ip(ip)
+        reschedule_rules()
+        automation_scheduler.start()
+        fire_journal.set_state("start")
         print(f"[AUTOMATION] Started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        def worker():
-            global automation_running, automation_last_fired
-            while automation_running:
-                try:
-                    now = datetime.now()
-                    hm = now.strftime("%H:%M")
-                    day = now.strftime("%Y-%m-%d")
-                    
-                    for idx, rule in enumerate(rules):
-                        if rule.get("time") != hm:
-                            continue
-                        
-                        key = (idx, day, hm)
-                        if key in automation_last_fired:
-                            continue
-                        
-                        try:
-                            act = rule["action"]
-                            action_str = f"Rule #{idx+1} ({hm})"
-                            if act == "on":
-                                govee.on()
-                                print(f"[AUTOMATION] {action_str}: TURN ON")
-                            elif act == "off":
-                                govee.off()
-                                print(f"[AUTOMATION] {action_str}: TURN OFF")
-                            elif act == "brightness":
-                                val = int(rule["value"])
-                                govee.brightness(val)
-                                print(f"[AUTOMATION] {action_str}: BRIGHTNESS {val}%")
-                            elif act == "rgb":
-                                r, g, b = int(rule["r"]), int(rule["g"]), int(rule["b"])
-                                govee.rgb(r, g, b)
-                                print(f"[AUTOMATION] {action_str}: RGB({r},{g},{b})")
-                            automation_last_fired.add(key)
-                        except Exception as e:
-                            print(f"[AUTOMATION ERROR] Rule {idx}: {e}")
-                    
-                    import time
-                    time.sleep(1.0)
-                except Exception as e:
-                    print(f"[AUTOMATION ERROR] Worker loop: {e}")
-                    import time
-                    time.sleep(1.0)
-        
-        automation_thread = threading.Thread(target=worker, daemon=True)
-        automation_thread.start()
         return jsonify({"status": "ok", "message": "Automation started"})
     except Exception as e:
         print(f"Error in automation_start: {e}")
@@ -694,11 +2599,11 @@ def automation_start():
 
 @app.route("/api/automation/stop", methods=["POST", "OPTIONS"])
 def automation_stop():
-    global automation_running
     if request.method == "OPTIONS":
         return "", 200
     try:
-        automation_running = False
+        automation_scheduler.stop()
+        fire_journal.set_state("stop")
         return jsonify({"status": "ok", "message": "Automation stopped"})
     except Exception as e:
         print(f"Error in automation_stop: {e}")
@@ -707,7 +2612,12 @@ def automation_stop():
 
 @app.route("/api/automation/status", methods=["GET"])
 def automation_status():
-    return jsonify({"running": automation_running})
+    status = automation_scheduler.status()
+    try:
+        status["executor"] = get_transport().run(rule_executor.snapshot(), timeout=2.0)
+    except Exception as e:
+        print(f"Error in automation_status: {e}")
+    return jsonify(status)
 
 
 def save_rules_to_file():
@@ -715,19 +2625,36 @@ def save_rules_to_file():
         # Write atomically: write to temp file then replace
         tmp = os.path.join(DATA_DIR, "rules.json.tmp")
         with open(tmp, "w", encoding="utf-8") as f:
-            json.dump({"device_ip": govee.ip, "rules": rules}, f, indent=2)
+            cfg = {"device_ip": devices.default_ip, "rules": rules}
+            if rules_location:
+                cfg["location"] = rules_location
+            json.dump(cfg, f, indent=2)
         try:
             os.replace(tmp, RULES_PATH)
         except Exception:
             # Fallback if replace is not available
             os.remove(RULES_PATH) if os.path.exists(RULES_PATH) else None
             os.rename(tmp, RULES_PATH)
+        rules_watcher.sync()
     except Exception as e:
         print(f"Error saving rules: {e}")
 
 
+def apply_rules_config(cfg):
+    """Apply a rules.json edited outside the app (called by the rules watcher)"""
+    global rules, rules_location
+    devices.set_default_ip(cfg.get("device_ip", DEFAULT_IP))
+    rules = cfg.get("rules", [])
+    rules_location = cfg.get("location")
+    reschedule_rules()
+    print(f"[RULES] Reloaded {len(rules)} rules from {RULES_PATH}")
+
+
+rules_watcher = RulesWatcher(RULES_PATH, apply_rules_config)
+
+
 def load_rules_from_file():
-    global rules
+    global rules, rules_location
     try:
         if not os.path.exists(RULES_PATH) and os.path.exists(DEFAULT_RULES_FILE):
             try:
@@ -739,8 +2666,18 @@ def load_rules_from_file():
 
         with open(RULES_PATH, "r", encoding="utf-8") as f:
             cfg = json.load(f)
-            govee.set_ip(cfg.get("device_ip", DEFAULT_IP))
-            rules = cfg.get("rules", [])
+        try:
+            new_rules, location = validate_rules_config(cfg)
+        except ValueError as e:
+            # same policy as a hot reload: nothing is applied. Keep a copy, since
+            # the next rule saved from the UI rewrites rules.json
+            shutil.copyfile(RULES_PATH, RULES_PATH + ".rejected")
+            print(f"[RULES] Ignoring {RULES_PATH}: {e} (copy kept as rules.json.rejected)")
+            return
+        devices.set_default_ip(cfg.get("device_ip", DEFAULT_IP))
+        rules, rules_location = new_rules, location
+        rules_watcher.sync()
+        reschedule_rules()
     except FileNotFoundError:
         pass
     except Exception as e:
@@ -749,15 +2686,69 @@ def load_rules_from_file():
 
 @app.route("/api/packets", methods=["GET"])
 def get_packets():
-    """Return all captured UDP packets with full details"""
+    """
+    Return captured UDP packets with full details, newest first.
+
+    ?since=<seq> returns only packets logged after that sequence number and
+    ?limit=N caps the reply to the newest N. `cursor` is the value to pass
+    as `since` next time; `missed` counts packets after `since` that were
+    overwritten or cut by the limit.
+    """
     try:
-        packets = packet_monitor.get_packets()
-        return jsonify({"packets": packets})
+        since = max(0, request.args.get("since", 0, type=int))
+        limit = request.args.get("limit", type=int)
+        cursor = packet_monitor.last_seq
+        packets = packet_monitor.get_packets(since=since, limit=limit)
+        if packets:
+            cursor = max(cursor, packets[0]["seq"])
+        missed = max(0, cursor - since - len(packets)) if since or limit is not None else 0
+        return jsonify({"packets": packets, "cursor": cursor, "missed": missed})
     except Exception as e:
         print(f"Error in get_packets: {e}")
         return jsonify({"status": "error", "message": str(e)}), 400
 
 
+PACKET_STREAM_KEEPALIVE = 15.0
+PACKET_STREAM_MAX_AGE = 120.0  # seconds before a stream ends and the browser reconnects, freeing its worker thread
+
+
+@app.route("/api/packets/stream", methods=["GET"])
+def stream_packets():
+    """
+    Server-Sent Events feed of packets as they are logged.
+
+    Resumes from Last-Event-ID (sent by a reconnecting EventSource) or
+    ?since=. Each stream ends after PACKET_STREAM_MAX_AGE seconds; the
+    browser reconnects on its own and picks up where it left off.
+    """
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    if since is None:
+        since = packet_monitor.last_seq
+
+    def generate():
+        cursor = since
+        deadline = time.monotonic() + PACKET_STREAM_MAX_AGE
+        yield "retry: 2000\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if packet_monitor.wait_for_packets(cursor, min(PACKET_STREAM_KEEPALIVE, remaining)):
+                records = packet_monitor.records_since(cursor)
+                for packet in packet_monitor.render_records(records):
+                    yield f"id: {packet['seq']}\nevent: packet\ndata: {json.dumps(packet)}\n\n"
+                if records:
+                    cursor = records[-1][0]
+                else:
+                    cursor = packet_monitor.last_seq  # cleared log: wait for the next packet
+            else:
+                yield ": keepalive\n\n"
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route("/api/packets", methods=["DELETE"])
 def clear_packets():
     """Clear the packet log"""
@@ -771,30 +2762,22 @@ def clear_packets():
 
 @app.route("/api/rules", methods=["PUT"])
 def set_rules():
-    """Replace full rules set and persist to disk."""
-    global rules
+    """Replace full rules set (and optionally the {lat, lon} location) and persist to disk."""
+    global rules, rules_location
     try:
         data = request.get_json(silent=True) or {}
         new_rules = data.get("rules")
         device_ip = data.get("device_ip")
 
-        if device_ip:
-            govee.set_ip(device_ip)
-
         if isinstance(new_rules, list):
-            # Basic validation: ensure each rule has a time and action
-            validated = []
-            for r in new_rules:
-                if not isinstance(r, dict):
-                    continue
-                t = r.get("time")
-                a = r.get("action")
-                if not t or not a:
-                    continue
-                validated.append(r)
-
-            rules = validated
+            # Validation: every rule must compile (schedule, action and target) or nothing changes
+            location = data["location"] if data.get("location") is not None else rules_location
+            new_rules, location = validate_rules_config({"rules": new_rules, "location": location})
+            if device_ip:
+                devices.set_default_ip(device_ip)
+            rules, rules_location = new_rules, location
             save_rules_to_file()
+            reschedule_rules()
             return jsonify({"status": "ok", "rules": rules})
 
         return jsonify({"status": "error", "message": "Invalid payload"}), 400
@@ -803,6 +2786,12 @@ def set_rules():
         return jsonify({"status": "error", "message": str(e)}), 400
 
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Counters and histograms in the Prometheus text format"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 # Serve static files
 @app.route('/')
 def index():
@@ -814,7 +2803,274 @@ def static_files(path):
     return send_from_directory(STATIC_DIR, path)
 
 
+# -------------------------
+# WebSocket Command Channel
+# -------------------------
+WS_PORT = int(os.environ.get("GOVEE_WS_PORT", "5001"))  # 0 disables the channel
+WS_STATE_PUSH_INTERVAL = 0.05  # seconds; state changes per connection are pushed at most this often
+WS_STREAM_ACTIONS = ("brightness", "color", "color-temperature")  # coalesced like the GoveeLAN slider setters
+WS_ACTIONS = ("on", "off", "brightness", "color", "color-temperature", "scene", "raw", "status", "subscribe")
+WS_FRAME_COUNTS = {action: WS_FRAMES.labels(action) for action in WS_ACTIONS + ("unknown",)}
+WS_FAILED_OUTCOMES = {"dropped": "dropped from a full send backlog", "failed": "send failed"}
+
+
+def ws_origins(http_port=5000, extra=()):
+    """
+    Origin headers allowed to open the command channel: the UI served by
+    this backend, the packaged Electron page (file://) and clients that
+    send no Origin (scripts; browsers always send one). Any other web page
+    the user has open is refused.
+    """
+    hosts = [f"http://{host}:{http_port}" for host in ("localhost", "127.0.0.1")]
+    return hosts + ["file://", None] + [o.strip() for o in extra if o.strip()]
+
+
+class _ChannelSession:
+    """One WebSocket connection: command frames in, acks and state pushes out"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.subscribed = set()
+        self.all_devices = False
+        self._dirty = set()
+        self._flush_handle = None
+
+    async def send(self, obj):
+        await self.ws.send(json.dumps(obj, separators=(",", ":")))
+
+    async def handle(self, message):
+        frame_id = None
+        try:
+            frame = json.loads(message)
+            if not isinstance(frame, dict):
+                raise ValueError("frame must be a JSON object")
+            frame_id = frame.get("id")
+            action = frame.get("action")
+            WS_FRAME_COUNTS[action if action in WS_ACTIONS else "unknown"].inc()
+            reply = {"id": frame_id, "ok": True}
+            if action == "status":
+                asyncio.ensure_future(self._status(frame))  # keep reading frames while the light answers
+                return
+            if action == "subscribe":
+                self.all_devices = parse_flag(frame.get("all"))
+                self.subscribed = set(frame.get("ips") or ([frame["ip"]] if frame.get("ip") else []))
+                self._dirty.update(self.subscribed)
+                self._schedule_flush()
+            else:
+                dev = devices.from_request(frame)
+                cmd, data = build_command(action, frame)
+                payload, payload_bytes = dev._encode(dev._wrap_msg(cmd, data))
+                delivery = dev._dispatch(payload, payload_bytes, stream=action in WS_STREAM_ACTIONS,
+                                         report=frame_id is not None)
+                if frame_id is not None:
+                    # ack once the send queue has sent, dropped or superseded the command
+                    delivery.add_done_callback(lambda fut: asyncio.ensure_future(self._ack(frame_id, fut.result())))
+                return
+            if frame_id is not None:
+                await self.send(reply)
+        except Exception as e:
+            await self.send({"id": frame_id, "ok": False, "error": str(e)})
+
+    async def _ack(self, frame_id, outcome):
+        reply = {"id": frame_id, "ok": outcome not in WS_FAILED_OUTCOMES, "outcome": outcome}
+        if not reply["ok"]:
+            reply["error"] = f"Command {WS_FAILED_OUTCOMES[outcome]}"
+        try:
+            await self.send(reply)
+        except Exception:
+            pass  # connection already gone
+
+    async def _status(self, frame):
+        try:
+            dev = devices.from_request(frame)
+            max_age = float(frame["max_age"]) if frame.get("max_age") is not None else None
+            resp, age, source = await status_cache.get(dev, max_age=max_age, refresh=parse_flag(frame.get("refresh")),
+                                                       timeout=float(frame.get("timeout", 1.0)))
+            await self.send({"id": frame.get("id"), "ok": True, "data": resp, "age": round(age, 3), "source": source})
+        except Exception as e:
+            try:
+                await self.send({"id": frame.get("id"), "ok": False, "error": str(e)})
+            except Exception:
+                pass  # connection already gone
+
+    def state_changed(self, ip):
+        if self.all_devices or ip in self.subscribed:
+            self._dirty.add(ip)
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is None and self._dirty:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(WS_STATE_PUSH_INTERVAL, lambda: asyncio.ensure_future(self._flush()))
+
+    async def _flush(self):
+        self._flush_handle = None
+        dirty, self._dirty = self._dirty, set()
+        try:
+            for ip in dirty:
+                await self.send({"type": "state", "ip": ip, "state": await device_state.snapshot(ip)})
+        except Exception:
+            pass  # closed; the handler removes the listener
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+
+class CommandChannel:
+    """
+    Persistent WebSocket endpoint for high-frequency commands (optional `websockets` package).
+
+    Runs on the LAN transport loop, so a frame enters the same coalescer and
+    send queue as an HTTP command without a thread hop. A frame is a JSON
+    object with "action" (as in /api/group/<name>/<action>, plus "status" and
+    "subscribe"), the target ("ip", "device", "sku"), the fields of the HTTP
+    body and an optional "id". Frames with an id are acked once the send
+    queue is done with them ({"id", "ok", "outcome"}: sent, suppressed or
+    superseded, or ok=false when dropped or failed); frames without one are
+    fire-and-forget. After "subscribe" ({"ips": [...]} or {"all": true}) the
+    server pushes {"type": "state", "ip", "state"}. Handshakes from an
+    Origin outside ws_origins() are refused with 403.
+    """
+
+    def __init__(self, port=WS_PORT):
+        self.port = port
+        self.origins = ws_origins()
+        self.server = None
+        self.connections = 0
+        self._closed_error = ()  # websockets.ConnectionClosed once the package is loaded
+
+    def start(self, host="127.0.0.1"):
+        if not self.port:
+            return False
+        try:
+            import websockets
+        except ImportError:
+            print("[WS] websockets is not installed; the command channel is disabled (HTTP only)")
+            return False
+        self._closed_error = websockets.ConnectionClosed
+        try:
+            self.server = get_transport().run(self._serve(websockets, host))
+        except OSError as e:
+            print(f"[WS] Could not listen on {host}:{self.port}: {e}")
+            return False
+        print(f"[WS] Command channel on ws://{host}:{self.port}")
+        return True
+
+    async def _serve(self, websockets, host):
+        return await websockets.serve(self._handle, host, self.port, origins=self.origins,
+                                      compression=None, max_size=64 * 1024)
+
+    async def _handle(self, ws):
+        session = _ChannelSession(ws)
+        self.connections += 1
+        device_state.add_listener(session.state_changed)
+        try:
+            async for message in ws:
+                await session.handle(message)
+        except self._closed_error:
+            pass  # client went away without a close handshake
+        except Exception as e:
+            print(f"[WS] Connection failed: {e}")
+        finally:
+            device_state.remove_listener(session.state_changed)
+            session.close()
+            self.connections -= 1
+
+    def stop(self):
+        server, self.server = self.server, None
+        if server is not None:
+            get_transport().run(self._close(server), timeout=2.0)
+
+    async def _close(self, server):
+        server.close()
+        await server.wait_closed()
+
+
+command_channel = CommandChannel()
+
+
+# -------------------------
+# Server
+# -------------------------
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+
+def shutdown_backend():
+    """Stop automation, effects, discovery and the reconciler, then close the device socket (idempotent)"""
+    global _shut_down
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+    print("[SERVER] Shutting down...")
+    for stop in (automation_scheduler.stop, rules_watcher.stop, fire_journal.close, effect_engine.stop,
+                 discovery_service.stop, command_channel.stop, device_state.stop_reconciler, close_transport):
+        try:
+            stop()
+        except Exception as e:
+            print(f"[SERVER] Shutdown step {stop.__qualname__} failed: {e}")
+
+
+def parse_server_args(argv=None):
+    """Server options; every flag falls back to a GOVEE_* environment variable"""
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Govee LAN controller backend")
+    parser.add_argument("--server", choices=("production", "dev"), default=env("GOVEE_SERVER_MODE", "production"),
+                        help="production = waitress thread pool, dev = Werkzeug development server")
+    parser.add_argument("--host", default=env("GOVEE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(env("GOVEE_PORT", "5000")))
+    parser.add_argument("--threads", type=int, default=int(env("GOVEE_THREADS", "8")),
+                        help="worker threads handling requests (each packet stream holds one)")
+    parser.add_argument("--connection-limit", type=int, default=int(env("GOVEE_CONNECTION_LIMIT", "100")),
+                        help="open connections before new ones wait in the listen backlog")
+    parser.add_argument("--backlog", type=int, default=int(env("GOVEE_BACKLOG", "64")),
+                        help="connections queued by the OS before further ones are refused")
+    parser.add_argument("--ws-port", type=int, default=WS_PORT,
+                        help="WebSocket command channel port (0 disables)")
+    parser.add_argument("--ws-origins", default=env("GOVEE_WS_ORIGINS", ""),
+                        help="extra comma-separated Origins allowed on the command channel")
+    parser.add_argument("--keepalive-timeout", type=int, default=int(env("GOVEE_KEEPALIVE_TIMEOUT", "30")),
+                        help="seconds an idle keep-alive connection is held open")
+    # Electron and PyInstaller may pass their own arguments; ignore what we do not know
+    args, _unknown = parser.parse_known_args(argv)
+    return args
+
+
+def run_server(args):
+    """Serve the app until interrupted; falls back to the dev server when waitress is missing"""
+    if args.server == "production":
+        try:
+            from waitress import serve
+        except ImportError:
+            print("[SERVER] waitress is not installed, falling back to the development server")
+        else:
+            print(f"Starting Govee controller backend on http://{args.host}:{args.port} "
+                  f"(waitress, {args.threads} threads)")
+            serve(app, host=args.host, port=args.port, threads=args.threads,
+                  connection_limit=args.connection_limit, backlog=args.backlog,
+                  channel_timeout=args.keepalive_timeout, ident="govee-backend")
+            return
+    print(f"Starting Govee controller backend on http://{args.host}:{args.port} (development server)")
+    app.run(host=args.host, port=args.port, debug=False, threaded=True)
+
+
 if __name__ == "__main__":
+    server_args = parse_server_args()
     load_rules_from_file()
-    print("Starting Govee controller backend on http://localhost:5000")
-    app.run(host="127.0.0.1", port=5000, debug=False)
+    discovery_service.start()
+    device_state.start_reconciler()
+    rules_watcher.start()
+    resume_automation()
+    command_channel.port = server_args.ws_port
+    command_channel.origins = ws_origins(server_args.port, server_args.ws_origins.split(","))
+    command_channel.start(server_args.host)
+    atexit.register(shutdown_backend)
+    # Electron stops the backend with SIGTERM; turn it into a normal exit so the hooks run
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        run_server(server_args)
+    finally:
+        shutdown_backend()
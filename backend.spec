@@ -28,7 +28,7 @@ a = Analysis(
     pathex=[ROOT],
     binaries=[],
     datas=build_datas(),
-    hiddenimports=collect_submodules('flask_cors'),
+    hiddenimports=collect_submodules('flask_cors') + collect_submodules('waitress') + collect_submodules('websockets'),
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,11 +1,13 @@
+import asyncio
 import json
-import socket
 import threading
 import time
-from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox, colorchooser
 
+from govee_scheduler import RuleScheduler
+from govee_transport import get_transport
+
 DEFAULT_IP = "192.168.1.66"
 CONTROL_PORT = 4003
 
@@ -21,22 +23,21 @@ class GoveeLAN:
         self.ip = ip.strip()
 
     def _send(self, payload: dict, expect_reply: bool = False, timeout: float = 1.0):
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.settimeout(timeout)
+        data = json.dumps(payload).encode("utf-8")
         try:
-            s.sendto(json.dumps(payload).encode("utf-8"), (self.ip, self.port))
-            if expect_reply:
-                data, _ = s.recvfrom(65535)
-                txt = data.decode("utf-8", errors="ignore")
-                try:
-                    return json.loads(txt)
-                except Exception:
-                    return {"raw": txt}
-            return None
-        except (socket.timeout, ConnectionResetError, OSError):
+            transport = get_transport()
+            if not expect_reply:
+                transport.send_sync(self.ip, self.port, data)
+                return None
+            cmd = payload.get("msg", {}).get("cmd")
+            reply = transport.request_sync(self.ip, self.port, data, timeout=timeout, expect_cmd=cmd)
+            txt = reply.decode("utf-8", errors="ignore")
+            try:
+                return json.loads(txt)
+            except Exception:
+                return {"raw": txt}
+        except (asyncio.TimeoutError, ConnectionResetError, OSError):
             return None
-        finally:
-            s.close()
 
     def on(self):
         return self._send({"msg": {"cmd": "turn", "data": {"value": 1}}})
@@ -74,9 +75,7 @@ class App(tk.Tk):
         self._brightness_job = None
 
         # automation
-        self.automation_running = False
-        self.automation_thread = None
-        self.automation_last_fired = set()  # (rule_index, YYYY-MM-DD, HH:MM)
+        self.scheduler = RuleScheduler(self._fire_rule, name="govee-automation")
 
         self._build_ui()
 
@@ -363,6 +362,7 @@ class App(tk.Tk):
             rule["r"], rule["g"], rule["b"] = map(int, parts)
 
         self.rules.append(rule)
+        self.scheduler.set_rules(self.rules)
         self.rules_list.insert("end", self._rule_to_text(rule))
         self.log(f"Added rule: {rule}")
 
@@ -373,6 +373,7 @@ class App(tk.Tk):
         for idx in reversed(sel):
             self.rules_list.delete(idx)
             self.rules.pop(idx)
+        self.scheduler.set_rules(self.rules)
         self.log("Removed selected rule(s)")
 
     def _rule_to_text(self, rule):
@@ -383,8 +384,8 @@ class App(tk.Tk):
         return f'{rule["time"]}  {rule["action"]}'
 
     def toggle_automation(self):
-        if self.automation_running:
-            self.automation_running = False
+        if self.scheduler.running:
+            self.scheduler.stop()
             self.auto_btn.config(text="Start")
             self.log("Automation stopped.")
             return
@@ -395,48 +396,22 @@ class App(tk.Tk):
             self.log(f"Automation start failed: {e}")
             return
 
-        self.automation_running = True
+        self.scheduler.set_rules(self.rules)
+        self.scheduler.start()
         self.auto_btn.config(text="Stop")
         self.log("Automation started.")
 
-        def worker():
-            while self.automation_running:
-                now = datetime.now()
-                hm = now.strftime("%H:%M")
-                day = now.strftime("%Y-%m-%d")
-
-                for idx, rule in enumerate(self.rules):
-                    if rule.get("time") != hm:
-                        continue
-
-                    key = (idx, day, hm)
-                    if key in self.automation_last_fired:
-                        continue
-
-                    # fire rule
-                    try:
-                        act = rule["action"]
-                        if act == "on":
-                            self.govee.on()
-                        elif act == "off":
-                            self.govee.off()
-                        elif act == "brightness":
-                            self.govee.brightness(int(rule["value"]))
-                        elif act == "rgb":
-                            self.govee.rgb(int(rule["r"]), int(rule["g"]), int(rule["b"]))
-                        else:
-                            raise ValueError("Unknown action")
-
-                        self.after(0, lambda r=rule: self.log(f"Automation fired: {r}"))
-                    except Exception as e:
-                        self.after(0, lambda e=e: self.log(f"Automation error: {e}"))
-
-                    self.automation_last_fired.add(key)
-
-                time.sleep(1.0)
-
-        self.automation_thread = threading.Thread(target=worker, daemon=True)
-        self.automation_thread.start()
+    def _fire_rule(self, rule, due_ts):
+        # runs on the scheduler thread; UI updates go through after()
+        try:
+            if rule.target is not None or rule.effect:
+                raise ValueError("targets and effects need the backend")
+            for cmd, data in rule.commands:
+                self.govee._send({"msg": {"cmd": cmd, "data": data}})
+
+            self.after(0, lambda r=rule.rule: self.log(f"Automation fired: {r}"))
+        except Exception as e:
+            self.after(0, lambda e=e: self.log(f"Automation error: {e}"))
 
     def save_rules(self):
         try:
@@ -457,6 +432,7 @@ class App(tk.Tk):
             self.govee.set_ip(ip)
 
             self.rules = cfg.get("rules", [])
+            self.scheduler.set_rules(self.rules)
             self.rules_list.delete(0, "end")
             for r in self.rules:
                 self.rules_list.insert("end", self._rule_to_text(r))
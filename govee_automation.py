@@ -1,71 +1,55 @@
-import json
-import time
-from datetime import datetime, date
+from datetime import datetime
 from govee_lan import GoveeLAN
+from govee_scheduler import RuleScheduler, RulesWatcher
 
 RULES_FILE = "rules.json"
-POLL_SECONDS = 1.0
+RELOAD_SECONDS = 2.0
 
-def load_rules():
-    with open(RULES_FILE, "r", encoding="utf-8") as f:
-        cfg = json.load(f)
-    return cfg["device_ip"], cfg.get("rules", [])
-
-def run_action(dev: GoveeLAN, rule: dict):
-    action = rule["action"]
-
-    if action == "on":
-        dev.on()
-    elif action == "off":
-        dev.off()
-    elif action == "brightness":
-        dev.brightness(int(rule["value"]))
-    elif action == "rgb":
-        dev.rgb(int(rule["r"]), int(rule["g"]), int(rule["b"]))
-    else:
-        raise ValueError(f"Unknown action: {action}")
+def run_action(dev: GoveeLAN, rule):
+    # rule je už skompilované (CompiledRule), príkazy sú pripravené
+    if rule.effect:
+        raise ValueError("effects need the backend (app_backend.py)")
+    for cmd, data in rule.commands:
+        dev.send_command(cmd, data)
 
 def main():
-    ip, rules = load_rules()
-    dev = GoveeLAN(ip)
-
-    # aby sa to nespúšťalo 60x počas tej istej minúty
-    last_run = {}  # key=(rule_index, yyyy-mm-dd) -> "HH:MM"
-
-    print(f"[Automation] Running for device {ip} (UDP 4003)")
-    print(f"[Automation] Loaded {len(rules)} rules from {RULES_FILE}")
-
-    while True:
-        now = datetime.now()
-        hm = now.strftime("%H:%M")
-        today = date.today().isoformat()
-
-        # hot-reload rules každých pár sekúnd (jednoduché)
+    default = GoveeLAN("")
+    targets = {}  # ip -> GoveeLAN pre pravidlá s vlastným target
+
+    def device_for(rule):
+        if rule.target is None:
+            return default
+        kind, member = rule.target
+        if kind != "device" or not member.get("ip"):
+            raise ValueError("only ip targets are supported here (groups need the backend)")
+        dev = targets.get(member["ip"])
+        if dev is None:
+            dev = targets[member["ip"]] = GoveeLAN(member["ip"], device=member.get("device"), sku=member.get("sku"))
+        return dev
+
+    def fire(rule, due_ts):
+        stamp = datetime.now().strftime('%H:%M:%S')
         try:
-            ip_new, rules = load_rules()
-            if ip_new != dev.ip:
-                dev.set_ip(ip_new)
-        except Exception:
-            pass
-
-        for idx, rule in enumerate(rules):
-            if rule.get("type") != "daily":
-                continue
-
-            if rule.get("time") == hm:
-                key = (idx, today)
-                if last_run.get(key) == hm:
-                    continue
-
-                try:
-                    run_action(dev, rule)
-                    print(f"[{now.strftime('%H:%M:%S')}] OK -> {rule}")
-                except Exception as e:
-                    print(f"[{now.strftime('%H:%M:%S')}] FAIL -> {rule} | {e}")
-
-                last_run[key] = hm
-
-        time.sleep(POLL_SECONDS)
+            run_action(device_for(rule), rule)
+            print(f"[{stamp}] OK -> {rule.rule}")
+        except Exception as e:
+            print(f"[{stamp}] FAIL -> {rule.rule} | {e}")
+
+    # spí presne do najbližšieho pravidla namiesto kontroly každú sekundu
+    scheduler = RuleScheduler(fire)
+
+    def apply(cfg):
+        default.set_ip(cfg.get("device_ip", default.ip))
+        rules = cfg.get("rules", [])
+        scheduler.set_rules(rules, location=cfg.get("location"))
+        print(f"[Automation] Loaded {len(rules)} rules from {RULES_FILE} (device {default.ip}, UDP 4003)")
+
+    # hot-reload: súbor sa číta znova len keď sa zmení (mtime/size)
+    watcher = RulesWatcher(RULES_FILE, apply, interval=RELOAD_SECONDS)
+    if not watcher.check():
+        raise SystemExit(f"[Automation] Could not load {RULES_FILE}")
+    scheduler.start()
+    watcher.run()
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,9 @@
+import asyncio
 import json
-import socket
 from typing import Optional
 
+from govee_transport import get_transport
+
 class GoveeLAN:
     def __init__(self, ip: str, port: int = 4003, device: Optional[str] = None, sku: Optional[str] = None):
         self.ip = ip
@@ -34,22 +36,21 @@ class GoveeLAN:
 
     def _send(self, payload: dict, expect_reply: bool = False, timeout: float = 1.0, device: Optional[str] = None, sku: Optional[str] = None):
         payload = self._with_device_info(payload, device=device, sku=sku)
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.settimeout(timeout)
+        data = json.dumps(payload).encode("utf-8")
         try:
-            s.sendto(json.dumps(payload).encode("utf-8"), (self.ip, self.port))
-            if expect_reply:
-                data, _ = s.recvfrom(65535)
-                txt = data.decode("utf-8", errors="ignore")
-                try:
-                    return json.loads(txt)
-                except Exception:
-                    return {"raw": txt}
-            return None
-        except (socket.timeout, ConnectionResetError, OSError):
+            transport = get_transport()
+            if not expect_reply:
+                transport.send_sync(self.ip, self.port, data)
+                return None
+            cmd = payload.get("msg", {}).get("cmd")
+            reply = transport.request_sync(self.ip, self.port, data, timeout=timeout, expect_cmd=cmd)
+            txt = reply.decode("utf-8", errors="ignore")
+            try:
+                return json.loads(txt)
+            except Exception:
+                return {"raw": txt}
+        except (asyncio.TimeoutError, ConnectionResetError, OSError):
             return None
-        finally:
-            s.close()
 
     def on(self):
         return self._send(self._wrap_msg("turn", {"value": 1}))
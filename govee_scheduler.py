@@ -0,0 +1,752 @@
+"""
+Rule scheduler for Govee automations.
+
+Instead of waking every second and comparing HH:MM strings against every
+rule, the next fire time of each rule is computed once and kept in a
+min-heap. A single worker thread sleeps on a condition variable until the
+earliest rule is due, and rule edits wake it early.
+
+Fire times are local wall-clock times resolved through the OS timezone
+rules, so a rule keeps firing at its local time across DST changes and
+never fires twice for the same local time. Wall-clock jumps (NTP steps, manual
+changes, suspend/resume) are detected by comparing the wall clock with the
+monotonic clock: after a backward jump the heap is rebuilt, and after a
+forward jump missed rules still run if they are within MISFIRE_GRACE.
+"""
+
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple
+
+MAX_SLEEP = 30.0  # longest single wait, so wall-clock jumps are noticed promptly
+MISFIRE_GRACE = 60.0  # seconds a late fire may still run (after suspend or a forward jump)
+JUMP_THRESHOLD = 2.0  # wall vs monotonic disagreement treated as a clock jump
+RULES_CHECK_INTERVAL = 2.0  # seconds between rules file stat() checks
+JOURNAL_MAX_BYTES = 256 * 1024  # compact the fire journal beyond this size
+JOURNAL_TAIL_BYTES = 64 * 1024  # how much of the journal is read on startup
+
+
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+MONTH_NAMES = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+ALL_DAYS = 0b1111111
+DAY_ALIASES = {"daily": ALL_DAYS, "weekdays": 0b0011111, "weekends": 0b1100000}
+
+
+def parse_time(value: str):
+    """Parse HH:MM or HH:MM:SS into (hour, minute, second)"""
+    parts = str(value).strip().split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Invalid time {value!r}, expected HH:MM")
+    hour, minute = int(parts[0]), int(parts[1])
+    second = int(parts[2]) if len(parts) == 3 else 0
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60):
+        raise ValueError(f"Invalid time {value!r}")
+    return hour, minute, second
+
+
+def parse_days(value) -> int:
+    """Weekday mask (bit 0 = Monday) from "weekdays", "mon,wed", ["sat", "sun"] or [0, 6]"""
+    if value is None:
+        return ALL_DAYS
+    if isinstance(value, str):
+        key = value.strip().lower()
+        if key in DAY_ALIASES:
+            return DAY_ALIASES[key]
+        value = [v for v in key.replace(" ", ",").split(",") if v]
+    mask = 0
+    for day in value:
+        if isinstance(day, int) and 0 <= day <= 6:
+            mask |= 1 << day
+        elif str(day).lower()[:3] in WEEKDAY_NAMES:
+            mask |= 1 << WEEKDAY_NAMES.index(str(day).lower()[:3])
+        else:
+            raise ValueError(f"Invalid weekday {day!r}")
+    if not mask:
+        raise ValueError("days must name at least one weekday")
+    return mask
+
+
+# ---------- triggers ----------
+class DailyTrigger:
+    """Fires at a fixed local time on the days in a weekday mask"""
+
+    __slots__ = ("hour", "minute", "second", "days")
+
+    def __init__(self, hour: int, minute: int, second: int = 0, days: int = ALL_DAYS):
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+        self.days = days
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        cand = after.replace(hour=self.hour, minute=self.minute, second=self.second, microsecond=0)
+        if cand <= after:
+            cand += timedelta(days=1)
+        for _ in range(7):
+            if self.days >> cand.weekday() & 1:
+                return cand
+            cand += timedelta(days=1)
+        return None
+
+
+def _cron_field(text: str, lo: int, hi: int, names=()):
+    values = set()
+    for part in text.lower().split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, stop = lo, hi
+        else:
+            first, _, last = part.partition("-")
+            start = names.index(first) + lo if first in names else int(first)
+            stop = (names.index(last) + lo if last in names else int(last)) if last else (hi if step > 1 else start)
+        if step < 1 or not (lo <= start <= stop <= hi):
+            raise ValueError(f"Invalid cron field {text!r}")
+        values.update(range(start, stop + 1, step))
+    return frozenset(values)
+
+
+class CronTrigger:
+    """Standard 5-field cron schedule: minute hour day-of-month month day-of-week"""
+
+    __slots__ = ("minutes", "hours", "mdays", "months", "wdays", "mday_any", "wday_any")
+
+    def __init__(self, expr: str):
+        fields = str(expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression {expr!r}, expected 5 fields")
+        self.minutes = _cron_field(fields[0], 0, 59)
+        self.hours = _cron_field(fields[1], 0, 23)
+        self.mdays = _cron_field(fields[2], 1, 31)
+        self.months = _cron_field(fields[3], 1, 12, MONTH_NAMES)
+        # cron counts Sunday as 0 (and 7); store as Python weekdays (Monday = 0)
+        cron_wdays = _cron_field(fields[4], 0, 7, ("sun",) + WEEKDAY_NAMES[:6])
+        self.wdays = frozenset((d - 1) % 7 for d in cron_wdays)
+        self.mday_any = fields[2] == "*"
+        self.wday_any = fields[4] == "*"
+
+    def _day_ok(self, t: datetime) -> bool:
+        mday, wday = t.day in self.mdays, t.weekday() in self.wdays
+        if self.mday_any or self.wday_any:
+            return mday and wday
+        return mday or wday  # cron: both restricted means either may match
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + timedelta(days=366 * 5)
+        while t <= limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_ok(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        return None
+
+
+def sun_event_utc(day, lat: float, lon: float, rising: bool) -> Optional[datetime]:
+    """Sunrise/sunset (UTC) for a date using the NOAA solar position equations; None during polar day/night"""
+    jd = day.toordinal() + 1721424.5 + 0.5 - lon / 360.0  # approximate local solar noon
+    jc = (jd - 2451545.0) / 36525.0
+    mean_long = (280.46646 + jc * (36000.76983 + jc * 0.0003032)) % 360
+    mean_anom = 357.52911 + jc * (35999.05029 - 0.0001537 * jc)
+    ecc = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+    m = math.radians(mean_anom)
+    center = (math.sin(m) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+              + math.sin(2 * m) * (0.019993 - 0.000101 * jc) + math.sin(3 * m) * 0.000289)
+    omega = math.radians(125.04 - 1934.136 * jc)
+    app_long = mean_long + center - 0.00569 - 0.00478 * math.sin(omega)
+    obliq = 23 + (26 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60) / 60
+    obliq += 0.00256 * math.cos(omega)
+    decl = math.asin(math.sin(math.radians(obliq)) * math.sin(math.radians(app_long)))
+    y = math.tan(math.radians(obliq / 2)) ** 2
+    l0 = math.radians(mean_long)
+    eq_time = 4 * math.degrees(y * math.sin(2 * l0) - 2 * ecc * math.sin(m)
+                               + 4 * ecc * y * math.sin(m) * math.cos(2 * l0)
+                               - 0.5 * y * y * math.sin(4 * l0) - 1.25 * ecc * ecc * math.sin(2 * m))
+    phi = math.radians(lat)
+    cos_ha = math.cos(math.radians(90.833)) / (math.cos(phi) * math.cos(decl)) - math.tan(phi) * math.tan(decl)
+    if not -1.0 <= cos_ha <= 1.0:
+        return None
+    ha = math.degrees(math.acos(cos_ha))
+    noon = 720 - 4 * lon - eq_time  # minutes after UTC midnight
+    minutes = noon - 4 * ha if rising else noon + 4 * ha
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(minutes=minutes)
+
+
+class SunTrigger:
+    """Sunrise or sunset plus an offset in minutes, on the days in a weekday mask"""
+
+    __slots__ = ("rising", "offset", "lat", "lon", "days")
+
+    def __init__(self, event: str, lat: float, lon: float, offset: float = 0, days: int = ALL_DAYS):
+        if event not in ("sunrise", "sunset"):
+            raise ValueError("sun must be 'sunrise' or 'sunset'")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("Invalid latitude/longitude")
+        self.rising = event == "sunrise"
+        self.offset = timedelta(minutes=offset)
+        self.lat = lat
+        self.lon = lon
+        self.days = days
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        day = after.date() - timedelta(days=1)
+        for _ in range(370):  # a year covers polar nights
+            event = sun_event_utc(day, self.lat, self.lon, self.rising)
+            day += timedelta(days=1)
+            if event is None:
+                continue
+            local = event.astimezone().replace(tzinfo=None, microsecond=0) + self.offset
+            if local > after and self.days >> local.weekday() & 1:
+                return local
+        return None
+
+
+# ---------- actions ----------
+def compile_commands(rule: dict):
+    """LAN (cmd, data) pairs for a rule's action, clamped like GoveeLAN does"""
+    action = rule.get("action")
+    if action == "on":
+        commands = [("turn", {"value": 1})]
+    elif action == "off":
+        commands = [("turn", {"value": 0})]
+    elif action == "brightness":
+        commands = [("brightness", {"value": max(1, min(100, int(rule.get("value", 50))))})]
+    elif action in ("rgb", "color"):
+        rgb = {c: max(0, min(255, int(rule.get(c, 0)))) for c in ("r", "g", "b")}
+        commands = [("colorwc", {"color": rgb})]
+    elif action in ("color_temp", "color-temperature"):
+        commands = [("colorwc", {"colorTemInKelvin": max(1000, min(10000, int(rule.get("value", 4000))))})]
+    elif action == "scene":
+        commands = []
+    elif action == "effect":
+        if not isinstance(rule.get("effect"), dict) or not isinstance(rule["effect"].get("steps"), list):
+            raise ValueError("effect rules need effect: {steps: [...]}")
+        commands = []
+    else:
+        raise ValueError(f"Unknown action: {action}")
+
+    scene = rule.get("sceneId", rule.get("scene"))
+    if action == "scene" and scene is None:
+        raise ValueError("scene rules need sceneId")
+    if scene is not None:
+        if int(scene) < 0:
+            raise ValueError("sceneId must be a non-negative number")
+        commands.append(("scene", {"sceneId": int(scene)}))
+    return tuple(commands)
+
+
+def compile_target(rule: dict):
+    """("group", name), ("device", {ip, device, sku}) or None for the default device"""
+    target = rule.get("target")
+    if target is None and rule.get("group"):
+        target = {"group": rule["group"]}
+    if target is None:
+        return None
+    if isinstance(target, str):
+        target = {"ip": target}
+    if not isinstance(target, dict):
+        raise ValueError("target must be an object")
+    if target.get("group"):
+        return "group", str(target["group"])
+    member = {k: str(target[k]).strip() for k in ("ip", "device", "sku") if target.get(k)}
+    if not member.get("ip") and not member.get("device"):
+        raise ValueError("target needs group, ip or device")
+    return "device", member
+
+
+class CompiledRule:
+    """A rule parsed once: trigger, target and ready-to-send LAN commands"""
+
+    __slots__ = ("index", "rule", "trigger", "target", "commands", "effect", "label", "key")
+
+    def __init__(self, index, rule, trigger, target, commands, effect):
+        self.index = index
+        self.rule = rule
+        self.trigger = trigger
+        self.target = target
+        self.commands = commands
+        self.effect = effect
+        when = rule.get("time") or rule.get("cron") or rule.get("sun")
+        self.label = f"Rule #{index + 1} ({when}) {rule.get('action')}"
+        self.key = rule_id(rule)
+
+
+def rule_id(rule: dict) -> str:
+    """Stable identity of a rule across restarts and reordering, used by the fire journal"""
+    return hashlib.sha1(json.dumps(rule, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+def compile_rule(rule: dict, index: int = 0, location=None) -> CompiledRule:
+    """
+    Parse a rule dict; raises ValueError if it cannot be scheduled.
+
+    Schedules: {time: "HH:MM"}, {cron: "m h dom mon dow"} or
+    {sun: "sunrise"|"sunset", offset: minutes}, each optionally limited by
+    days ("weekdays", ["sat", "sun"], ...). Sun rules use lat/lon from the
+    rule or the scheduler location. Legacy {type: "daily"} rules are plain
+    time rules.
+    """
+    if not isinstance(rule, dict):
+        raise ValueError("rule must be an object")
+    days = parse_days(rule.get("days"))
+    if rule.get("cron"):
+        if rule.get("days") is not None:
+            raise ValueError("cron rules take weekdays in the cron expression")
+        trigger = CronTrigger(rule["cron"])
+    elif rule.get("sun"):
+        loc = location or {}
+        lat, lon = rule.get("lat", loc.get("lat")), rule.get("lon", loc.get("lon"))
+        if lat is None or lon is None:
+            raise ValueError("sun rules need a location (lat/lon)")
+        trigger = SunTrigger(rule["sun"], float(lat), float(lon), float(rule.get("offset", 0)), days)
+    elif rule.get("time"):
+        trigger = DailyTrigger(*parse_time(rule["time"]), days=days)
+    else:
+        raise ValueError("rule needs time, cron or sun")
+    return CompiledRule(index, rule, trigger, compile_target(rule), compile_commands(rule),
+                        rule.get("effect") if rule.get("action") == "effect" else None)
+
+
+def validate_rules_config(cfg) -> Tuple[list, Optional[dict]]:
+    """
+    Check a rules config ({rules: [...], location: {lat, lon}}) and return
+    (rules, location).
+
+    Every source of rules (startup load, hot reload, the rules API) goes
+    through here with one policy: the config is accepted only if every rule
+    compiles, otherwise ValueError names the first bad rule and nothing is
+    applied.
+    """
+    if not isinstance(cfg, dict) or not isinstance(cfg.get("rules", []), list):
+        raise ValueError("expected an object with a rules list")
+    location = cfg.get("location")
+    if location is not None:
+        try:
+            location = {"lat": float(location["lat"]), "lon": float(location["lon"])}
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("location needs numeric lat and lon")
+    rules = cfg.get("rules", [])
+    for index, rule in enumerate(rules):
+        try:
+            compile_rule(rule, index, location)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"rule #{index + 1}: {e}")
+    return rules, location
+
+
+def _rule_key(index: int, rule: dict):
+    return index, json.dumps(rule, sort_keys=True, default=str)
+
+
+class _Entry:
+    __slots__ = ("compiled", "due_local", "due_ts", "last_fire")
+
+    def __init__(self, compiled, last_fire=None):
+        self.compiled = compiled
+        self.due_local = None
+        self.due_ts = None
+        self.last_fire = last_fire  # local time of the last fire, guards against refiring after clock changes
+
+
+class RuleScheduler:
+    """
+    Heap-based scheduler calling fire(compiled_rule, due_ts) on its own thread.
+
+    set_rules() may be called at any time from any thread; the fire callback
+    runs outside the scheduler lock.
+    """
+
+    def __init__(self, fire: Callable, name: str = "govee-scheduler"):
+        self._fire = fire
+        self.name = name
+        self._cond = threading.Condition()
+        self._heap = []  # (due_ts, seq, key)
+        self._entries = {}  # key -> _Entry
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.fired = 0
+        self.misfired = 0
+        self.clock_jumps = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    # ---------- rules ----------
+    def set_rules(self, rules, location=None):
+        """Compile and replace the rule set; unchanged rules keep their last fire time"""
+        compiled = []
+        for index, rule in enumerate(rules or []):
+            try:
+                compiled.append(compile_rule(rule, index, location))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"[SCHEDULER] Skipping rule #{index + 1}: {e}")
+        with self._cond:
+            old = self._entries
+            entries = {}
+            for rule in compiled:
+                key = _rule_key(rule.index, rule.rule)
+                prev = old.get(key)
+                entries[key] = _Entry(rule, last_fire=prev.last_fire if prev else None)
+            self._entries = entries
+            self._rebuild(datetime.now())
+            self._cond.notify()
+
+    def _schedule(self, key, entry, after: datetime):
+        trigger = entry.compiled.trigger
+        due = trigger.next_after(after)
+        while due is not None and entry.last_fire is not None and due <= entry.last_fire:
+            due = trigger.next_after(due)
+        entry.due_local = due
+        entry.due_ts = due.timestamp() if due is not None else None
+        if due is not None:
+            heapq.heappush(self._heap, (entry.due_ts, next(self._seq), key))
+
+    def _rebuild(self, now: datetime):
+        self._heap = []
+        for key, entry in self._entries.items():
+            self._schedule(key, entry, now)
+
+    def _collect_due(self, wall: float):
+        due = []
+        while self._heap and self._heap[0][0] <= wall:
+            due_ts, _seq, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry.due_ts != due_ts:
+                continue  # rule edited or removed since it was queued
+            entry.last_fire = entry.due_local
+            self._schedule(key, entry, entry.due_local)
+            if wall - due_ts > MISFIRE_GRACE:
+                self.misfired += 1
+                print(f"[SCHEDULER] Skipped {entry.compiled.label}: {wall - due_ts:.0f}s late")
+                continue
+            due.append((entry.compiled, due_ts))
+        return due
+
+    # ---------- worker ----------
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            # rules that came due while stopped are not replayed
+            self._rebuild(datetime.now())
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+
+    def _run(self):
+        last_wall, last_mono = time.time(), time.monotonic()
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                wall, mono = time.time(), time.monotonic()
+                jump = (wall - last_wall) - (mono - last_mono)
+                last_wall, last_mono = wall, mono
+                if abs(jump) > JUMP_THRESHOLD:
+                    self.clock_jumps += 1
+                    print(f"[SCHEDULER] Clock jumped {jump:+.1f}s")
+                    if jump < 0:
+                        self._rebuild(datetime.now())
+                due = self._collect_due(wall)
+                if not due:
+                    timeout = MAX_SLEEP
+                    if self._heap:
+                        timeout = max(0.0, min(MAX_SLEEP, self._heap[0][0] - wall))
+                    self._cond.wait(timeout)
+                    continue
+
+            for rule, due_ts in due:
+                self.fired += 1
+                try:
+                    self._fire(rule, due_ts)
+                except Exception as e:
+                    print(f"[SCHEDULER] {rule.label} failed: {e}")
+
+    def fires_between(self, start_ts: float, end_ts: float, limit: int = 1000):
+        """(compiled rule, due_ts) for every fire in (start_ts, end_ts], oldest first"""
+        with self._cond:
+            rules = [entry.compiled for entry in self._entries.values()]
+        fires = []
+        for rule in rules:
+            due = rule.trigger.next_after(datetime.fromtimestamp(start_ts))
+            while due is not None and due.timestamp() <= end_ts and len(fires) < limit:
+                fires.append((rule, due.timestamp()))
+                due = rule.trigger.next_after(due)
+        fires.sort(key=lambda fire: fire[1])
+        return fires
+
+    def status(self, limit: int = 5):
+        with self._cond:
+            upcoming = heapq.nsmallest(limit, self._heap)
+            next_fires = []
+            for due_ts, _seq, key in upcoming:
+                entry = self._entries.get(key)
+                if entry is not None and entry.due_ts == due_ts:
+                    next_fires.append({
+                        "index": entry.compiled.index,
+                        "rule": entry.compiled.rule,
+                        "due": datetime.fromtimestamp(due_ts).isoformat(timespec="seconds"),
+                    })
+            return {
+                "running": self._running,
+                "rules": len(self._entries),
+                "next": next_fires,
+                "fired": self.fired,
+                "misfired": self.misfired,
+                "clock_jumps": self.clock_jumps,
+            }
+
+
+class RulesWatcher:
+    """
+    Hot-reload for a rules.json file.
+
+    Only stat()s the file every interval and re-reads it when mtime, size or
+    inode change, so an idle watcher does no file reads. A changed file is
+    applied only if it passes validate_rules_config; otherwise the current
+    rules stay in place until the next edit.
+    """
+
+    def __init__(self, path: str, on_change: Callable, interval: float = RULES_CHECK_INTERVAL):
+        self.path = path
+        self.on_change = on_change  # called with the validated config dict
+        self.interval = interval
+        self._signature = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.rejected = 0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def sync(self):
+        """Record the current file as applied (after writing it ourselves)"""
+        with self._lock:
+            self._signature = self._stat()
+
+    def check(self) -> bool:
+        """Reload if the file changed; returns True when new rules were applied"""
+        with self._lock:
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    cfg = json.load(f)
+                rules, location = validate_rules_config(cfg)
+                cfg = dict(cfg, rules=rules, location=location)
+            except (OSError, ValueError) as e:
+                self.rejected += 1
+                print(f"[RULES] Ignoring {self.path}: {e}")
+                return False
+            self.reloads += 1
+        self.on_change(cfg)
+        return True
+
+    def run(self):
+        """Watch until stop() is called (blocking)"""
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"[RULES] Watch error: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="govee-rules-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class FireJournal:
+    """
+    Append-only JSON-lines journal of automation fires.
+
+    append() only queues the record; a writer thread writes whatever has
+    queued up and fsyncs once per batch, so a burst of fires never waits
+    on the disk. tail() and close() flush the queue first. Startup only reads the
+    last JOURNAL_TAIL_BYTES; once the file grows past JOURNAL_MAX_BYTES it is
+    compacted to the newest record per rule still in the rule set (see
+    retain). The automation start/stop state lives in its own small file
+    next to the journal, so it can never fall out of the tail.
+    """
+
+    def __init__(self, path: str, max_bytes: int = JOURNAL_MAX_BYTES, tail_bytes: int = JOURNAL_TAIL_BYTES):
+        self.path = path
+        self.state_path = path + ".state"
+        self.max_bytes = max_bytes
+        self.tail_bytes = tail_bytes
+        self._lock = threading.Lock()  # the files
+        self._cond = threading.Condition()  # the queue
+        self._pending = []
+        self._queued = 0  # records appended so far
+        self._written = 0  # records the writer has finished with
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._keep = None  # rule keys kept by compaction; None keeps every key
+
+    def retain(self, keys):
+        """Limit compaction to these rule keys (the current rule set)"""
+        with self._lock:
+            self._keep = frozenset(keys)
+
+    def set_state(self, event: str):
+        """Durably record that automation was started or stopped"""
+        record = {"event": event, "t": round(time.time(), 3)}
+        tmp = self.state_path + ".tmp"
+        with self._lock:
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(json.dumps(record, separators=(",", ":")))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.state_path)
+            except OSError as e:
+                print(f"[JOURNAL] State write failed: {e}")
+
+    def state(self) -> Optional[dict]:
+        """The last start/stop event ({event, t}), or None if there is none"""
+        with self._lock:
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                print(f"[JOURNAL] State read failed: {e}")
+                return None
+        # journals written before the state file kept events inline
+        events = [r for r in self.tail() if "event" in r]
+        return events[-1] if events else None
+
+    def append(self, record: dict):
+        """Queue a record for the writer thread (never blocks on the disk)"""
+        record = dict(record, t=round(time.time(), 3))
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._cond:
+            if self._closed:
+                self._write([line])  # after close(): write through
+                return
+            self._pending.append(line)
+            self._queued += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="govee-journal", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every record appended so far is on disk"""
+        with self._cond:
+            target = self._queued
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout: float = 2.0):
+        """Flush the queue and stop the writer thread; later appends write through"""
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                batch, self._pending = self._pending, []
+                if not batch and self._closed:
+                    return
+            self._write(batch)
+            with self._cond:
+                self._written += len(batch)
+                self._cond.notify_all()
+
+    def _write(self, lines):
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+                if size > self.max_bytes:
+                    self._compact()
+            except OSError as e:
+                print(f"[JOURNAL] Write failed: {e}")
+
+    @staticmethod
+    def _parse(lines):
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # torn write at a crash, or a partial first line of the tail
+        return records
+
+    def tail(self):
+        """Records from the end of the journal, oldest first"""
+        self.flush()
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(0, os.SEEK_END)
+                    size = f.tell()
+                    f.seek(max(0, size - self.tail_bytes))
+                    data = f.read()
+            except FileNotFoundError:
+                return []
+        lines = data.decode("utf-8", errors="ignore").splitlines()
+        if size > self.tail_bytes and lines:
+            lines = lines[1:]
+        return self._parse(lines)
+
+    def _compact(self):
+        with open(self.path, "r", encoding="utf-8", errors="ignore") as f:
+            records = self._parse(f)
+        latest = {}
+        for record in records:
+            key = record.get("rule")
+            if key is not None and (self._keep is None or key in self._keep):
+                latest[key] = record
+        kept = sorted(latest.values(), key=lambda r: r.get("t", 0))
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in kept:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
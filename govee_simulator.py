@@ -0,0 +1,296 @@
+"""
+Govee LAN device simulator.
+
+Emulates N virtual lights speaking the LAN protocol so the backend, the
+automation scheduler and the benchmarks can run without real hardware:
+
+- a scan listener on port 4001 answers {"cmd": "scan"} probes; every
+  device replies from its own address to the prober's port 4002
+- each device binds <ip>:4003, keeps state from turn/brightness/colorwc/
+  scene and answers devStatus with that state
+
+Reply latency (with jitter), packet loss and a per-device max command rate
+are configurable, so throughput features can be measured reproducibly.
+Devices default to 127.0.0.10, 127.0.0.11, ... (Linux routes all of
+127.0.0.0/8 to loopback; on macOS/Windows add the aliases or use --base-ip).
+
+Point the backend at the simulator's scan listener with
+GOVEE_SCAN_ADDRS=127.0.0.1.
+
+    python govee_simulator.py --count 20 --latency 15 --loss 0.01 --rate 20
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import random
+import threading
+import time
+from typing import List, Optional
+
+SCAN_PORT = 4001
+RECV_PORT = 4002
+CONTROL_PORT = 4003
+
+
+class VirtualDevice:
+    """State and protocol handling for one simulated light"""
+
+    def __init__(self, sim: "Simulator", ip: str, index: int):
+        self.sim = sim
+        self.ip = ip
+        self.device = "AA:BB:CC:DD:EE:{:02X}:{:02X}".format(index // 256, index % 256)
+        self.sku = sim.sku
+        self.power = 0
+        self.brightness = 100
+        self.color = {"r": 255, "g": 255, "b": 255}
+        self.color_temp = 0
+        self.scene = None
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.tokens = float(sim.burst)
+        self.updated = None
+        self.received = 0
+        self.dropped_loss = 0
+        self.dropped_rate = 0
+        self.replies = 0
+
+    # ---------- protocol ----------
+    def scan_reply(self):
+        return {"msg": {"cmd": "scan", "data": {
+            "ip": self.ip,
+            "device": self.device,
+            "sku": self.sku,
+            "bleVersionHard": "3.01.01",
+            "bleVersionSoft": "1.04.04",
+            "wifiVersionHard": "1.00.10",
+            "wifiVersionSoft": "1.02.11",
+        }}}
+
+    def status_reply(self):
+        return {"msg": {"cmd": "devStatus", "data": {
+            "onOff": self.power,
+            "brightness": self.brightness,
+            "color": dict(self.color),
+            "colorTemInKelvin": self.color_temp,
+        }}}
+
+    def _rate_ok(self, now):
+        if self.sim.rate <= 0:
+            return True
+        if self.updated is not None:
+            self.tokens = min(float(self.sim.burst), self.tokens + (now - self.updated) * self.sim.rate)
+        self.updated = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def handle(self, data: bytes, addr):
+        self.received += 1
+        if self.sim.loss and random.random() < self.sim.loss:
+            self.dropped_loss += 1
+            return
+        if not self._rate_ok(time.monotonic()):
+            self.dropped_rate += 1  # a real light silently ignores commands it cannot keep up with
+            return
+        try:
+            msg = json.loads(data.decode("utf-8"))["msg"]
+            cmd, body = msg.get("cmd"), msg.get("data") or {}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return
+
+        if cmd == "turn":
+            self.power = 1 if body.get("value") else 0
+        elif cmd == "brightness":
+            self.brightness = max(1, min(100, int(body.get("value", self.brightness))))
+        elif cmd == "colorwc":
+            if body.get("colorTemInKelvin"):
+                self.color_temp = int(body["colorTemInKelvin"])
+            elif isinstance(body.get("color"), dict):
+                self.color = {k: int(body["color"].get(k, 0)) for k in ("r", "g", "b")}
+                self.color_temp = 0
+            self.scene = None
+        elif cmd == "scene":
+            self.scene = body.get("sceneId")
+        elif cmd == "devStatus":
+            self.sim.reply(self, self.status_reply(), addr)
+        if self.sim.on_command is not None:
+            self.sim.on_command(self, cmd, body)
+
+    def snapshot(self):
+        return {
+            "ip": self.ip,
+            "device": self.device,
+            "power": self.power,
+            "brightness": self.brightness,
+            "color": self.color,
+            "color_temp": self.color_temp,
+            "scene": self.scene,
+            "received": self.received,
+            "replies": self.replies,
+            "dropped_loss": self.dropped_loss,
+            "dropped_rate": self.dropped_rate,
+        }
+
+
+class _DeviceProtocol(asyncio.DatagramProtocol):
+    def __init__(self, device: VirtualDevice):
+        self.device = device
+
+    def datagram_received(self, data, addr):
+        self.device.handle(data, addr)
+
+    def error_received(self, exc):
+        pass  # ICMP unreachable from a prober that already went away
+
+
+class _ScanProtocol(asyncio.DatagramProtocol):
+    def __init__(self, sim: "Simulator"):
+        self.sim = sim
+
+    def datagram_received(self, data, addr):
+        if b'"scan"' not in data:
+            return
+        for dev in self.sim.devices:
+            if self.sim.loss and random.random() < self.sim.loss:
+                continue
+            self.sim.reply(dev, dev.scan_reply(), (addr[0], RECV_PORT))
+
+
+class Simulator:
+    """A set of virtual devices served from one event loop"""
+
+    def __init__(self, count: int = 1, base_ip: str = "127.0.0.10", scan_host: str = "127.0.0.1",
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, loss: float = 0.0,
+                 rate: float = 0.0, burst: int = 10, sku: str = "H612C", control_port: int = CONTROL_PORT,
+                 scan_port: int = SCAN_PORT, on_command=None):
+        self.count = count
+        self.base_ip = base_ip
+        self.scan_host = scan_host
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.loss = loss
+        self.rate = rate
+        self.burst = burst
+        self.sku = sku
+        self.control_port = control_port
+        self.scan_port = scan_port
+        self.on_command = on_command  # called as on_command(device, cmd, data) on the simulator loop
+        self.devices: List[VirtualDevice] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._transports = []
+
+    def reply(self, dev: VirtualDevice, obj: dict, addr):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        data = json.dumps(obj).encode("utf-8")
+
+        def send():
+            if dev.transport is not None:
+                dev.replies += 1
+                dev.transport.sendto(data, addr)
+
+        if delay > 0:
+            self._loop.call_later(delay, send)
+        else:
+            send()
+
+    async def _open(self):
+        self._loop = asyncio.get_running_loop()
+        first = ipaddress.IPv4Address(self.base_ip)
+        for i in range(self.count):
+            dev = VirtualDevice(self, str(first + i), i)
+            dev.transport, _ = await self._loop.create_datagram_endpoint(
+                lambda dev=dev: _DeviceProtocol(dev), local_addr=(dev.ip, self.control_port))
+            self.devices.append(dev)
+            self._transports.append(dev.transport)
+        if self.scan_host:
+            scan, _ = await self._loop.create_datagram_endpoint(
+                lambda: _ScanProtocol(self), local_addr=(self.scan_host, self.scan_port))
+            self._transports.append(scan)
+
+    def _close(self):
+        for transport in self._transports:
+            transport.close()
+        self._transports.clear()
+
+    # ---------- embedding (tests/benchmarks) ----------
+    def start(self):
+        """Run the simulator on a background thread; returns once every socket is bound"""
+        ready = threading.Event()
+        errors = []
+
+        def runner():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self._open())
+            except Exception as e:
+                errors.append(e)
+                self._close()
+                ready.set()
+                loop.close()
+                return
+            ready.set()
+            loop.run_forever()
+            self._close()
+            loop.run_until_complete(asyncio.sleep(0))  # let the transports release their sockets
+            loop.close()
+
+        self._thread = threading.Thread(target=runner, name="govee-simulator", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=10.0)
+
+    def snapshot(self):
+        return [dev.snapshot() for dev in self.devices]
+
+    # ---------- CLI ----------
+    async def serve(self, report_every: float = 0.0):
+        await self._open()
+        print(f"[SIMULATOR] {self.count} device(s) on {self.devices[0].ip}..{self.devices[-1].ip}:{self.control_port}"
+              + (f", scan on {self.scan_host}:{self.scan_port}" if self.scan_host else ""))
+        try:
+            while True:
+                await asyncio.sleep(report_every or 3600)
+                if report_every:
+                    received = sum(d.received for d in self.devices)
+                    dropped = sum(d.dropped_loss + d.dropped_rate for d in self.devices)
+                    print(f"[SIMULATOR] received={received} replies={sum(d.replies for d in self.devices)} dropped={dropped}")
+        finally:
+            self._close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Govee LAN devices")
+    parser.add_argument("--count", type=int, default=5, help="number of virtual devices")
+    parser.add_argument("--base-ip", default="127.0.0.10", help="address of the first device")
+    parser.add_argument("--scan-host", default="127.0.0.1", help="address for the port-4001 scan listener ('' to disable)")
+    parser.add_argument("--latency", type=float, default=0.0, help="reply latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random reply latency in ms")
+    parser.add_argument("--loss", type=float, default=0.0, help="packet loss probability (0-1)")
+    parser.add_argument("--rate", type=float, default=0.0, help="max commands/s per device (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=10, help="commands a device accepts back-to-back")
+    parser.add_argument("--sku", default="H612C")
+    parser.add_argument("--report", type=float, default=10.0, help="seconds between counter reports (0 = quiet)")
+    args = parser.parse_args()
+
+    sim = Simulator(args.count, args.base_ip, args.scan_host, args.latency, args.jitter,
+                    args.loss, args.rate, args.burst, args.sku)
+    try:
+        asyncio.run(sim.serve(args.report))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Asyncio LAN transport for Govee devices.
+
+A single UDP datagram endpoint, driven by one background event loop,
+carries the traffic of every device. Replies are matched back to the
+request that is waiting for them, so any number of lights can be driven
+concurrently without parking a thread on recvfrom per request.
+
+Async callers await LanTransport.request()/send(); sync callers go through
+the facade methods (request_sync/send_sync) which hand work to the loop.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import json
+import threading
+from collections import deque
+from typing import Optional, Tuple
+
+from govee_metrics import registry
+
+DATAGRAMS_SENT = registry.counter("govee_transport_datagrams_sent_total", "UDP datagrams sent on the shared endpoint")
+DATAGRAMS_RECEIVED = registry.counter("govee_transport_datagrams_received_total", "UDP datagrams received on the shared endpoint")
+UNMATCHED_REPLIES = registry.counter("govee_transport_unmatched_replies_total", "Received datagrams no request was waiting for")
+REPLY_LATENCY = registry.histogram("govee_reply_latency_seconds", "Time from sending a request to its matching reply", ("ip",))
+REQUEST_TIMEOUTS = registry.counter("govee_request_timeouts_total", "Requests that got no reply in time", ("ip",))
+
+
+def _reply_cmd(data: bytes) -> Optional[str]:
+    try:
+        return json.loads(data.decode("utf-8", errors="ignore"))["msg"]["cmd"]
+    except Exception:
+        return None
+
+
+class _LanProtocol(asyncio.DatagramProtocol):
+    def __init__(self, owner: "LanTransport"):
+        self.owner = owner
+
+    def datagram_received(self, data, addr):
+        self.owner._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        # Windows reports ICMP port unreachable as WinError 10054 on UDP;
+        # the endpoint stays usable, pending requests simply time out.
+        print(f"[TRANSPORT] UDP error: {exc}")
+
+
+class LanTransport:
+    """Shared UDP endpoint multiplexing every device over one event loop"""
+
+    def __init__(self, bind_host: str = "0.0.0.0", bind_port: int = 0):
+        self.bind_host = bind_host
+        self.bind_port = bind_port
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._endpoint: Optional[asyncio.DatagramTransport] = None
+        self._start_lock = threading.Lock()
+        self._closed = False  # terminal: a closed transport is never restarted
+        self._waiters = {}  # ip -> deque[(expected_cmd, Future)]
+        self._ip_metrics = {}  # ip -> (reply latency, timeouts) metric children
+
+    # ---------- lifecycle ----------
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._endpoint is not None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def start(self):
+        """Start the event loop thread and open the endpoint (idempotent; raises once closed)"""
+        if self.running:
+            return
+        with self._start_lock:
+            if self._closed:
+                raise ConnectionError("LAN transport is closed")
+            if self.running:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            errors = []
+
+            def runner():
+                asyncio.set_event_loop(loop)
+                try:
+                    self._endpoint, _ = loop.run_until_complete(
+                        loop.create_datagram_endpoint(
+                            lambda: _LanProtocol(self),
+                            local_addr=(self.bind_host, self.bind_port),
+                        )
+                    )
+                except Exception as e:
+                    errors.append(e)
+                    ready.set()
+                    loop.close()
+                    return
+                ready.set()
+                loop.run_forever()
+                loop.close()
+
+            self._thread = threading.Thread(target=runner, name="govee-transport", daemon=True)
+            self._thread.start()
+            ready.wait()
+            if errors:
+                raise errors[0]
+            self._loop = loop
+
+    def close(self):
+        """Close the endpoint and stop the loop thread for good"""
+        with self._start_lock:
+            self._closed = True
+            loop, endpoint, thread = self._loop, self._endpoint, self._thread
+            if loop is None:
+                return
+            self._loop = None
+            self._endpoint = None
+            self._thread = None
+
+        def shutdown():
+            for waiters in self._waiters.values():
+                for _cmd, fut in waiters:
+                    if not fut.done():
+                        fut.cancel()
+            self._waiters.clear()
+            if endpoint is not None:
+                endpoint.close()
+            loop.stop()
+
+        try:
+            loop.call_soon_threadsafe(shutdown)
+        except RuntimeError:
+            return  # loop already closed
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+
+    # ---------- receive path ----------
+    def _on_datagram(self, data: bytes, addr: Tuple[str, int]):
+        DATAGRAMS_RECEIVED.inc()
+        waiters = self._waiters.get(addr[0])
+        if not waiters:
+            UNMATCHED_REPLIES.inc()
+            return
+        cmd = _reply_cmd(data)
+        for entry in waiters:
+            expected, fut = entry
+            if fut.done():
+                continue
+            if cmd is None or expected is None or expected == cmd:
+                waiters.remove(entry)
+                fut.set_result(data)
+                return
+        UNMATCHED_REPLIES.inc()
+
+    def _metrics_for(self, ip: str):
+        m = self._ip_metrics.get(ip)
+        if m is None:
+            m = self._ip_metrics[ip] = (REPLY_LATENCY.labels(ip), REQUEST_TIMEOUTS.labels(ip))
+        return m
+
+    # ---------- async API (runs on the loop) ----------
+    def sendto(self, data: bytes, ip: str, port: int):
+        """Queue a datagram; must be called on the loop thread"""
+        if self._endpoint is None:
+            raise ConnectionError("LAN transport is closed")
+        self._endpoint.sendto(data, (ip, port))
+        DATAGRAMS_SENT.inc()
+
+    async def send(self, ip: str, port: int, data: bytes):
+        self.sendto(data, ip, port)
+
+    async def request(self, ip: str, port: int, data: bytes, timeout: float = 1.0,
+                      expect_cmd: Optional[str] = None) -> bytes:
+        """Send a datagram and wait for the matching reply from the same IP"""
+        fut = self._loop.create_future()
+        waiters = self._waiters.setdefault(ip, deque())
+        entry = (expect_cmd, fut)
+        waiters.append(entry)
+        latency, timeouts = self._metrics_for(ip)
+        try:
+            started = self._loop.time()
+            self.sendto(data, ip, port)
+            reply = await asyncio.wait_for(fut, timeout)
+            latency.observe(self._loop.time() - started)
+            return reply
+        except asyncio.TimeoutError:
+            timeouts.inc()
+            raise
+        finally:
+            try:
+                waiters.remove(entry)
+            except ValueError:
+                pass
+            if not waiters and self._waiters.get(ip) is waiters:
+                del self._waiters[ip]
+
+    # ---------- sync facade ----------
+    def submit(self, coro):
+        """Schedule a coroutine on the transport loop; returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the transport loop and block for its result (cancelled if timeout elapses)"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def send_sync(self, ip: str, port: int, data: bytes):
+        """Fire-and-forget send from any thread (never blocks on the network)"""
+        self.loop.call_soon_threadsafe(self._send_safe, data, ip, port)
+
+    def _send_safe(self, data: bytes, ip: str, port: int):
+        try:
+            self.sendto(data, ip, port)
+        except Exception as e:
+            print(f"[TRANSPORT] Send to {ip}:{port} failed: {e}")
+
+    def request_sync(self, ip: str, port: int, data: bytes, timeout: float = 1.0,
+                     expect_cmd: Optional[str] = None) -> bytes:
+        return self.run(self.request(ip, port, data, timeout, expect_cmd))
+
+
+_transport: Optional[LanTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> LanTransport:
+    """Return the process-wide transport, starting it on first use (ConnectionError after close_transport)"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = LanTransport()
+    _transport.start()
+    return _transport
+
+
+def close_transport():
+    if _transport is not None:
+        _transport.close()
+
+
+atexit.register(close_transport)
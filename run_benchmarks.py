@@ -0,0 +1,324 @@
+"""
+Benchmarks for the backend hot paths, run against govee_simulator.py on loopback.
+
+Covers the fire-and-forget send pipeline (coalescer, send queue, packet log,
+state store), devStatus round trips, discovery against many simulated
+devices, scheduler fire lag with thousands of rules and the memory cost of
+the packet log. Results are JSON so runs can be compared:
+
+    python run_benchmarks.py --output bench.json
+    python run_benchmarks.py --save-baseline bench_baseline.json
+    python run_benchmarks.py --baseline bench_baseline.json   # exit 1 on regression
+
+The send queue's per-device rate limit is lifted while measuring, so the
+numbers reflect the code path rather than the configured throttle. Needs
+127.0.0.0/8 on loopback (Linux default).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+SIM_SCAN_HOST = "127.0.0.1"
+os.environ.setdefault("GOVEE_SCAN_ADDRS", SIM_SCAN_HOST)  # must be set before app_backend is imported
+
+import app_backend as backend  # noqa: E402
+from govee_scheduler import RuleScheduler  # noqa: E402
+from govee_simulator import Simulator  # noqa: E402
+from govee_transport import get_transport  # noqa: E402
+
+SEND_BASE_IP = "127.0.0.10"
+DISCOVERY_BASE_IP = "127.0.1.1"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a non-empty list"""
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def result(value, unit, better):
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+
+def latency_results(prefix, samples_s):
+    ms = [s * 1000.0 for s in samples_s]
+    return {
+        f"{prefix}_p50_ms": result(percentile(ms, 50), "ms", "lower"),
+        f"{prefix}_p99_ms": result(percentile(ms, 99), "ms", "lower"),
+    }
+
+
+class CommandWaiter:
+    """Counts commands the simulator receives and wakes a waiter at a target count"""
+
+    def __init__(self):
+        self.count = 0
+        self.target = None
+        self.event = threading.Event()
+
+    def __call__(self, device, cmd, data):
+        self.count += 1
+        if self.target is not None and self.count >= self.target:
+            self.event.set()
+
+    def expect(self, n):
+        self.event.clear()
+        self.target = self.count + n
+        return self.target
+
+    def wait(self, timeout):
+        return self.event.wait(timeout)
+
+
+# -------------------------
+# Benchmarks
+# -------------------------
+def bench_send(args):
+    """Commands/s per device and per-command send latency through GoveeLAN._send"""
+    waiter = CommandWaiter()
+    sim = Simulator(args.devices, base_ip=SEND_BASE_IP, scan_host="", on_command=waiter).start()
+    try:
+        transport = get_transport()
+        transport.loop.call_soon_threadsafe(lambda: backend.send_queue.configure(1e9, 10 ** 9))
+        lans = [backend.GoveeLAN(dev.ip) for dev in sim.devices]
+
+        # Throughput: every device gets a stream of control commands
+        total = args.devices * args.commands
+        waiter.expect(total)
+        start = time.perf_counter()
+        for k in range(args.commands):
+            for lan in lans:
+                lan.send_command("brightness", {"value": 1 + k % 100})
+        waiter.wait(30.0)
+        elapsed = time.perf_counter() - start
+        delivered = waiter.count - (waiter.target - total)
+
+        # Latency: one command at a time, call to arrival at the device
+        samples = []
+        lan = lans[0]
+        for k in range(args.samples):
+            waiter.expect(1)
+            t0 = time.perf_counter()
+            lan.send_command("brightness", {"value": 1 + k % 100})
+            if waiter.wait(1.0):
+                samples.append(time.perf_counter() - t0)
+    finally:
+        sim.stop()
+        get_transport().loop.call_soon_threadsafe(
+            lambda: backend.send_queue.configure(backend.MAX_PACKET_RATE, backend.PACKET_BURST))
+
+    out = {
+        "send_commands_per_sec_per_device": result(delivered / elapsed / args.devices, "cmd/s", "higher"),
+        "send_delivered_ratio": result(delivered / total, "ratio", "higher"),
+    }
+    if samples:
+        out.update(latency_results("send_latency", samples))
+    return out
+
+
+def bench_status(args):
+    """devStatus round trip (request, reply match, reconcile) against an instant-reply device"""
+    sim = Simulator(1, base_ip=SEND_BASE_IP, scan_host="").start()
+    try:
+        transport = get_transport()
+        transport.loop.call_soon_threadsafe(lambda: backend.send_queue.configure(1e9, 10 ** 9))
+        lan = backend.GoveeLAN(sim.devices[0].ip)
+        samples, failures = [], 0
+        for _ in range(args.samples):
+            t0 = time.perf_counter()
+            reply = lan.status()
+            if reply is None:
+                failures += 1
+            else:
+                samples.append(time.perf_counter() - t0)
+    finally:
+        sim.stop()
+        get_transport().loop.call_soon_threadsafe(
+            lambda: backend.send_queue.configure(backend.MAX_PACKET_RATE, backend.PACKET_BURST))
+
+    out = {"status_failures": result(failures, "count", "lower")}
+    if samples:
+        out.update(latency_results("status_latency", samples))
+    return out
+
+
+def bench_discovery(args):
+    """Time to first device and to all devices for one scan of many simulated devices"""
+    # real lights answer a scan over tens of milliseconds, not in one burst
+    sim = Simulator(args.discovery_devices, base_ip=DISCOVERY_BASE_IP, scan_host=SIM_SCAN_HOST,
+                    latency_ms=2.0, jitter_ms=50.0).start()
+    first, full, found = [], [], []
+    try:
+        for _ in range(args.rounds):
+            seen = 0
+            start = time.perf_counter()
+            for _dev in backend.iter_discovery([], timeout=5.0, expected=args.discovery_devices):
+                seen += 1
+                if seen == 1:
+                    first.append(time.perf_counter() - start)
+            full.append(time.perf_counter() - start)
+            found.append(seen)
+    finally:
+        sim.stop()
+
+    out = {
+        "discovery_devices_found": result(min(found), "devices", "higher"),
+        "discovery_all_devices_ms": result(percentile(full, 50) * 1000.0, "ms", "lower"),
+    }
+    if first:
+        out["discovery_first_device_ms"] = result(percentile(first, 50) * 1000.0, "ms", "lower")
+    return out
+
+
+def bench_scheduler(args):
+    """Lag between due time and fire for thousands of rules due within a few seconds"""
+    lags = []
+    done = threading.Event()
+
+    def fire(compiled, due_ts):
+        lags.append(time.time() - due_ts)
+        if len(lags) >= args.rules:
+            done.set()
+
+    scheduler = RuleScheduler(fire, name="govee-benchmark")
+    now = datetime.now()
+    rules = [{"time": (now + timedelta(seconds=2 + k % 3)).strftime("%H:%M:%S"),
+              "action": "brightness", "value": 1 + k % 100} for k in range(args.rules)]
+    t0 = time.perf_counter()
+    scheduler.set_rules(rules)
+    build = time.perf_counter() - t0
+    scheduler.start()
+    try:
+        done.wait(10.0)
+    finally:
+        scheduler.stop()
+
+    out = {
+        "scheduler_build_ms": result(build * 1000.0, "ms", "lower"),
+        "scheduler_fired_ratio": result(len(lags) / args.rules, "ratio", "higher"),
+    }
+    if lags:
+        out.update(latency_results("scheduler_fire_lag", lags))
+        out["scheduler_fire_lag_max_ms"] = result(max(lags) * 1000.0, "ms", "lower")
+    return out
+
+
+def bench_packet_log(args):
+    """Bytes held per logged packet and log_packet cost"""
+    n = args.packets
+    monitor = backend.PacketMonitor(max_packets=n)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for k in range(n):
+            payload = {"msg": {"cmd": "colorwc", "data": {"color": {"r": k % 256, "g": 0, "b": 0}, "colorTemInKelvin": 0}}}
+            monitor.log_packet("192.168.1.66", backend.CONTROL_PORT, payload, json.dumps(payload).encode("utf-8"))
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    data = json.dumps({"msg": {"cmd": "turn", "data": {"value": 1}}}).encode("utf-8")
+    t0 = time.perf_counter()
+    for _ in range(n):
+        monitor.log_packet("192.168.1.66", backend.CONTROL_PORT, None, data)
+    per_call = (time.perf_counter() - t0) / n
+
+    return {
+        "packet_log_bytes_per_packet": result(held / n, "bytes", "lower"),
+        "packet_log_ns_per_call": result(per_call * 1e9, "ns", "lower"),
+    }
+
+
+BENCHMARKS = {
+    "send": bench_send,
+    "status": bench_status,
+    "discovery": bench_discovery,
+    "scheduler": bench_scheduler,
+    "packet_log": bench_packet_log,
+}
+
+
+# -------------------------
+# Baseline comparison
+# -------------------------
+def compare(current, baseline, tolerance):
+    """Rows of (name, baseline, current, change, regressed) for metrics present in both runs"""
+    rows = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        b, c = base["value"], cur["value"]
+        change = (c - b) / b if b else (0.0 if c == b else float("inf"))
+        worse = change > tolerance if cur["better"] == "lower" else change < -tolerance
+        rows.append((name, b, c, change, worse))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend hot paths against simulated devices")
+    parser.add_argument("--only", help="comma-separated benchmarks to run (" + ",".join(BENCHMARKS) + ")")
+    parser.add_argument("--devices", type=int, default=10, help="simulated devices for the send benchmark")
+    parser.add_argument("--commands", type=int, default=500, help="commands per device for the throughput run")
+    parser.add_argument("--samples", type=int, default=300, help="sequential samples for latency percentiles")
+    parser.add_argument("--discovery-devices", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3, help="discovery scans (median is reported)")
+    parser.add_argument("--rules", type=int, default=3000)
+    parser.add_argument("--packets", type=int, default=10000, help="packets logged for the memory benchmark")
+    parser.add_argument("--output", help="write results JSON to this file")
+    parser.add_argument("--baseline", help="compare against a stored results JSON")
+    parser.add_argument("--save-baseline", help="write results JSON as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "save_baseline")},
+        },
+        "results": {},
+    }
+    for name in names:
+        print(f"[BENCH] {name}...")
+        report["results"].update(BENCHMARKS[name](args))
+
+    print()
+    for name, res in report["results"].items():
+        print(f"{name:40} {res['value']:>14.3f} {res['unit']}")
+
+    text = json.dumps(report, indent=2)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+            print(f"[BENCH] Wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.tolerance)
+        print(f"\nvs {args.baseline} ({baseline.get('meta', {}).get('timestamp', '?')}), tolerance {args.tolerance:.0%}")
+        for name, b, c, change, worse in rows:
+            print(f"{name:40} {b:>12.3f} -> {c:>12.3f} {change:+8.1%}{'  REGRESSION' if worse else ''}")
+        if any(row[4] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+HTTP load generator for the backend API.
+
+Replays a mix of realistic client traffic and reports throughput, tail
+latency and error rate per route:
+
+- music:  color frames at ~30 fps with a brightness change every 8th frame
+- slider: bursts of 20 brightness values 10 ms apart, then a pause
+- status: devStatus polling twice a second
+- rules:  add a rule, list rules, delete it again, once a second
+
+By default the app is served in-process on a free port (Werkzeug, or
+waitress with --server production) with govee_simulator.py devices behind
+it and a throwaway data directory, so rule edits never touch your
+rules.json. --url targets a running backend instead (the rules scenario
+cleans up after itself, but it does edit that server's rules).
+
+--levels runs the mix several times with the client counts multiplied, to
+find where throughput stops growing and latency takes off:
+
+    python run_load_test.py --mix music=2,slider=2,status=4,rules=1 --levels 1,2,4,8
+    python run_load_test.py --no-pacing --levels 1,4,16 --output load.json
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+SCENARIOS = ("music", "slider", "status", "rules")
+DEFAULT_MIX = "music=2,slider=2,status=4,rules=1"
+# /api/rules deletes by index, so concurrent editors would delete each other's rules
+RULES_EDIT_LOCK = threading.Lock()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a non-empty list"""
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+class Recorder:
+    """Per-route latency samples and error counts shared by all client threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, route, seconds, ok):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            ms = [s * 1000.0 for s in samples]
+            routes[route] = {
+                "requests": len(samples),
+                "rps": round(len(samples) / elapsed, 1),
+                "p50_ms": round(percentile(ms, 50), 2),
+                "p95_ms": round(percentile(ms, 95), 2),
+                "p99_ms": round(percentile(ms, 99), 2),
+                "max_ms": round(max(ms), 2),
+                "error_rate": round(self.errors[route] / len(samples), 4),
+            }
+        total = sum(r["requests"] for r in routes.values())
+        all_ms = [s * 1000.0 for samples in self.latencies.values() for s in samples]
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "rps": round(total / elapsed, 1),
+            "p99_ms": round(percentile(all_ms, 99), 2) if all_ms else None,
+            "error_rate": round(sum(self.errors.values()) / total, 4) if total else 0.0,
+            "routes": routes,
+        }
+
+
+class Client:
+    """One keep-alive HTTP connection; records every request it makes"""
+
+    def __init__(self, host, port, recorder, timeout=10.0):
+        self.conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        self.recorder = recorder
+
+    def call(self, method, path, body=None, route=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=data, headers=headers)
+            resp = self.conn.getresponse()
+            payload = resp.read()
+            ok = resp.status < 400
+        except (OSError, http.client.HTTPException):
+            self.conn.close()  # reconnects on the next request
+            payload, ok = b"", False
+        self.recorder.add(route or f"{method} {path}", time.perf_counter() - start, ok)
+        return payload if ok else None
+
+    def close(self):
+        self.conn.close()
+
+
+# -------------------------
+# Scenarios
+# -------------------------
+def pause(stop, seconds, pacing):
+    if pacing:
+        stop.wait(seconds)
+
+
+def run_music(client, ip, rng, stop, pacing):
+    frame = 0
+    while not stop.is_set():
+        client.call("POST", "/api/device/color", {"ip": ip, "r": rng.randrange(256), "g": rng.randrange(256), "b": rng.randrange(256)})
+        if frame % 8 == 0:
+            client.call("POST", "/api/device/brightness", {"ip": ip, "value": rng.randint(20, 100)})
+        frame += 1
+        pause(stop, 1 / 30.0, pacing)
+
+
+def run_slider(client, ip, rng, stop, pacing):
+    while not stop.is_set():
+        start = rng.randint(1, 80)
+        for value in range(start, start + 20):
+            if stop.is_set():
+                return
+            client.call("POST", "/api/device/brightness", {"ip": ip, "value": value})
+            pause(stop, 0.01, pacing)
+        pause(stop, rng.uniform(0.3, 1.0), pacing)
+
+
+def run_status(client, ip, rng, stop, pacing):
+    while not stop.is_set():
+        client.call("POST", "/api/device/status", {"ip": ip})
+        pause(stop, 0.5, pacing)
+
+
+def run_rules(client, ip, rng, stop, pacing):
+    while not stop.is_set():
+        rule = {"time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}",
+                "action": "brightness", "value": rng.randint(1, 100), "target": ip}
+        with RULES_EDIT_LOCK:
+            if client.call("POST", "/api/rules", rule) is not None:
+                listing = client.call("GET", "/api/rules")
+                if listing is not None:
+                    current = json.loads(listing).get("rules", [])
+                    added = next((i for i, r in enumerate(current)
+                                  if r.get("time") == rule["time"] and r.get("value") == rule["value"]), None)
+                    if added is not None:
+                        client.call("DELETE", f"/api/rules/{added}", route="DELETE /api/rules/<idx>")
+        pause(stop, 1.0, pacing)
+
+
+RUNNERS = {"music": run_music, "slider": run_slider, "status": run_status, "rules": run_rules}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, count = part.partition("=")
+        name = name.strip()
+        if name not in RUNNERS:
+            raise ValueError(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        mix[name] = int(count or 1)
+    return mix
+
+
+def run_level(host, port, ips, mix, multiplier, duration, pacing, seed):
+    """Run every scenario client for `duration` seconds and summarize"""
+    recorder = Recorder()
+    stop = threading.Event()
+    threads, clients = [], []
+    n = 0
+    for name, count in mix.items():
+        for _ in range(count * multiplier):
+            client = Client(host, port, recorder)
+            clients.append(client)
+            rng = random.Random(seed + n)
+            t = threading.Thread(target=RUNNERS[name], args=(client, ips[n % len(ips)], rng, stop, pacing),
+                                 name=f"load-{name}-{n}", daemon=True)
+            threads.append(t)
+            n += 1
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    stop.wait(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=15.0)
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    summary = recorder.summary(elapsed)
+    summary["clients"] = n
+    return summary
+
+
+# -------------------------
+# In-process target
+# -------------------------
+def start_local_backend(device_count, server_mode="dev", threads=8):
+    """Serve app_backend.app on a free port with simulated devices; returns (host, port, ips, stop)"""
+    data_home = tempfile.mkdtemp(prefix="govee-load-")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = data_home  # app_backend derives its data dir from ~
+    import app_backend
+    from govee_simulator import Simulator
+
+    sim = Simulator(device_count, base_ip="127.0.0.10", scan_host="").start()
+    if server_mode == "production":
+        from waitress import create_server
+
+        server = create_server(app_backend.app, host="127.0.0.1", port=0, threads=threads)
+        port, serve, shutdown = server.effective_port, server.run, server.close
+    else:
+        from werkzeug.serving import make_server
+
+        server = make_server("127.0.0.1", 0, app_backend.app, threaded=True)
+        port, serve, shutdown = server.server_port, server.serve_forever, server.shutdown
+    threading.Thread(target=serve, name="load-backend", daemon=True).start()
+
+    def stop():
+        shutdown()
+        sim.stop()
+
+    return "127.0.0.1", port, [dev.ip for dev in sim.devices], stop
+
+
+def print_level(multiplier, summary, out):
+    print(f"\n== x{multiplier}: {summary['clients']} clients, {summary['rps']} req/s, "
+          f"p99 {summary['p99_ms']} ms, errors {summary['error_rate']:.2%}", file=out)
+    print(f"{'route':32} {'reqs':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'err':>7}", file=out)
+    for route, r in summary["routes"].items():
+        print(f"{route:32} {r['requests']:>7} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+              f"{r['p99_ms']:>8} {r['max_ms']:>8} {r['error_rate']:>7.2%}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the backend HTTP API with realistic traffic mixes")
+    parser.add_argument("--url", help="running backend to target, e.g. http://127.0.0.1:5000 (default: in-process)")
+    parser.add_argument("--ips", help="comma-separated device IPs to address (default: the simulated devices)")
+    parser.add_argument("--devices", type=int, default=4, help="simulated devices for in-process runs")
+    parser.add_argument("--server", choices=("dev", "production"), default="dev",
+                        help="in-process server: Werkzeug (dev) or the waitress thread pool (production)")
+    parser.add_argument("--threads", type=int, default=8, help="waitress worker threads for --server production")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="clients per scenario: " + ",".join(SCENARIOS))
+    parser.add_argument("--levels", default="1", help="comma-separated client multipliers, run in order")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--no-pacing", action="store_true", help="closed loop: send the next request as soon as the last returns")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the in-process backend's request logging")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+        levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = sys.stdout
+    stop_backend = None
+    if args.url:
+        target = urlparse(args.url)
+        host, port = target.hostname, target.port or 80
+        ips = args.ips.split(",") if args.ips else [None]
+    else:
+        host, port, ips, stop_backend = start_local_backend(args.devices, args.server, args.threads)
+        if args.ips:
+            ips = args.ips.split(",")
+        if not args.verbose:
+            # the backend logs every request; keep the report readable
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+            logging.getLogger("waitress").setLevel(logging.ERROR)
+            sys.stdout = open(os.devnull, "w")
+
+    levels_out = []
+    try:
+        for multiplier in levels:
+            print(f"[LOAD] x{multiplier} for {args.duration:g}s against {host}:{port}...", file=out)
+            summary = run_level(host, port, ips, mix, multiplier, args.duration, not args.no_pacing, args.seed)
+            summary["multiplier"] = multiplier
+            levels_out.append(summary)
+            print_level(multiplier, summary, out)
+    finally:
+        if stop_backend:
+            stop_backend()
+        if sys.stdout is not out:
+            sys.stdout.close()
+            sys.stdout = out
+
+    # saturation: the first level whose added clients bought less than 10% more throughput
+    knee = next((b["multiplier"] for a, b in zip(levels_out, levels_out[1:]) if b["rps"] < a["rps"] * 1.1), None)
+    if len(levels_out) > 1:
+        print("\nsaturation: " + (f"throughput flattens at x{knee}" if knee else "not reached"))
+
+    if args.output:
+        report = {"mix": mix, "pacing": not args.no_pacing, "duration_s": args.duration,
+                  "saturation_multiplier": knee, "levels": levels_out}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[LOAD] Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
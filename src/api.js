@@ -3,6 +3,96 @@
  */
 
 const API_URL = 'http://localhost:5000/api';
+const WS_URL = 'ws://localhost:5001';
+
+/**
+ * Persistent WebSocket to the backend command channel.
+ * Frames with an id resolve when the backend acks them; frames without one
+ * are fire-and-forget. Reconnects with backoff; send() returns null while
+ * the socket is down so callers can fall back to HTTP.
+ */
+class CommandSocket {
+  constructor(url) {
+    this.url = url;
+    this.ws = null;
+    this.nextId = 1;
+    this.pending = new Map(); // id -> { resolve, reject, timer }
+    this.retryDelay = 500;
+    this.subscription = null;
+    this.onState = null; // callback(ip, state) for server state pushes
+    this.connect();
+  }
+
+  get ready() {
+    return this.ws !== null && this.ws.readyState === WebSocket.OPEN;
+  }
+
+  connect() {
+    if (typeof WebSocket === 'undefined') return;
+    const ws = new WebSocket(this.url);
+    ws.onopen = () => {
+      this.retryDelay = 500;
+      if (this.subscription) ws.send(JSON.stringify(this.subscription));
+    };
+    ws.onmessage = (e) => this.handle(e.data);
+    ws.onerror = () => {}; // onclose follows and schedules the reconnect
+    ws.onclose = () => {
+      this.ws = null;
+      for (const [id, p] of this.pending) {
+        clearTimeout(p.timer);
+        p.reject(new Error('WebSocket closed'));
+        this.pending.delete(id);
+      }
+      setTimeout(() => this.connect(), this.retryDelay);
+      this.retryDelay = Math.min(this.retryDelay * 2, 10000);
+    };
+    this.ws = ws;
+  }
+
+  handle(text) {
+    let frame;
+    try {
+      frame = JSON.parse(text);
+    } catch (err) {
+      return;
+    }
+    if (frame.type === 'state') {
+      if (this.onState) this.onState(frame.ip, frame.state);
+      return;
+    }
+    const p = this.pending.get(frame.id);
+    if (!p) {
+      if (frame.ok === false) console.log('[WS] Command failed:', frame.error);
+      return;
+    }
+    clearTimeout(p.timer);
+    this.pending.delete(frame.id);
+    if (frame.ok) p.resolve({ status: 'ok', via: 'ws', ...frame });
+    else p.reject(new Error(frame.error || 'Command failed'));
+  }
+
+  send(frame, { ack = true, timeout = 1000 } = {}) {
+    if (!this.ready) return null;
+    if (!ack) {
+      this.ws.send(JSON.stringify(frame));
+      return Promise.resolve({ status: 'ok', via: 'ws' });
+    }
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error('WebSocket ack timeout'));
+      }, timeout);
+      this.pending.set(id, { resolve, reject, timer });
+      this.ws.send(JSON.stringify({ ...frame, id }));
+    });
+  }
+
+  subscribe(ips) {
+    this.subscription = { action: 'subscribe', ips };
+    if (this.ready) this.ws.send(JSON.stringify(this.subscription));
+  }
+}
 
 class GoveeAPI {
   constructor() {
@@ -11,6 +101,8 @@ class GoveeAPI {
     this.sku = localStorage.getItem('lanSku') || '';
     this.commandLog = [];
     this.onCommandSent = null; // callback for UI logging
+    this.socket = new CommandSocket(WS_URL);
+    this.socket.subscribe([this.deviceIp]);
   }
 
   logCommand(action, data, status = 'sent') {
@@ -29,8 +121,8 @@ class GoveeAPI {
     }
   }
 
-  async request(endpoint, method = 'GET', data = null) {
-    const maxRetries = 3;
+  async request(endpoint, method = 'GET', data = null, { retries = 3 } = {}) {
+    const maxRetries = retries;
     let lastError;
     
     for (let attempt = 1; attempt <= maxRetries; attempt++) {
@@ -68,6 +160,20 @@ class GoveeAPI {
     throw new Error(`API Error: ${lastError?.message || 'Failed to fetch'}`);
   }
 
+  // High-frequency commands: WebSocket frame when connected, one HTTP attempt otherwise
+  // (retrying a stale slider value only delays the next one). ack: false = fire-and-forget.
+  async sendFast(action, fields, endpoint, { ack = true } = {}) {
+    const sent = this.socket.send({ action, ip: this.deviceIp, ...fields }, { ack });
+    if (sent) {
+      try {
+        return await sent;
+      } catch (error) {
+        console.log(`[WS] ${action} failed, using HTTP:`, error.message);
+      }
+    }
+    return this.request(endpoint, 'POST', fields, { retries: 1 });
+  }
+
   setDeviceIp(ip) {
     // Validate IP format
     if (!this.isValidIp(ip)) {
@@ -75,6 +181,7 @@ class GoveeAPI {
     }
     this.deviceIp = ip;
     localStorage.setItem('deviceIp', ip);
+    this.socket.subscribe([ip]);
   }
 
   setDeviceIdentity(deviceId = '', sku = '') {
@@ -110,14 +217,14 @@ class GoveeAPI {
     return this.request('/device/off', 'POST', {});
   }
 
-  async setDeviceBrightness(value) {
+  async setDeviceBrightness(value, options = {}) {
     this.logCommand('brightness', { value });
-    return this.request('/device/brightness', 'POST', { value });
+    return this.sendFast('brightness', { value }, '/device/brightness', options);
   }
 
-  async setDeviceColor(r, g, b) {
+  async setDeviceColor(r, g, b, options = {}) {
     this.logCommand('colorwc', { r, g, b });
-    return this.request('/device/color', 'POST', { r, g, b });
+    return this.sendFast('color', { r, g, b }, '/device/color', options);
   }
 
   async sendScene(sceneId, options = {}) {
@@ -136,11 +243,11 @@ class GoveeAPI {
 
   async setColorTemperature(value, extra = {}) {
     this.logCommand('colorwc', { colorTemInKelvin: value });
-    return this.request('/device/color-temperature', 'POST', {
+    return this.sendFast('color-temperature', {
       value,
       ...this.getDeviceIdentity(),
       ...extra,
-    });
+    }, '/device/color-temperature');
   }
 
   async setScene(sceneId, extra = {}) {
@@ -158,6 +265,11 @@ class GoveeAPI {
     return this.request('/device/status', 'POST', {});
   }
 
+  // Last known state (no LAN round-trip)
+  async getDeviceState() {
+    return this.request('/device/state', 'POST', {});
+  }
+
   async sendLanCommand(cmd, data = {}, options = {}) {
     const payload = {
       cmd,
@@ -193,6 +305,48 @@ class GoveeAPI {
     return this.request('/device/raw', 'POST', body);
   }
 
+  // Backend effect engine (scene playback with server-side frame clock)
+  async startEffect(scene, options = {}) {
+    this.logCommand('effect', { name: scene?.name, steps: scene?.steps?.length });
+    return this.request('/effect/start', 'POST', {
+      scene,
+      ...this.getDeviceIdentity(),
+      ...options,
+    });
+  }
+
+  async stopEffect(options = {}) {
+    return this.request('/effect/stop', 'POST', options);
+  }
+
+  async getEffectStatus() {
+    return this.request('/effect/status', 'GET');
+  }
+
+  // Many LAN operations in one request: [{ ip, cmd, data, expect_reply }]
+  async sendBatch(ops, timeout = 1.0) {
+    this.logCommand('batch', { count: ops.length });
+    return this.request('/device/batch', 'POST', { ops, timeout });
+  }
+
+  // Device groups (one request fans out to every member)
+  async getGroups() {
+    return this.request('/groups', 'GET');
+  }
+
+  async saveGroup(name, members) {
+    return this.request(`/groups/${encodeURIComponent(name)}`, 'PUT', { members });
+  }
+
+  async deleteGroup(name) {
+    return this.request(`/groups/${encodeURIComponent(name)}`, 'DELETE');
+  }
+
+  async sendGroupCommand(name, action, data = {}) {
+    this.logCommand(`group:${name}:${action}`, data);
+    return this.request(`/group/${encodeURIComponent(name)}/${action}`, 'POST', data);
+  }
+
   // Rules/Automation
   async getRules() {
     return this.request('/rules', 'GET');
@@ -232,18 +386,32 @@ class GoveeAPI {
     return this.request('/automation/status', 'GET');
   }
 
-  // Packet monitoring
-  async getPackets() {
-    return this.request('/packets', 'GET');
+  // Packet monitoring (since = last seen seq, so only new packets are sent)
+  async getPackets(since = 0, limit = null) {
+    const query = `?since=${since}` + (limit != null ? `&limit=${limit}` : '');
+    return this.request(`/packets${query}`, 'GET');
+  }
+
+  streamPackets(since, onPacket) {
+    if (typeof EventSource === 'undefined') return null;
+    const source = new EventSource(`${API_URL}/packets/stream?since=${since}`);
+    source.addEventListener('packet', (e) => {
+      try {
+        onPacket(JSON.parse(e.data));
+      } catch (err) {
+        console.log('[API] Bad packet event:', err.message);
+      }
+    });
+    return source;
   }
 
   async clearPackets() {
     return this.request('/packets', 'DELETE');
   }
 
-  // Device discovery
-  async discoverDevices() {
-    return this.request('/discover', 'GET');
+  // Device discovery (served from the backend registry; refresh forces a new probe)
+  async discoverDevices(refresh = false) {
+    return this.request(refresh ? '/discover?refresh=1' : '/discover', 'GET');
   }
 }
 
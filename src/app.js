@@ -16,11 +16,13 @@ class GoveeApp {
     // runtime state
     this.currentPacket = null;
     this.scenePlaying = false;
+    this.sceneWatch = null;
     this.updateState = "idle";
 
     this.initElements();
     this.setupUpdaterUi();
     this.attachEventListeners();
+    api.socket.onState = (ip, state) => this.applyDeviceState(ip, state);
     if (this.ipInput) this.ipInput.value = api.deviceIp;
     if (this.colorTempSlider) this.colorTempSlider.value = this.lastColorTemp;
     if (this.colorTempInput) this.colorTempInput.value = this.lastColorTemp;
@@ -174,7 +176,7 @@ async testSingleStep(step) {
 
 stopAllModes() {
   // stop scene + music
-  this.scenePlaying = false;
+  this.stopScene();
   this.music?.stop?.();
 
   if (this.musicModeBtn) {
@@ -216,15 +218,8 @@ async previewEditorScene() {
     const scene = this.buildSceneFromEditor();
     this.setSceneMsg("Playing...", "ok");
 
-    // play using your existing playScene logic but from built object
+    // the backend engine handles scene.loop until Stop is clicked
     await this.playScene(scene);
-
-    if (scene.loop) {
-      // simple loop: keep playing until Stop clicked
-      while (this.scenePlaying) {
-        await this.playScene(scene);
-      }
-    }
   } catch (e) {
     this.setSceneMsg(String(e.message || e), "error");
   }
@@ -502,6 +497,12 @@ rgbArrToHex(arr) {
 
     // Packet Inspector
     if (this.refreshPacketsBtn) this.refreshPacketsBtn.addEventListener("click", () => this.loadPackets());
+    // Hold the packet stream (and its backend worker) only while the window is showing it
+    document.addEventListener("visibilitychange", () => {
+      if (document.hidden) this.stopPacketStream();
+      else if (this.packetCursor != null) this.startPacketStream();
+    });
+    window.addEventListener("pagehide", () => this.stopPacketStream());
     if (this.clearPacketsBtn) this.clearPacketsBtn.addEventListener("click", () => this.clearPacketsUI());
     if (this.backPacketBtn) this.backPacketBtn.addEventListener("click", () => this.showPacketList());
 
@@ -568,7 +569,7 @@ rgbArrToHex(arr) {
       this.musicModeBtn.disabled = false;
 
       this.musicModeBtn.addEventListener("click", () => {
-        this.scenePlaying = false; // stop any running scene
+        this.stopScene(); // stop any running scene
         this.music.start();
         this.musicModeBtn.classList.add("btn-music-active");
         this.musicModeBtn.disabled = true;
@@ -580,7 +581,7 @@ rgbArrToHex(arr) {
       this.stopMusicBtn.disabled = true;
 
       this.stopMusicBtn.addEventListener("click", () => {
-        this.scenePlaying = false; // stop scene too
+        this.stopScene(); // stop scene too
         this.music.stop();
 
         if (this.musicModeBtn) {
@@ -745,9 +746,9 @@ rgbArrToHex(arr) {
     }
   }
 
-  async setBrightness(value) {
+  async setBrightness(value, options = {}) {
     try {
-      await api.setDeviceBrightness(value);
+      await api.setDeviceBrightness(value, options);
       this.lastBrightness = value;
       this.log(`Brightness → ${value}%`);
     } catch (error) {
@@ -755,9 +756,9 @@ rgbArrToHex(arr) {
     }
   }
 
-  async setColor(r, g, b) {
+  async setColor(r, g, b, options = {}) {
     try {
-      await api.setDeviceColor(r, g, b);
+      await api.setDeviceColor(r, g, b, options);
       this.lastColor = { r, g, b };
       if (this.colorPicker) this.colorPicker.value = this.rgbToHex(r, g, b);
       this.updateColorInputs(r, g, b);
@@ -946,20 +947,45 @@ async loadDynamicPresets() {
     }
     if (this.stopMusicBtn) this.stopMusicBtn.disabled = true;
 
-    this.scenePlaying = true;
-
-    for (const step of scene.steps) {
-      if (!this.scenePlaying) break;
+    // Frames are interpolated and sent by the backend effect engine
+    try {
+      const res = await api.startEffect(scene);
+      this.scenePlaying = true;
+      this.watchScene(res?.effect);
+    } catch (error) {
+      this.scenePlaying = false;
+      this.log(`Scene error: ${error.message}`, "error");
+    }
+  }
 
-      const [r, g, b] = step.color || [255, 0, 0];
-      const brightness = step.brightness != null ? step.brightness : this.lastBrightness;
-      const transitionMs = step.transitionMs != null ? step.transitionMs : Math.min(step.ms || 300, 600);
+  // A one-shot effect ends on its own; poll the engine from its expected end until it reports it finished
+  watchScene(effect) {
+    clearTimeout(this.sceneWatch);
+    if (!effect || effect.loop) return;
 
-      await this.fadeToTarget({ r, g, b, brightness }, transitionMs);
-      await new Promise((res) => setTimeout(res, step.ms || 300));
-    }
+    const check = async () => {
+      if (!this.scenePlaying) return;
+      try {
+        const { effects = [] } = await api.getEffectStatus();
+        const current = effects.find((e) => e.target === effect.target);
+        if (!current || !current.running) {
+          this.scenePlaying = false;
+          this.log("Scene finished", "info");
+          return;
+        }
+      } catch {
+        // backend busy; ask again below
+      }
+      this.sceneWatch = setTimeout(check, 1000);
+    };
+    this.sceneWatch = setTimeout(check, Math.max(0, effect.duration_ms - effect.elapsed_ms) + 100);
+  }
 
+  stopScene() {
+    clearTimeout(this.sceneWatch);
+    if (!this.scenePlaying) return;
     this.scenePlaying = false;
+    api.stopEffect().catch((error) => this.log(`Scene stop error: ${error.message}`, "error"));
   }
 
   // -------------------------
@@ -1108,10 +1134,17 @@ async loadDynamicPresets() {
   }
 
   formatRuleText(rule) {
-    let text = `${rule.time} →`;
+    let when = rule.time;
+    if (rule.cron) when = `cron ${rule.cron}`;
+    else if (rule.sun) when = `${rule.sun}${rule.offset ? ` ${rule.offset > 0 ? "+" : ""}${rule.offset}min` : ""}`;
+    if (rule.days) when += ` (${Array.isArray(rule.days) ? rule.days.join(",") : rule.days})`;
+    let text = `${when} →`;
     if (rule.action === "brightness") text += ` Brightness ${rule.value}%`;
     else if (rule.action === "rgb") text += ` RGB ${rule.r},${rule.g},${rule.b}`;
+    else if (rule.action === "scene") text += ` Scene ${rule.sceneId}`;
     else text += ` ${String(rule.action || "").toUpperCase()}`;
+    const target = rule.group || rule.target?.group || rule.target?.ip || rule.target?.device;
+    if (target) text += ` @ ${target}`;
     return text;
   }
 
@@ -1153,6 +1186,26 @@ async loadDynamicPresets() {
     return `#${[r, g, b].map((x) => x.toString(16).padStart(2, "0")).join("")}`;
   }
 
+  // Server state push: keep the controls in step with the light
+  applyDeviceState(ip, state) {
+    if (ip !== api.deviceIp || !state) return;
+    if (Number.isFinite(state.brightness)) {
+      this.lastBrightness = state.brightness;
+      if (this.brightnessSlider) this.brightnessSlider.value = state.brightness;
+      if (this.brightnessValue) this.brightnessValue.textContent = `${state.brightness}%`;
+    }
+    if (state.color) {
+      const { r, g, b } = state.color;
+      this.lastColor = { r, g, b };
+      this.updateColorInputs(r, g, b);
+    }
+    if (state.color_temp) {
+      this.lastColorTemp = this.clampKelvin(state.color_temp);
+      if (this.colorTempSlider) this.colorTempSlider.value = this.lastColorTemp;
+      if (this.colorTempInput) this.colorTempInput.value = this.lastColorTemp;
+    }
+  }
+
   updateColorInputs(r, g, b) {
     if (this.rInput) this.rInput.value = r;
     if (this.gInput) this.gInput.value = g;
@@ -1197,14 +1250,42 @@ async loadDynamicPresets() {
   // -------------------------
   async loadPackets() {
     try {
-      const result = await api.getPackets();
-      this.displayPackets(result.packets || []);
+      // only fetch packets newer than the last one we have
+      const result = await api.getPackets(this.packetCursor || 0);
+      this.addPackets(result.packets || []);
+      if (result.cursor != null) this.packetCursor = result.cursor;
+      this.startPacketStream();
       this.log("Packets refreshed");
     } catch (error) {
       this.log(`Packet load error: ${error.message}`, "error");
     }
   }
 
+  addPackets(newestFirst) {
+    this.packets = [...newestFirst, ...(this.packets || [])].slice(0, 100);
+    if (this._packetRender) return;
+    this._packetRender = requestAnimationFrame(() => {
+      this._packetRender = null;
+      // don't rebuild the list while a packet detail is open
+      if (!this.packetDetail || this.packetDetail.style.display !== "block") this.displayPackets(this.packets);
+    });
+  }
+
+  startPacketStream() {
+    if (this.packetStream) return;
+    this.packetStream = api.streamPackets(this.packetCursor || 0, (pkt) => {
+      if (pkt.seq <= (this.packetCursor || 0)) return;
+      this.packetCursor = pkt.seq;
+      this.addPackets([pkt]);
+    });
+  }
+
+  stopPacketStream() {
+    if (!this.packetStream) return;
+    this.packetStream.close();
+    this.packetStream = null;
+  }
+
   displayPackets(packets) {
     if (!this.packetList) return;
     this.packetList.innerHTML = "";
@@ -1387,6 +1468,7 @@ async loadDynamicPresets() {
   async clearPacketsUI() {
     try {
       await api.clearPackets();
+      this.packets = [];
       if (this.packetList) {
         this.packetList.innerHTML =
           '<div style="color: var(--muted); font-size: 12px; padding: 12px;">Packet log cleared</div>';
@@ -79,8 +79,9 @@ export class MusicReactive {
     const g = Math.round(120 + 135 * Math.sin(t + 2) * (0.6 + boost));
     const b = Math.round(120 + 135 * Math.sin(t + 4) * (0.6 + boost));
 
-    await this.app.setColor(clamp(r), clamp(g), clamp(b));
-    await this.app.setBrightness(Math.round(brightness));
+    // fire-and-forget over the WebSocket: a late ack must not stall the next frame
+    await this.app.setColor(clamp(r), clamp(g), clamp(b), { ack: false });
+    await this.app.setBrightness(Math.round(brightness), { ack: false });
 
     this._timer = setTimeout(() => this.loop(), 140);
   }
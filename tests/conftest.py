@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# app_backend keeps its data under ~ and is imported by several test modules;
+# point it at a throwaway home before the first import
+_home = tempfile.mkdtemp(prefix="govee-tests-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = _home
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
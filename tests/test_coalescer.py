@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+import app_backend
+from app_backend import StreamCoalescer
+
+
+def brightness(value):
+    return {"cmd": "brightness", "data": {"value": value}}
+
+
+def color(r, g, b):
+    return {"cmd": "colorwc", "data": {"color": {"r": r, "g": g, "b": b}, "colorTemInKelvin": 0}}
+
+
+def stream(coalescer, sent, ip, msg):
+    coalescer.submit(ip, msg, lambda: sent.append(msg))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_repeats_are_suppressed_within_the_delta():
+    async def main():
+        coalescer = StreamCoalescer(window_ms=0, color_delta=2)
+        sent = []
+        for msg in (color(10, 10, 10), color(11, 12, 10), color(20, 10, 10), brightness(5), brightness(5)):
+            stream(coalescer, sent, "ip", msg)
+        return sent, (await coalescer.snapshot())["devices"]["ip"]
+
+    sent, stats = run(main())
+    assert sent == [color(10, 10, 10), color(20, 10, 10), brightness(5)]
+    assert stats["suppressed"] == 2
+
+
+def test_a_burst_inside_the_window_sends_only_the_newest():
+    async def main():
+        coalescer = StreamCoalescer(window_ms=30)
+        sent = []
+        for value in range(1, 11):
+            stream(coalescer, sent, "ip", brightness(value))
+        await asyncio.sleep(0.06)
+        return sent
+
+    assert run(main()) == [brightness(1), brightness(10)]
+
+
+def test_repeat_ttl_and_forget_let_the_same_value_through():
+    async def main():
+        coalescer = StreamCoalescer(window_ms=0, repeat_ttl=0.03)
+        sent = []
+        stream(coalescer, sent, "ip", brightness(40))
+        stream(coalescer, sent, "ip", brightness(40))
+        await asyncio.sleep(0.05)
+        stream(coalescer, sent, "ip", brightness(40))  # past the TTL
+        coalescer.forget("ip")
+        stream(coalescer, sent, "ip", brightness(40))  # a status reply said otherwise
+        return sent
+
+    assert run(main()) == [brightness(40)] * 3
+
+
+def test_turn_sends_the_pending_frame_first():
+    async def main():
+        coalescer = StreamCoalescer(window_ms=1000)
+        sent = []
+        stream(coalescer, sent, "ip", brightness(10))
+        stream(coalescer, sent, "ip", brightness(55))  # pending: the last slider position
+        stream(coalescer, sent, "ip", {"cmd": "turn", "data": {"value": 0}})
+        await asyncio.sleep(0)
+        return sent
+
+    assert [m["cmd"] for m in run(main())] == ["brightness", "brightness", "turn"]
+
+
+def test_mode_change_drops_pending_frames_and_tracked_values():
+    async def main():
+        coalescer = StreamCoalescer(window_ms=1000)
+        sent = []
+        stream(coalescer, sent, "ip", color(1, 2, 3))
+        stream(coalescer, sent, "ip", color(9, 9, 9))  # pending
+        stream(coalescer, sent, "ip", {"cmd": "scene", "data": {"id": 3}})
+        stream(coalescer, sent, "ip", color(1, 2, 3))  # no longer a repeat after the scene
+        await asyncio.sleep(0)
+        return sent
+
+    assert run(main()) == [color(1, 2, 3), {"cmd": "scene", "data": {"id": 3}}, color(1, 2, 3)]
+
+
+def test_devices_are_coalesced_independently():
+    async def main():
+        coalescer = StreamCoalescer(window_ms=1000)
+        sent = []
+        stream(coalescer, sent, "a", brightness(10))
+        stream(coalescer, sent, "b", brightness(10))
+        stream(coalescer, sent, "a", {"cmd": "scene", "data": {"id": 1}})
+        stream(coalescer, sent, "b", brightness(20))  # b's window is untouched by a's scene
+        return sent
+
+    assert len(run(main())) == 3
+
+
+# ---------- through the simulator ----------
+@pytest.fixture
+def device():
+    from govee_simulator import Simulator
+
+    sim = Simulator(1, base_ip="127.0.0.43", scan_host="").start()
+    yield app_backend.GoveeLAN(sim.devices[0].ip), sim.devices[0]
+    sim.stop()
+
+
+def test_slider_then_power_toggle_keeps_the_last_position(device):
+    lan, light = device
+    for value in range(10, 61, 5):
+        lan.brightness(value)
+    lan.off()
+    end = time.time() + 2.0
+    while time.time() < end and not (light.power == 0 and light.brightness == 60):
+        time.sleep(0.02)
+    assert (light.power, light.brightness) == (0, 60)
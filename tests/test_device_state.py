@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+import app_backend
+from app_backend import DeviceStateStore
+from govee_simulator import Simulator
+
+IP = "127.0.0.49"
+
+
+def on_loop(coro):
+    return app_backend.get_transport().run(coro, timeout=5.0)
+
+
+def status_reply(**data):
+    return {"msg": {"cmd": "devStatus", "data": data}}
+
+
+def brightness(value):
+    return {"cmd": "brightness", "data": {"value": value}}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = DeviceStateStore(interval=60.0)
+    monkeypatch.setattr(app_backend, "device_state", store)
+    return store
+
+
+def test_apply_records_commands(store):
+    assert store.apply(IP, {"cmd": "turn", "data": {"value": 1}}) is not None
+    store.apply(IP, brightness(40))
+    store.apply(IP, {"cmd": "colorwc", "data": {"color": {"r": 255, "g": 0, "b": 10}, "colorTemInKelvin": 0}})
+    state = on_loop(store.snapshot(IP))
+    assert state["power"] is True and state["brightness"] == 40
+    assert state["color"] == {"r": 255, "g": 0, "b": 10} and state["mode"] == "color"
+    assert store.apply(IP, {"cmd": "brightness", "data": {}}) is None  # malformed, nothing changed
+    assert store.apply(IP, {"cmd": "devStatus", "data": {}}) is None
+
+
+def test_reconcile_corrects_only_fields_no_newer_command_touched(store):
+    store.apply(IP, brightness(40))
+    store.apply(IP, {"cmd": "turn", "data": {"value": 1}})
+    sent_at = time.monotonic()
+    store.apply(IP, brightness(80))  # sent after the devStatus request went out
+    assert store.reconcile(IP, status_reply(onOff=0, brightness=40), sent_at) is True
+    state = on_loop(store.snapshot(IP))
+    assert state["power"] is False and state["brightness"] == 80
+    assert state["corrections"] == 1 and state["verified_age"] is not None
+
+
+def test_matching_reply_is_not_a_correction(store):
+    store.apply(IP, brightness(40))
+    assert store.reconcile(IP, status_reply(brightness=40), time.monotonic()) is False
+    assert store.reconcile(IP, {"raw": "garbage"}, time.monotonic()) is False
+    assert on_loop(store.snapshot(IP))["corrections"] == 0
+
+
+def test_unconfirmed_fields_are_settled_by_a_reply(store):
+    applied_at = store.apply(IP, brightness(40))
+    store.apply(IP, {"cmd": "turn", "data": {"value": 1}})
+    store.mark_unconfirmed(IP, applied_at)
+    assert on_loop(store.snapshot(IP))["unconfirmed"] == ["brightness"]
+    store.reconcile(IP, status_reply(brightness=40), time.monotonic())
+    assert on_loop(store.snapshot(IP))["unconfirmed"] == []
+
+
+def test_listeners_hear_every_change(store):
+    heard = []
+    store.add_listener(heard.append)
+    applied_at = store.apply(IP, brightness(40))
+    store.mark_unconfirmed(IP, applied_at)
+    store.reconcile(IP, status_reply(brightness=40), time.monotonic())
+    store.remove_listener(heard.append)
+    store.apply(IP, brightness(50))
+    assert heard == [IP, IP, IP]
+
+
+def test_simulated_light_reconciles_external_changes(store):
+    sim = Simulator(1, base_ip=IP, scan_host="").start()
+    try:
+        light, dev = app_backend.GoveeLAN(sim.devices[0].ip), sim.devices[0]
+        assert on_loop(light.send_async({"msg": brightness(40)})) == "sent"
+        reply = on_loop(light.send_async({"msg": {"cmd": "devStatus", "data": {}}}, expect_reply=True))
+        assert reply["msg"]["data"]["brightness"] == 40
+        state = on_loop(store.snapshot(light.ip))
+        assert state["brightness"] == 40 and state["corrections"] == 0
+
+        dev.brightness = 70  # changed behind our back (app, wall switch)
+        on_loop(light.send_async({"msg": {"cmd": "devStatus", "data": {}}}, expect_reply=True))
+        state = on_loop(store.snapshot(light.ip))
+        assert state["brightness"] == 70 and state["corrections"] == 1
+    finally:
+        sim.stop()
+
+
+def test_unanswered_request_leaves_fields_unconfirmed(store):
+    light = app_backend.GoveeLAN("127.0.0.50")
+    light.retry_count = 0
+    assert on_loop(light.send_async({"msg": brightness(30)}, expect_reply=True, timeout=0.1)) is None
+    state = on_loop(store.snapshot(light.ip))
+    assert state["brightness"] == 30 and state["unconfirmed"] == ["brightness"]
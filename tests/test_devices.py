@@ -0,0 +1,26 @@
+import pytest
+
+import app_backend
+
+
+@pytest.fixture
+def client():
+    return app_backend.app.test_client()
+
+
+def test_unknown_device_id_is_refused_not_sent_to_the_default(client):
+    before = set(app_backend.devices._by_ip)
+    resp = client.post("/api/device/on", json={"device": "AA:BB:CC:DD:EE:FF:00:99"})
+    assert resp.status_code == 400
+    assert "not discovered" in resp.get_json()["message"]
+    assert set(app_backend.devices._by_ip) == before
+
+
+def test_unknown_device_id_raises_lookup_error():
+    with pytest.raises(LookupError):
+        app_backend.devices.get(device="AA:BB:CC:DD:EE:FF:00:98")
+
+
+def test_ip_still_wins_over_device_id():
+    dev = app_backend.devices.get("127.0.0.44", device="AA:BB:CC:DD:EE:FF:00:97")
+    assert dev.ip == "127.0.0.44"
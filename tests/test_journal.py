@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from govee_scheduler import FireJournal
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+# ---------- journal ----------
+def test_append_is_queued_and_flushed_in_order(tmp_path):
+    journal = FireJournal(str(tmp_path / "fires.journal"))
+    for k in range(200):
+        journal.append({"rule": f"r{k % 3}", "due": k})
+    assert journal.flush(timeout=5.0)
+    assert [r["due"] for r in read(journal.path)] == list(range(200))
+    assert [r["due"] for r in journal.tail()][-3:] == [197, 198, 199]
+    journal.close()
+
+
+def test_append_does_not_wait_for_the_disk(tmp_path, monkeypatch):
+    journal = FireJournal(str(tmp_path / "fires.journal"))
+    gate = threading.Event()
+    write = journal._write
+
+    def slow_write(lines):
+        gate.wait(5.0)
+        write(lines)
+
+    monkeypatch.setattr(journal, "_write", slow_write)
+    start = time.perf_counter()
+    for k in range(50):
+        journal.append({"rule": "r", "due": k})
+    assert time.perf_counter() - start < 0.5
+    assert not journal.flush(timeout=0.05)
+    gate.set()
+    assert journal.flush(timeout=5.0)
+    assert len(read(journal.path)) == 50
+    journal.close()
+
+
+def test_close_flushes_and_later_appends_write_through(tmp_path):
+    journal = FireJournal(str(tmp_path / "fires.journal"))
+    journal.append({"rule": "a", "due": 1})
+    journal.close()
+    assert [r["rule"] for r in read(journal.path)] == ["a"]
+    journal.append({"rule": "b", "due": 2})
+    assert [r["rule"] for r in read(journal.path)] == ["a", "b"]
+
+
+def test_compaction_keeps_newest_record_of_retained_rules(tmp_path):
+    journal = FireJournal(str(tmp_path / "fires.journal"), max_bytes=2000)
+    journal.retain(["keep", "also"])
+    for k in range(100):
+        journal.append({"rule": ("keep", "also", "gone")[k % 3], "due": k})
+    journal.close()
+    records = read(journal.path)
+    assert os.path.getsize(journal.path) <= 2000  # batches land whole, so compaction is the only bound
+    last = {r["rule"]: r["due"] for r in records}
+    assert last["keep"] == 99 and last["also"] == 97
+    gone = [r["due"] for r in records if r["rule"] == "gone"]
+    assert len(gone) < 33 and gone == sorted(gone)  # only written since the last compaction
+
+
+def test_tail_skips_torn_and_partial_lines(tmp_path):
+    path = tmp_path / "fires.journal"
+    lines = [json.dumps({"rule": "r", "due": k}) for k in range(50)]
+    path.write_text("\n".join(lines) + "\n{\"rule\": \"torn", encoding="utf-8")
+    journal = FireJournal(str(path), tail_bytes=200)
+    dues = [r["due"] for r in journal.tail()]
+    assert dues and dues[-1] == 49 and dues == sorted(dues)
+
+
+def test_state_file_wins_over_inline_events(tmp_path):
+    path = tmp_path / "fires.journal"
+    path.write_text(json.dumps({"event": "start", "t": 1.0}) + "\n", encoding="utf-8")
+    journal = FireJournal(str(path))
+    assert journal.state() == {"event": "start", "t": 1.0}  # journals from before the state file
+    journal.set_state("stop")
+    assert journal.state()["event"] == "stop"
+
+
+# ---------- replay ----------
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    import app_backend
+    from govee_simulator import Simulator
+
+    received = []
+    sim = Simulator(1, base_ip="127.0.0.41", scan_host="",
+                    on_command=lambda dev, cmd, data: received.append((cmd, data))).start()
+    monkeypatch.setattr(app_backend, "fire_journal", FireJournal(str(tmp_path / "automation.journal")))
+    saved = app_backend.rules
+    yield app_backend, sim.devices[0].ip, received
+    app_backend.automation_scheduler.stop()
+    app_backend.rules = saved
+    app_backend.reschedule_rules()
+    app_backend.fire_journal.close()
+    sim.stop()
+
+
+def rule_at(seconds_ago, value, ip):
+    due = datetime.now() - timedelta(seconds=seconds_ago)
+    return {"time": due.strftime("%H:%M:%S"), "action": "brightness", "value": value, "target": ip}
+
+
+def wait_for(predicate, timeout=3.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_resume_replays_only_the_latest_missed_fire_per_target(backend):
+    ab, ip, received = backend
+    ab.rules = [rule_at(240, 10, ip), rule_at(120, 20, ip)]
+    ab.reschedule_rules()
+    with open(ab.fire_journal.state_path, "w", encoding="utf-8") as f:
+        json.dump({"event": "start", "t": time.time() - 3600}, f)
+
+    replayed = ab.resume_automation(grace=600)
+    assert len(replayed) == 1
+    assert wait_for(lambda: received)
+    assert received == [("brightness", {"value": 20})]
+
+    # the replayed fire is journaled, so a second restart has nothing to do
+    ab.automation_scheduler.stop()
+    assert ab.resume_automation(grace=600) == []
+
+
+def test_resume_ignores_fires_before_automation_was_started(backend):
+    ab, ip, received = backend
+    ab.rules = [rule_at(120, 30, ip)]
+    ab.reschedule_rules()
+    with open(ab.fire_journal.state_path, "w", encoding="utf-8") as f:
+        json.dump({"event": "start", "t": time.time() - 60}, f)
+    assert ab.resume_automation(grace=600) == []
+
+
+def test_resume_does_nothing_after_stop(backend):
+    ab, ip, _received = backend
+    ab.rules = [rule_at(120, 30, ip)]
+    ab.reschedule_rules()
+    ab.fire_journal.set_state("stop")
+    assert ab.resume_automation(grace=600) == []
+    assert not ab.automation_scheduler.running
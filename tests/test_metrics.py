@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from govee_metrics import Counter, Histogram, Registry, _Family
+
+
+def test_family_is_abstract():
+    with pytest.raises(TypeError):
+        _Family("x", "doc")
+
+
+def test_children_are_cached_and_locked_separately():
+    counter = Counter("c_total", "doc", ("ip",))
+    a, b = counter.labels("a"), counter.labels("b")
+    assert counter.labels("a") is a
+    assert a._lock is not b._lock
+
+
+def test_concurrent_updates_are_not_lost():
+    hist = Histogram("h_seconds", "doc", ("ip",), buckets=(0.1, 1.0))
+    child = hist.labels("a")
+
+    def work():
+        for _ in range(5000):
+            child.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert child.counts == [0, 20000, 0]
+    assert child.sum == pytest.approx(10000.0)
+
+
+def test_render_exposition_format():
+    registry = Registry()
+    registry.counter("sent_total", "Sent", ("ip",)).labels('1.2.3.4').inc(2)
+    registry.histogram("lat_seconds", "Latency", buckets=(0.1,)).observe(0.05)
+    text = registry.render()
+    assert 'sent_total{ip="1.2.3.4"} 2' in text
+    assert 'lat_seconds_bucket{le="0.1"} 1' in text
+    assert 'lat_seconds_bucket{le="+Inf"} 1' in text
+    assert "lat_seconds_count 1" in text
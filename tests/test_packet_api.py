@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+
+import pytest
+
+import app_backend
+from app_backend import PacketMonitor
+
+
+def log(monitor, k):
+    monitor.log_packet("10.0.0.1", 4003, None, json.dumps({"msg": {"cmd": "turn", "data": {"value": k}}}).encode("utf-8"))
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    monitor = PacketMonitor(max_packets=5)
+    monkeypatch.setattr(app_backend, "packet_monitor", monitor)
+    return monitor
+
+
+@pytest.fixture
+def client():
+    return app_backend.app.test_client()
+
+
+# ---------- cursor polling ----------
+def test_cursor_and_missed(monitor, client):
+    for k in range(3):
+        log(monitor, k)
+    body = client.get("/api/packets?since=0").get_json()
+    assert [p["seq"] for p in body["packets"]] == [3, 2, 1]
+    assert body["cursor"] == 3 and body["missed"] == 0
+
+    for k in range(8):
+        log(monitor, k)  # seqs 4-11; the ring holds 7-11
+    body = client.get(f"/api/packets?since={body['cursor']}").get_json()
+    assert [p["seq"] for p in body["packets"]] == [11, 10, 9, 8, 7]
+    assert body["cursor"] == 11 and body["missed"] == 3
+
+    body = client.get("/api/packets?since=11").get_json()
+    assert body == {"packets": [], "cursor": 11, "missed": 0}
+
+
+def test_limit_counts_as_missed(monitor, client):
+    for k in range(5):
+        log(monitor, k)
+    body = client.get("/api/packets?since=0&limit=2").get_json()
+    assert [p["seq"] for p in body["packets"]] == [5, 4]
+    assert body["missed"] == 3
+
+
+# ---------- waiting ----------
+def test_waiter_wakes_on_the_next_packet(monitor):
+    woke = []
+
+    def wait():
+        start = time.perf_counter()
+        woke.append((monitor.wait_for_packets(monitor.last_seq, 5.0), time.perf_counter() - start))
+
+    t = threading.Thread(target=wait)
+    t.start()
+    time.sleep(0.05)
+    log(monitor, 1)
+    t.join(2.0)
+    assert woke and woke[0][0] and woke[0][1] < 1.0
+    assert not monitor.wait_for_packets(monitor.last_seq, 0.01)
+
+
+# ---------- SSE ----------
+def events(resp, count):
+    out = []
+    for chunk in resp.response:
+        text = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        if text.startswith("id:"):
+            out.append(int(text.split("\n", 1)[0][3:]))
+            if len(out) == count:
+                break
+    return out
+
+
+def test_stream_resumes_from_last_event_id_over_since(monitor, client):
+    for k in range(4):
+        log(monitor, k)
+    resp = client.get("/api/packets/stream?since=0", headers={"Last-Event-ID": "2"}, buffered=False)
+    assert events(resp, 2) == [3, 4]
+    resp.close()
+
+
+def test_stream_delivers_new_packets_and_ends_after_max_age(monitor, client, monkeypatch):
+    monkeypatch.setattr(app_backend, "PACKET_STREAM_MAX_AGE", 0.5)
+    monkeypatch.setattr(app_backend, "PACKET_STREAM_KEEPALIVE", 0.1)
+    threading.Timer(0.1, log, (monitor, 1)).start()
+    start = time.monotonic()
+    chunks = list(client.get("/api/packets/stream", buffered=False).response)
+    assert time.monotonic() - start < 2.0
+    text = "".join(c.decode("utf-8") if isinstance(c, bytes) else c for c in chunks)
+    assert text.startswith("retry: 2000")
+    assert "id: 1\nevent: packet" in text and ": keepalive" in text
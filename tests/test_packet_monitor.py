@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+
+import pytest
+
+import app_backend
+from app_backend import PacketMonitor
+
+
+def log(monitor, k, ip="10.0.0.1"):
+    data = json.dumps({"msg": {"cmd": "brightness", "data": {"value": k}}}).encode("utf-8")
+    monitor.log_packet(ip, 4003, None, data)
+
+
+def values(packets):
+    return [p["payload_json"]["msg"]["data"]["value"] for p in packets]
+
+
+def test_ring_keeps_the_newest_packets_newest_first():
+    monitor = PacketMonitor(max_packets=5)
+    for k in range(12):
+        log(monitor, k)
+    packets = monitor.get_packets()
+    assert values(packets) == [11, 10, 9, 8, 7]
+    assert [p["seq"] for p in packets] == [12, 11, 10, 9, 8]
+    assert monitor.last_seq == 12
+
+
+def test_since_and_limit():
+    monitor = PacketMonitor(max_packets=50)
+    for k in range(20):
+        log(monitor, k)
+    assert values(monitor.get_packets(since=18)) == [19, 18]  # seq k+1 holds value k
+    assert values(monitor.get_packets(since=5, limit=3)) == [19, 18, 17]
+    assert monitor.get_packets(limit=0) == []
+    assert monitor.get_packets(since=20) == []
+
+
+def test_render_builds_every_view_from_the_bytes():
+    monitor = PacketMonitor()
+    monitor.log_packet("10.0.0.2", 4003, None, b"\x00not json")
+    (packet,) = monitor.get_packets()
+    assert packet["payload_json"] is None
+    assert packet["payload_hex"] == "006e6f74206a736f6e"
+    assert packet["payload_size"] == 9
+    assert packet["destination_ip"] == "10.0.0.2"
+    assert abs(time.time() - time.mktime(time.strptime(packet["timestamp"][:19], "%Y-%m-%dT%H:%M:%S"))) < 5
+
+
+def test_concurrent_writers_lose_no_sequence_numbers():
+    monitor = PacketMonitor(max_packets=4000)
+
+    def work(ip):
+        for k in range(1000):
+            log(monitor, k, ip)
+
+    threads = [threading.Thread(target=work, args=(f"10.0.0.{n}",)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seqs = [r[0] for r in monitor.records_since(0)]
+    assert seqs == list(range(1, 4001))
+
+
+def test_clear_keeps_the_sequence_going():
+    monitor = PacketMonitor(max_packets=10)
+    for k in range(3):
+        log(monitor, k)
+    monitor.clear()
+    assert monitor.get_packets() == []
+    log(monitor, 99)
+    assert [p["seq"] for p in monitor.get_packets()] == [4]
+
+
+@pytest.fixture
+def device():
+    from govee_simulator import Simulator
+
+    sim = Simulator(1, base_ip="127.0.0.46", scan_host="").start()
+    yield app_backend.GoveeLAN(sim.devices[0].ip)
+    sim.stop()
+
+
+def test_sent_commands_are_logged(device):
+    since = app_backend.packet_monitor.last_seq
+    device.send_command("turn", {"value": 1})
+    end = time.time() + 2.0
+    while time.time() < end and app_backend.packet_monitor.last_seq == since:
+        time.sleep(0.01)
+    packets = [p for p in app_backend.packet_monitor.get_packets(since=since) if p["destination_ip"] == device.ip]
+    assert packets and packets[0]["payload_json"]["msg"]["cmd"] == "turn"
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import app_backend
+from govee_scheduler import RulesWatcher, validate_rules_config
+
+GOOD = {"time": "07:00", "action": "on"}
+BAD = {"time": "25:00", "action": "on"}
+SUN = {"sun": "sunset", "action": "off"}
+LONDON = {"lat": "51.5", "lon": -0.12}
+
+
+def test_validate_accepts_a_clean_config_and_normalises_location():
+    rules, location = validate_rules_config({"rules": [GOOD, SUN], "location": LONDON})
+    assert rules == [GOOD, SUN]
+    assert location == {"lat": 51.5, "lon": -0.12}
+
+
+@pytest.mark.parametrize("cfg, message", [
+    ([GOOD], "rules list"),
+    ({"rules": {"a": GOOD}}, "rules list"),
+    ({"rules": [GOOD, BAD]}, "rule #2"),
+    ({"rules": [SUN]}, "rule #1"),
+    ({"rules": [GOOD], "location": {"lat": "north"}}, "location"),
+])
+def test_validate_rejects_the_whole_config(cfg, message):
+    with pytest.raises(ValueError, match=message):
+        validate_rules_config(cfg)
+
+
+def write(path, cfg):
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+
+
+def test_watcher_applies_valid_edits_and_ignores_invalid_ones(tmp_path):
+    path = tmp_path / "rules.json"
+    applied = []
+    watcher = RulesWatcher(str(path), applied.append)
+    write(path, {"rules": [GOOD], "location": LONDON})
+    assert watcher.check()
+    assert applied[-1]["location"] == {"lat": 51.5, "lon": -0.12}
+    write(path, {"rules": [GOOD, BAD, GOOD]})
+    assert not watcher.check()
+    assert len(applied) == 1 and watcher.rejected == 1
+
+
+# ---------- the backend's three entry points agree ----------
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(app_backend, "RULES_PATH", str(tmp_path / "rules.json"))
+    monkeypatch.setattr(app_backend, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(app_backend, "rules_watcher", RulesWatcher(str(tmp_path / "rules.json"), app_backend.apply_rules_config))
+    monkeypatch.setattr(app_backend, "rules", [GOOD])
+    monkeypatch.setattr(app_backend, "rules_location", None)
+    monkeypatch.setattr(app_backend.devices, "default_ip", app_backend.devices.default_ip)
+    yield app_backend
+    app_backend.automation_scheduler.set_rules([])
+
+
+def test_put_with_an_invalid_rule_changes_nothing(backend):
+    client = backend.app.test_client()
+    resp = client.put("/api/rules", json={"rules": [GOOD, BAD], "location": LONDON})
+    assert resp.status_code == 400
+    assert "rule #2" in resp.get_json()["message"]
+    assert backend.rules == [GOOD] and backend.rules_location is None
+
+    resp = client.put("/api/rules", json={"rules": [GOOD, SUN], "location": LONDON})
+    assert resp.status_code == 200
+    assert backend.rules == [GOOD, SUN] and backend.rules_location == {"lat": 51.5, "lon": -0.12}
+
+
+def test_post_validates_against_the_current_location(backend):
+    client = backend.app.test_client()
+    assert client.post("/api/rules", json={"sun": "sunrise", "action": "on"}).status_code == 400
+    assert backend.rules == [GOOD]
+
+
+def test_startup_refuses_what_hot_reload_refuses(backend, tmp_path):
+    path = tmp_path / "rules.json"
+    write(path, {"rules": [GOOD, BAD]})
+    backend.rules = []
+    backend.load_rules_from_file()
+    assert backend.rules == []
+    assert json.loads((tmp_path / "rules.json.rejected").read_text(encoding="utf-8"))["rules"] == [GOOD, BAD]
+    assert not backend.rules_watcher.check()  # the watcher refuses the same file
+
+    write(path, {"rules": [GOOD, GOOD]})
+    assert backend.rules_watcher.check()
+    assert backend.rules == [GOOD, GOOD]
@@ -0,0 +1,206 @@
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from govee_scheduler import CronTrigger, DailyTrigger, RuleScheduler, SunTrigger, compile_rule, sun_event_utc
+
+
+@pytest.fixture
+def local_tz():
+    """Switch the process timezone for one test (naive datetimes are local time)"""
+    if not hasattr(time, "tzset"):
+        pytest.skip("needs time.tzset")
+    saved = os.environ.get("TZ")
+
+    def use(name):
+        if not os.path.exists(os.path.join("/usr/share/zoneinfo", name)):
+            pytest.skip(f"no tz database entry for {name}")
+        os.environ["TZ"] = name
+        time.tzset()
+
+    yield use
+    if saved is None:
+        os.environ.pop("TZ", None)
+    else:
+        os.environ["TZ"] = saved
+    time.tzset()
+
+
+def fires(trigger, after, count):
+    out = []
+    t = after
+    for _ in range(count):
+        t = trigger.next_after(t)
+        out.append(t)
+    return out
+
+
+# ---------- cron fields ----------
+def test_cron_step_and_ranges():
+    trigger = CronTrigger("*/15 9-17 * * mon-fri")
+    assert trigger.minutes == {0, 15, 30, 45}
+    assert trigger.hours == set(range(9, 18))
+    assert trigger.wdays == {0, 1, 2, 3, 4}
+
+
+def test_cron_step_from_offset_runs_to_end_of_range():
+    assert CronTrigger("5/20 * * * *").minutes == {5, 25, 45}
+    assert CronTrigger("0 1-10/3 * * *").hours == {1, 4, 7, 10}
+
+
+def test_cron_names_and_sunday_aliases():
+    assert CronTrigger("0 0 * jan,dec *").months == {1, 12}
+    # cron Sunday is 0 and 7; Python's is 6
+    assert CronTrigger("0 0 * * 0").wdays == {6}
+    assert CronTrigger("0 0 * * 7").wdays == {6}
+    assert CronTrigger("0 0 * * sun").wdays == {6}
+
+
+@pytest.mark.parametrize("expr", [
+    "60 * * * *",
+    "* 24 * * *",
+    "* * 0 * *",
+    "* * 32 * *",
+    "* * * 13 *",
+    "* * * * 8",
+    "*/0 * * * *",
+    "10-5 * * * *",
+    "x * * * *",
+    "* * * *",
+    "* * * * * *",
+])
+def test_cron_rejects_invalid_fields(expr):
+    with pytest.raises(ValueError):
+        CronTrigger(expr)
+
+
+def test_cron_next_after():
+    trigger = CronTrigger("*/20 8 * * *")
+    assert fires(trigger, datetime(2024, 5, 1, 7, 59, 30), 4) == [
+        datetime(2024, 5, 1, 8, 0),
+        datetime(2024, 5, 1, 8, 20),
+        datetime(2024, 5, 1, 8, 40),
+        datetime(2024, 5, 2, 8, 0),
+    ]
+
+
+def test_cron_day_of_month_or_day_of_week():
+    # both restricted: either may match (13th of the month, or any Friday)
+    trigger = CronTrigger("0 12 13 * fri")
+    days = [t.date() for t in fires(trigger, datetime(2024, 9, 1), 4)]
+    assert days == [date(2024, 9, 6), date(2024, 9, 13), date(2024, 9, 20), date(2024, 9, 27)]
+
+
+def test_cron_skips_months_without_the_day():
+    trigger = CronTrigger("0 0 31 * *")
+    assert fires(trigger, datetime(2024, 1, 31, 12, 0), 2) == [datetime(2024, 3, 31), datetime(2024, 5, 31)]
+
+
+def test_cron_impossible_date_never_fires():
+    assert CronTrigger("0 0 30 feb *").next_after(datetime(2024, 1, 1)) is None
+
+
+# ---------- DST ----------
+def test_daily_rule_fires_once_across_fall_back(local_tz):
+    local_tz("America/New_York")
+    trigger = DailyTrigger(1, 30)
+    first, second = fires(trigger, datetime(2026, 10, 31, 12, 0), 2)
+    assert (first, second) == (datetime(2026, 11, 1, 1, 30), datetime(2026, 11, 2, 1, 30))
+    # the repeated 01:00-02:00 hour adds an hour between the two fires
+    assert second.timestamp() - first.timestamp() == 25 * 3600
+
+
+def test_cron_fires_each_local_time_once_across_fall_back(local_tz):
+    local_tz("America/New_York")
+    due = fires(CronTrigger("*/30 1 * * *"), datetime(2026, 11, 1, 0, 0), 2)
+    assert due == [datetime(2026, 11, 1, 1, 0), datetime(2026, 11, 1, 1, 30)]
+
+
+def test_rule_in_spring_forward_gap_still_fires_in_order(local_tz):
+    local_tz("America/New_York")
+    due = fires(DailyTrigger(2, 30), datetime(2026, 3, 7, 12, 0), 3)
+    stamps = [t.timestamp() for t in due]
+    assert stamps == sorted(stamps)
+    # 02:30 does not exist on 8 March; it runs during the hour the clock skipped to
+    moved = datetime.fromtimestamp(stamps[0])
+    assert moved.date() == date(2026, 3, 8) and moved.hour == 3
+
+
+# ---------- sun ----------
+@pytest.mark.parametrize("day, lat, lon, rise, sets", [
+    # London, summer and winter solstice
+    (date(2024, 6, 21), 51.5074, -0.1278, datetime(2024, 6, 21, 3, 43), datetime(2024, 6, 21, 20, 21)),
+    (date(2024, 12, 21), 51.5074, -0.1278, datetime(2024, 12, 21, 8, 4), datetime(2024, 12, 21, 15, 53)),
+    # New York: sunset falls on the next UTC day
+    (date(2024, 6, 21), 40.7128, -74.0060, datetime(2024, 6, 21, 9, 25), datetime(2024, 6, 22, 0, 31)),
+])
+def test_sun_times_for_fixed_location(day, lat, lon, rise, sets):
+    tolerance = timedelta(minutes=2)
+    assert abs(sun_event_utc(day, lat, lon, True) - rise.replace(tzinfo=timezone.utc)) < tolerance
+    assert abs(sun_event_utc(day, lat, lon, False) - sets.replace(tzinfo=timezone.utc)) < tolerance
+
+
+@pytest.mark.parametrize("day", [date(2024, 6, 21), date(2024, 12, 21)])
+def test_sun_times_polar_day_and_night(day):
+    assert sun_event_utc(day, 69.6492, 18.9553, True) is None
+    assert sun_event_utc(day, 69.6492, 18.9553, False) is None
+
+
+def test_sun_trigger_in_local_time_with_offset(local_tz):
+    local_tz("Europe/London")
+    trigger = SunTrigger("sunset", 51.5074, -0.1278, offset=-30)
+    due = trigger.next_after(datetime(2024, 6, 21, 12, 0))
+    assert due.date() == date(2024, 6, 21)
+    assert abs(due - datetime(2024, 6, 21, 20, 51)) < timedelta(minutes=2)
+
+
+def test_sun_rule_needs_location():
+    with pytest.raises(ValueError):
+        compile_rule({"sun": "sunrise", "action": "on"})
+
+
+# ---------- next fire ordering ----------
+RULES = [
+    {"time": "23:00", "action": "off"},
+    {"cron": "*/10 * * * *", "action": "brightness", "value": 40},
+    {"time": "06:30", "action": "on", "days": "weekdays"},
+    {"cron": "15 12 * * *", "action": "on"},
+]
+
+
+def test_fires_between_is_ordered():
+    scheduler = RuleScheduler(lambda rule, due_ts: None)
+    scheduler.set_rules(RULES)
+    start = datetime(2024, 5, 3, 0, 0).timestamp()  # a Friday
+    due = scheduler.fires_between(start, start + 2 * 86400)
+    stamps = [ts for _rule, ts in due]
+    assert stamps == sorted(stamps)
+    by_rule = {}
+    for rule, _ts in due:
+        by_rule[rule.index] = by_rule.get(rule.index, 0) + 1
+    # two days of 23:00, 144 ten-minute marks, Friday's 06:30 only, two 12:15s
+    assert by_rule == {0: 2, 1: 288, 2: 1, 3: 2}
+
+
+def test_status_lists_next_fires_soonest_first():
+    scheduler = RuleScheduler(lambda rule, due_ts: None)
+    scheduler.set_rules(RULES)
+    upcoming = scheduler.status(limit=4)["next"]
+    due = [datetime.fromisoformat(item["due"]) for item in upcoming]
+    assert len(due) == 4
+    assert due == sorted(due)
+    assert due[0] <= datetime.now() + timedelta(minutes=10)
+
+
+def test_unchanged_rule_does_not_refire_after_set_rules():
+    scheduler = RuleScheduler(lambda rule, due_ts: None)
+    scheduler.set_rules(RULES)
+    with scheduler._cond:
+        key, entry = next((k, e) for k, e in scheduler._entries.items() if e.compiled.index == 0)
+        fired_at = entry.due_local
+        entry.last_fire = fired_at
+    scheduler.set_rules(RULES)
+    with scheduler._cond:
+        assert scheduler._entries[key].due_local > fired_at
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+import app_backend
+from app_backend import MAX_CONTROL_BACKLOG, SendQueue
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def count_timers(loop, queue, monkeypatch):
+    calls = []
+    call_later = loop.call_later
+
+    def counted(delay, callback, *args):
+        if callback == queue._pump:
+            calls.append(delay)
+        return call_later(delay, callback, *args)
+
+    monkeypatch.setattr(loop, "call_later", counted)
+    return calls
+
+
+def test_control_commands_go_before_frames_and_frames_keep_the_newest():
+    async def main():
+        queue = SendQueue(rate=1000.0, burst=1)
+        sent = []
+        queue.submit("ip", lambda: sent.append("first"))  # spends the only token
+        for value in range(5):
+            queue.submit("ip", lambda v=value: sent.append(("brightness", v)), attr="brightness")
+        queue.submit("ip", lambda: sent.append("turn"), cmd="turn")
+        await asyncio.sleep(0.05)
+        return sent, (await queue.snapshot())["devices"]["ip"]
+
+    sent, stats = run(main())
+    assert sent == ["first", "turn", ("brightness", 4)]
+    assert stats["dropped"] == 4 and stats["depth"] == 0
+
+
+def test_mode_change_drops_pending_frames_but_turn_does_not():
+    async def main():
+        queue = SendQueue(rate=1000.0, burst=1)
+        sent = []
+        queue.submit("ip", lambda: None)
+        queue.submit("ip", lambda: sent.append("frame"), attr="color")
+        queue.submit("ip", lambda: sent.append("turn"), cmd="turn")
+        queue.submit("ip", lambda: sent.append("frame2"), attr="brightness")
+        queue.submit("ip", lambda: sent.append("scene"), cmd="scene")
+        await asyncio.sleep(0.05)
+        return sent
+
+    assert run(main()) == ["turn", "scene"]
+
+
+def test_one_refill_timer_per_device_while_the_bucket_is_empty(monkeypatch):
+    async def main():
+        loop = asyncio.get_running_loop()
+        queue = SendQueue(rate=50.0, burst=1)
+        timers = count_timers(loop, queue, monkeypatch)
+        sent = []
+        for value in range(40):
+            queue.submit("ip", lambda v=value: sent.append(v), attr="brightness")
+        assert len(timers) == 1
+        await asyncio.sleep(0.1)
+        return sent, timers
+
+    sent, timers = run(main())
+    assert sent == [0, 39]
+    assert len(timers) == 1  # nothing left queued after the refill
+
+
+def test_token_bucket_paces_a_burst():
+    async def main():
+        loop = asyncio.get_running_loop()
+        queue = SendQueue(rate=100.0, burst=2)
+        times = []
+        for _ in range(12):
+            queue.submit("ip", lambda: times.append(loop.time()))
+        start = loop.time()
+        while len(times) < 12:
+            await asyncio.sleep(0.01)
+        return times, start
+
+    times, start = run(main())
+    # two go at once, the other ten at 100/s
+    assert times[1] - start < 0.01
+    assert 0.08 <= times[-1] - start < 0.3
+
+
+def test_raising_the_rate_reschedules_the_pending_timer():
+    async def main():
+        loop = asyncio.get_running_loop()
+        queue = SendQueue(rate=0.5, burst=1)
+        sent = []
+        queue.submit("ip", lambda: sent.append(1))
+        queue.submit("ip", lambda: sent.append(2))  # would wait 2 s at the old rate
+        queue.configure(rate=1000.0)
+        await asyncio.sleep(0.05)
+        return sent
+
+    assert run(main()) == [1, 2]
+
+
+def test_full_backlog_drops_the_oldest_fire_and_forget_but_never_a_waiter():
+    async def main():
+        queue = SendQueue(rate=0.001, burst=1)
+        queue.submit("ip", lambda: None)  # spends the only token
+        turn = queue.wait_turn("ip")
+        dropped = []
+        for k in range(MAX_CONTROL_BACKLOG + 5):
+            queue.submit("ip", lambda: None, on_drop=lambda k=k: dropped.append(k))
+        stats = (await queue.snapshot())["devices"]["ip"]
+        waiter_kept = any(entry[2] for entry in queue._queues["ip"].control)
+        turn.cancel()
+        return dropped, stats, waiter_kept
+
+    dropped, stats, waiter_kept = run(main())
+    assert dropped == [0, 1, 2, 3, 4, 5]
+    assert waiter_kept
+    assert stats["control_depth"] == MAX_CONTROL_BACKLOG
+
+
+def test_backlog_of_waiters_refuses_new_fire_and_forget():
+    async def main():
+        queue = SendQueue(rate=0.001, burst=1)
+        queue.submit("ip", lambda: None)
+        waiters = [queue.wait_turn("ip") for _ in range(MAX_CONTROL_BACKLOG)]
+        refused = []
+        queue.submit("ip", lambda: None, on_drop=lambda: refused.append(True))
+        for fut in waiters:
+            fut.cancel()
+        return refused
+
+    assert run(main()) == [True]
+
+
+# ---------- through the simulator ----------
+@pytest.fixture
+def device():
+    from govee_simulator import Simulator
+
+    received = []
+    sim = Simulator(1, base_ip="127.0.0.42", scan_host="",
+                    on_command=lambda dev, cmd, data: received.append((cmd, data))).start()
+    yield app_backend.GoveeLAN(sim.devices[0].ip), received
+    sim.stop()
+
+
+def test_fire_and_forget_reports_sent_and_reaches_the_device(device):
+    lan, received = device
+    payload, payload_bytes = lan._encode(lan._wrap_msg("turn", {"value": 1}))
+    outcome = app_backend.get_transport().run(lan.send_encoded_async(payload, payload_bytes), timeout=2.0)
+    assert outcome == "sent"
+    for _ in range(100):
+        if received:
+            break
+        asyncio.run(asyncio.sleep(0.01))
+    assert received == [("turn", {"value": 1})]
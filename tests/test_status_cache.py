@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+import app_backend
+from app_backend import StatusCache, parse_flag
+from govee_simulator import Simulator
+
+
+@pytest.fixture
+def light():
+    sim = Simulator(1, base_ip="127.0.0.47", scan_host="", latency_ms=30.0).start()
+    yield app_backend.GoveeLAN(sim.devices[0].ip), sim.devices[0]
+    sim.stop()
+
+
+def on_loop(coro):
+    return app_backend.get_transport().run(coro, timeout=5.0)
+
+
+def test_first_read_is_live_then_fresh(light):
+    dev, sim = light
+    cache = StatusCache(ttl=5.0, stale_ttl=60.0)
+    reply, age, source = on_loop(cache.get(dev))
+    assert source == "live" and age == 0.0
+    assert reply["msg"]["cmd"] == "devStatus"
+    _reply, age, source = on_loop(cache.get(dev))
+    assert source == "fresh" and age >= 0.0
+    assert sim.replies == 1 and (cache.hits, cache.misses) == (1, 1)
+
+
+def test_max_age_zero_and_refresh_always_query(light):
+    dev, sim = light
+    cache = StatusCache(ttl=5.0)
+    on_loop(cache.get(dev))
+    assert on_loop(cache.get(dev, max_age=0))[2] == "live"
+    assert on_loop(cache.get(dev, refresh=True))[2] == "live"
+    assert sim.replies == 3
+
+
+def test_concurrent_reads_share_one_request(light):
+    dev, sim = light
+    cache = StatusCache()
+
+    async def many():
+        return await asyncio.gather(*(cache.get(dev) for _ in range(5)))
+
+    results = on_loop(many())
+    assert {source for _r, _a, source in results} == {"live"}
+    assert sim.replies == 1 and cache.shared == 4
+
+
+def test_command_marks_the_reply_stale_and_refreshes_in_background(light):
+    dev, sim = light
+    cache = StatusCache(ttl=5.0, stale_ttl=60.0)
+    on_loop(cache.get(dev))
+
+    async def invalidate():
+        cache.invalidate(dev.ip)
+
+    on_loop(invalidate())
+    _reply, _age, source = on_loop(cache.get(dev))
+    assert source == "stale"
+    end = time.time() + 2.0
+    while time.time() < end and sim.replies < 2:
+        time.sleep(0.01)
+    time.sleep(0.05)  # let the refreshed reply land in the cache
+    assert on_loop(cache.get(dev))[2] == "fresh"
+    assert on_loop(cache.snapshot())["devices"][dev.ip]["stale"] is False
+
+
+def test_max_age_bounds_stale_replies(light):
+    dev, _sim = light
+    cache = StatusCache(ttl=0.0, stale_ttl=60.0)
+    on_loop(cache.get(dev))
+    time.sleep(0.05)
+    assert on_loop(cache.get(dev))[2] == "stale"
+    assert on_loop(cache.get(dev, max_age=0.01))[2] == "live"
+
+
+def test_unreachable_device_gives_none(light):
+    cache = StatusCache()
+    dev = app_backend.GoveeLAN("127.0.0.48")
+    dev.retry_count = 0
+    reply, _age, source = on_loop(cache.get(dev, timeout=0.1))
+    assert reply is None and source == "live"
+    assert dev.ip not in on_loop(cache.snapshot())["devices"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (True, True), (1, True), ("1", True), ("true", True), (" Yes ", True), ("on", True),
+    (False, False), (0, False), ("0", False), ("false", False), ("", False), (None, False), ("no", False), (2, False),
+])
+def test_parse_flag(value, expected):
+    assert parse_flag(value) is expected
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from govee_simulator import CONTROL_PORT, Simulator
+from govee_transport import LanTransport
+
+STATUS = json.dumps({"msg": {"cmd": "devStatus", "data": {}}}).encode("utf-8")
+
+
+@pytest.fixture
+def sim():
+    sim = Simulator(1, base_ip="127.0.0.40", scan_host="").start()
+    yield sim
+    sim.stop()
+
+
+def test_request_gets_the_matching_reply(sim):
+    transport = LanTransport(bind_host="127.0.0.1")
+    try:
+        reply = json.loads(transport.request_sync(sim.devices[0].ip, CONTROL_PORT, STATUS, expect_cmd="devStatus"))
+        assert reply["msg"]["cmd"] == "devStatus"
+    finally:
+        transport.close()
+
+
+def test_closed_transport_is_never_restarted():
+    transport = LanTransport(bind_host="127.0.0.1")
+    transport.start()
+    thread = transport._thread
+    transport.close()
+    assert transport.closed and not thread.is_alive()
+    with pytest.raises(ConnectionError):
+        transport.start()
+    with pytest.raises(ConnectionError):
+        transport.send_sync("127.0.0.40", CONTROL_PORT, STATUS)
+    transport.close()  # idempotent
+
+
+def test_close_before_start_is_terminal():
+    transport = LanTransport(bind_host="127.0.0.1")
+    transport.close()
+    with pytest.raises(ConnectionError):
+        transport.loop
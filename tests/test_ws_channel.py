@@ -0,0 +1,143 @@
+import asyncio
+import json
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+import app_backend  # noqa: E402
+from govee_simulator import Simulator  # noqa: E402
+
+PORT = 5071
+URL = f"ws://127.0.0.1:{PORT}"
+
+
+@pytest.fixture(scope="module")
+def channel():
+    channel = app_backend.CommandChannel(port=PORT)
+    assert channel.start("127.0.0.1")
+    yield channel
+    channel.stop()
+
+
+@pytest.fixture
+def light():
+    sim = Simulator(1, base_ip="127.0.0.45", scan_host="").start()
+    yield sim.devices[0]
+    sim.stop()
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10.0))
+
+
+async def replies(ws, count):
+    out = []
+    while len(out) < count:
+        out.append(json.loads(await ws.recv()))
+    return out
+
+
+def test_foreign_origin_is_refused(channel):
+    async def main():
+        with pytest.raises(websockets.exceptions.InvalidStatus) as err:
+            async with websockets.connect(URL, origin="http://evil.example"):
+                pass
+        return err.value.response.status_code
+
+    assert run(main()) == 403
+
+
+@pytest.mark.parametrize("origin", ["http://localhost:5000", "http://127.0.0.1:5000", "file://", None])
+def test_app_origins_are_accepted(channel, origin):
+    async def main():
+        async with websockets.connect(URL, origin=origin) as ws:
+            await ws.send(json.dumps({"id": 1, "action": "subscribe", "ips": []}))
+            return json.loads(await ws.recv())
+
+    assert run(main()) == {"id": 1, "ok": True}
+
+
+def test_ack_follows_the_send(channel, light):
+    async def main():
+        async with websockets.connect(URL) as ws:
+            await ws.send(json.dumps({"id": 7, "action": "on", "ip": light.ip}))
+            return json.loads(await ws.recv())
+
+    assert run(main()) == {"id": 7, "ok": True, "outcome": "sent"}
+    assert light.received >= 1
+
+
+def test_slider_burst_acks_every_frame(channel, light):
+    async def main():
+        async with websockets.connect(URL) as ws:
+            for k in range(1, 11):
+                await ws.send(json.dumps({"id": k, "action": "brightness", "ip": light.ip, "value": 10 + k}))
+            return {r["id"]: r for r in await replies(ws, 10)}
+
+    acks = run(main())
+    assert all(r["ok"] for r in acks.values())
+    assert acks[1]["outcome"] == "sent" and acks[10]["outcome"] == "sent"
+    assert {r["outcome"] for k, r in acks.items() if 1 < k < 10} == {"superseded"}
+
+
+def forget_queue(ip):
+    async def drop():
+        q = app_backend.send_queue._queues.pop(ip, None)
+        if q is not None and q.handle is not None:
+            q.handle.cancel()
+
+    app_backend.get_transport().run(drop())
+
+
+def test_commands_dropped_from_the_backlog_are_reported(channel, light):
+    sku = "TEST-SLOW"
+    transport = app_backend.get_transport()
+    transport.loop.call_soon_threadsafe(lambda: app_backend.send_queue.configure(0.001, 1, sku=sku))
+    extra = 5
+    try:
+        async def main():
+            async with websockets.connect(URL) as ws:
+                for k in range(app_backend.MAX_CONTROL_BACKLOG + 1 + extra):
+                    await ws.send(json.dumps({"id": k, "action": "on", "ip": light.ip, "sku": sku}))
+                return await replies(ws, 1 + extra)
+
+        acks = run(main())
+    finally:
+        app_backend.SKU_RATE_LIMITS.pop(sku, None)
+        forget_queue(light.ip)
+    assert acks[0] == {"id": 0, "ok": True, "outcome": "sent"}
+    dropped = acks[1:]
+    assert [r["id"] for r in dropped] == list(range(1, 1 + extra))
+    assert all(not r["ok"] and r["outcome"] == "dropped" for r in dropped)
+
+
+def test_bad_frames_get_an_error_and_keep_the_socket(channel, light):
+    async def main():
+        async with websockets.connect(URL) as ws:
+            for bad in ("[1,2]", "7", "nope"):
+                await ws.send(bad)
+            errors = await replies(ws, 3)
+            await ws.send(json.dumps({"id": 1, "action": "bogus", "ip": light.ip}))
+            unknown = json.loads(await ws.recv())
+            await ws.send(json.dumps({"id": 2, "action": "on", "device": "AA:00:00:00:00:00:00:01"}))
+            undiscovered = json.loads(await ws.recv())
+            return errors, unknown, undiscovered
+
+    errors, unknown, undiscovered = run(main())
+    assert all(e["id"] is None and e["ok"] is False for e in errors)
+    assert unknown["id"] == 1 and unknown["ok"] is False
+    assert undiscovered["id"] == 2 and "not discovered" in undiscovered["error"]
+
+
+def test_subscribers_get_state_pushes(channel, light):
+    async def main():
+        async with websockets.connect(URL) as ws:
+            await ws.send(json.dumps({"action": "subscribe", "ips": [light.ip]}))
+            await ws.send(json.dumps({"action": "brightness", "ip": light.ip, "value": 42}))
+            while True:
+                frame = json.loads(await ws.recv())
+                if frame.get("type") == "state" and frame["state"].get("brightness") == 42:
+                    return frame
+
+    assert run(main())["ip"] == light.ip